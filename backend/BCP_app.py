@@ -24,138 +24,735 @@
 #------------------------------------------------------
 #----Creando el backend del modelo---------------------
 
-from fastapi import FastAPI, Query
-from fastapi.middleware.cors import CORSMiddleware
-from sentence_transformers import SentenceTransformer
-import faiss
-import numpy as np
-import os
-import subprocess
+import time
+INICIO_IMPORTACIONES = time.perf_counter()
+
+import asyncio
+import base64
 import json
-import sys
+import os
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-#CORS = Cross- Origin Resource Sharing
 
-# Cargar variables de entorno desde archivo .env
+# Cargar variables de entorno desde archivo .env (antes de importar los
+# modulos locales, que leen su configuracion BCP_* al importarse)
 load_dotenv()
 
-# Determinar la ruta al ejecutable de Azure CLI
-def get_az_cli_path():
-    # En Windows, Azure CLI se instala típicamente en:
-    windows_paths = [
-        r"C:\Program Files (x86)\Microsoft SDKs\Azure\CLI2\wbin\az.cmd",
-        r"C:\Program Files\Microsoft SDKs\Azure\CLI2\wbin\az.cmd",
-        r"C:\Program Files\Azure CLI\bin\az.cmd",
-        r"C:\Program Files (x86)\Azure CLI\bin\az.cmd"
-    ]
-    
-    # Comprobar si existe en alguna de las rutas habituales
-    for path in windows_paths:
-        if os.path.exists(path):
-            return path
-    
-    # Si no se encuentra en las rutas habituales, intentar con el comando directo
-    # que funcionará si está en el PATH
-    return "az"
-
-# Ruta al ejecutable de Azure CLI
-AZ_CLI_PATH = get_az_cli_path()
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+import numpy as np
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from indice_vectorial import EF_SEARCH, NPROBE, RERANK, configuracion_indice, construir_indice, normalizar
+from almacen import AlmacenDocumentos
+from ingesta import RUTA_DOCUMENTOS, documentos_unicos
+from microlotes import MicroLotes
+from cache_consultas import CacheLRU, normalizar_consulta
+from inventario_azure import InventarioAzure
+from registro_inventario import HistorialIncompleto, resumir_cambios
+from ranking_recursos import MotorRanking
+from indice_recursos import IndiceRecursos
+from lexico import IndiceBM25, codigo_de, fusion_ponderada, fusion_rrf
+from ejecutores import (PoolAcotado, Saturado, codificar_en_proceso, hilos_por_defecto, iniciar_proceso_modelo,
+                        pool_desde_entorno)
+from codificadores import crear_codificador
+from campos import separar_campos
+from arranque import EstadoArranque, NoListo
+from transmision import responder_error, responder_por_partes
+from metricas import TAMANO_LOTES, Calculada, MiddlewareMetricas, exponer, tramo
+#CORS = Cross- Origin Resource Sharing
+
+#Importar este modulo solo prepara objetos livianos: el modelo, el indice
+#y el almacen se cargan en cargar_servicio(), por fases cronometradas
+arranque = EstadoArranque()
+arranque.registrar("importaciones", time.perf_counter() - INICIO_IMPORTACIONES)
+
+#Con BCP_CARGA_EN_SEGUNDO_PLANO=1 (por defecto) la API acepta conexiones de
+#inmediato: /healthz responde y /readyz da 503 hasta que termine la carga.
+#Con 0 el lifespan espera la carga antes de aceptar conexiones
+CARGA_EN_SEGUNDO_PLANO = os.environ.get("BCP_CARGA_EN_SEGUNDO_PLANO", "1") == "1"
+
+#Con BCP_INVENTARIO=0 no se consulta Azure (p. ej. en los shards de
+#coordinador.py, que solo sirven documentos)
+INVENTARIO_ACTIVO = os.environ.get("BCP_INVENTARIO", "1") == "1"
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    #Los hilos de fondo se inician en cada worker (en modo prefork, despues del fork)
+    if INVENTARIO_ACTIVO:
+        inventario.iniciar()
+    #En modo prefork el padre ya cargo todo antes del fork y esto no hace nada
+    if CARGA_EN_SEGUNDO_PLANO:
+        threading.Thread(target=cargar_worker, name="arranque", daemon=True).start()
+    else:
+        await asyncio.to_thread(cargar_servicio)
+        iniciar_indice_recursos()
+    yield
 
 #Invocar el objeto para el uso de api
-app = FastAPI()
+app = FastAPI(lifespan=ciclo_de_vida)
 
 #Habilitar CORS para permitir conexión con Streamlit
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["Server-Timing"]
+)
+
+#Latencia por ruta y tiempos por etapa (/metrics); con X-Server-Timing: 1
+#(o BCP_SERVER_TIMING=1) la respuesta trae el encabezado Server-Timing
+app.add_middleware(MiddlewareMetricas)
+
+#Pools de ejecucion acotados (BCP_<POOL>_HILOS / BCP_<POOL>_COLA):
+# inferencia: /buscar/ (modelo, FAISS, BM25)  | ingesta: agregar/eliminar documentos
+# azure: consultas al SDK de Azure (I/O)      | recursos: ranking de recursos (CPU)
+#Si un pool esta lleno la peticion recibe 503 en lugar de esperar en cola
+pool_inferencia = pool_desde_entorno("inferencia", 4, 128)
+pool_ingesta = pool_desde_entorno("ingesta", 1, 8)
+pool_azure = pool_desde_entorno("azure", 2, 8)
+pool_recursos = pool_desde_entorno("recursos", 2, 64)
+
+#Hilos del modelo por proceso, torch u ONNX Runtime (por defecto los nucleos
+#repartidos entre los hilos de inferencia)
+HILOS_TORCH = int(os.environ.get("BCP_TORCH_HILOS", "0")) or hilos_por_defecto(pool_inferencia.trabajadores)
+
+#Con BCP_MODELO_PROCESOS > 0 las consultas se codifican en procesos aparte
+#(cada uno carga su copia del modelo), fuera del GIL del proceso de la API
+PROCESOS_MODELO = int(os.environ.get("BCP_MODELO_PROCESOS", "0"))
+
+@app.exception_handler(Saturado)
+async def responder_saturado(request, exc):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(NoListo)
+async def responder_no_listo(request, exc):
+    return JSONResponse(status_code=503, content={"detail": str(exc), "estado": exc.estado},
+                        headers={"Retry-After": "5"})
+
+def servicio_listo():
+    #Dependencia de los endpoints que usan el modelo o el indice
+    arranque.exigir_listo()
+
+LISTO = [Depends(servicio_listo)]
+
+NOMBRE_MODELO = os.environ.get("BCP_MODELO", "all-MiniLM-L6-v2")
+#Backend del modelo (BCP_CODIFICADOR): torch, onnx u onnx-int8
+TIPO_CODIFICADOR = os.environ.get("BCP_CODIFICADOR", "torch").lower()
+
+#Indice persistido en disco (data/indice): solo se codifican las lineas nuevas
+#o modificadas, el resto se abre con memory-map
+#Tipo de indice (flat, ivf-flat, ivf-pq, hnsw) configurable con BCP_INDICE_TIPO
+CONFIG_INDICE = configuracion_indice()
+
+#Se asignan en cargar_servicio()
+modelo = None
+almacen = None
+indice_lexico = None
+
+pool_modelo = None
+if PROCESOS_MODELO > 0:
+    pool_modelo = PoolAcotado("modelo", PROCESOS_MODELO, int(os.environ.get("BCP_MODELO_COLA", "128")),
+                              tipo="process", inicializador=iniciar_proceso_modelo,
+                              argumentos=(NOMBRE_MODELO, TIPO_CODIFICADOR, HILOS_TORCH))
+
+def codificar(textos):
+    with tramo("codificador"):
+        if pool_modelo is not None:
+            vecs = pool_modelo.enviar(codificar_en_proceso, list(textos)).result()
+        else:
+            vecs = modelo.encode(textos,convert_to_numpy=True)
+    with tramo("normalizacion"):
+        return normalizar(vecs)
+
+#Caches de consultas: embedding por texto normalizado y resultados finales
+TTL_CACHE = float(os.environ.get("BCP_CACHE_TTL", "600"))
+cache_embeddings = CacheLRU(int(os.environ.get("BCP_CACHE_EMBEDDINGS", "1024")), TTL_CACHE)
+cache_resultados = CacheLRU(int(os.environ.get("BCP_CACHE_RESULTADOS", "1024")), TTL_CACHE)
+
+def clave_consulta(texto):
+    #Texto de la consulta en las caches (en minusculas solo si el modelo es uncased)
+    return normalizar_consulta(texto, getattr(modelo, "minusculas", False))
+
+def codificar_consultas(consultas):
+    #Solo se pasan por el modelo las consultas que no estan en cache
+    claves = [clave_consulta(c) for c in consultas]
+    vecs = [cache_embeddings.obtener(c) for c in claves]
+    pendientes = list(dict.fromkeys(c for c, v in zip(claves, vecs) if v is None))
+    if pendientes:
+        nuevos = dict(zip(pendientes, codificar(pendientes)))
+        for clave, vec in nuevos.items():
+            vec.setflags(write=False)
+            cache_embeddings.guardar(clave, vec)
+        vecs = [nuevos[c] if v is None else v for c, v in zip(claves, vecs)]
+    return np.vstack(vecs)
+
+def buscar_lote(consultas, k, nprobe=None, ef_search=None, proyecto=None, tipo=None, rerank=None,
+                min_similitud=None):
+    #Una sola llamada al modelo y una sola busqueda en FAISS para N consultas
+    filtros = {"proyecto": proyecto, "tipo": tipo}
+    return almacen.buscar(codificar_consultas(consultas), k, nprobe, ef_search, filtros, rerank, min_similitud)
+
+#Agrupa las llamadas concurrentes a /buscar/ (ventana en ms, 0 = desactivado)
+microlotes = MicroLotes(
+    buscar_lote,
+    ventana_ms=float(os.environ.get("BCP_MICROLOTE_MS", "5")),
+    maximo=int(os.environ.get("BCP_MICROLOTE_MAX", "64"))
 )
 
-#Cargar el documento:
-with open("data/documentos.txt","r",encoding="utf-8") as f:
-    documentos = [line.strip() for line in f.readlines()]
+MAX_CONSULTAS_LOTE = 256
+
+#Indice BM25 sobre el mismo corpus (se actualiza cuando cambia el almacen)
+def crear_indice_lexico(instantanea):
+    #Las filas eliminadas sin compactar quedan sin texto (no tienen postings)
+    ids = instantanea.ids.tolist()
+    return IndiceBM25(ids, [instantanea.documentos.get(i) for i in ids], instantanea.columnas)
+
+def actualizar_indice_lexico(instantanea):
+    #Solo se tokenizan los documentos nuevos (corre bajo el lock de escritura
+    #del almacen); tras una compactacion las filas cambian y se reconstruye
+    global indice_lexico
+    nuevo = None
+    if indice_lexico is not None:
+        nuevo = indice_lexico.actualizado(instantanea.ids, instantanea.documentos, instantanea.columnas,
+                                          instantanea.eliminados.values())
+    indice_lexico = crear_indice_lexico(instantanea) if nuevo is None else nuevo
+
+def _cargar():
+    global modelo, almacen, indice_lexico, indice_recursos
+    #Cargar el documento (archivo o carpeta, BCP_RUTA_DOCUMENTOS), linea por linea
+    documentos = arranque.medir("documentos", documentos_unicos, RUTA_DOCUMENTOS)
+    modelo = arranque.medir("modelo", crear_codificador, NOMBRE_MODELO, TIPO_CODIFICADOR, HILOS_TORCH)
+    embeddings, index = arranque.medir("indice", construir_indice, documentos, modelo, NOMBRE_MODELO,
+                                       CONFIG_INDICE, al_avanzar=arranque.avanzar, codificador=TIPO_CODIFICADOR)
+
+    #Almacen vivo: permite agregar/eliminar documentos sin reiniciar la API
+    nuevo = arranque.medir("almacen", AlmacenDocumentos, documentos, embeddings, index, codificar,
+                           NOMBRE_MODELO, CONFIG_INDICE, RUTA_DOCUMENTOS, codificador=TIPO_CODIFICADOR)
+    #BM25 se actualiza antes de publicar la version nueva (una busqueda
+    #lexica con la version nueva nunca lee el BM25 anterior) y los resultados
+    #en cache dejan de ser validos cuando cambia el indice
+    nuevo.preparadores.append(actualizar_indice_lexico)
+    nuevo.suscriptores.append(lambda instantanea: cache_resultados.limpiar())
+    indice_lexico = arranque.medir("indice lexico", crear_indice_lexico, nuevo.instantanea)
+    almacen = nuevo
+    #Vectores guardados de los recursos de Azure (los del inventario que llego
+    #antes que el modelo se codifican en iniciar_indice_recursos)
+    indice_recursos = arranque.medir("indice recursos", IndiceRecursos, codificar, NOMBRE_MODELO)
+
+def cargar_servicio():
+    #Documentos, modelo, indice FAISS, almacen y BM25 (una sola vez por proceso)
+    arranque.ejecutar(_cargar)
+
+def iniciar_indice_recursos():
+    #Si el inventario llego antes que el modelo, se vuelve a notificar para
+    #codificar sus recursos, en segundo plano (no retrasa /readyz). Se llama
+    #desde el lifespan de cada worker: en modo prefork el padre no inicia
+    #hilos antes del fork (un hilo con inventario.lock tomado lo dejaria
+    #bloqueado en el hijo)
+    if INVENTARIO_ACTIVO:
+        threading.Thread(target=inventario.renotificar, name="indice-recursos", daemon=True).start()
+
+def cargar_worker():
+    cargar_servicio()
+    iniciar_indice_recursos()
 
-modelo = SentenceTransformer("all-MiniLM-L6-v2")
-embeddings= modelo.encode(documentos,convert_to_numpy=True).astype("float32")
-embeddings= embeddings/np.linalg.norm(embeddings,axis=1,keepdims=True)
+#Modo de busqueda por defecto de /buscar/ (semantic, lexical o hybrid)
+MODO_BUSQUEDA = os.environ.get("BCP_MODO_BUSQUEDA", "semantic")
 
-#FAISS con Inner Product (FlatIP)  (similitud de Coseno)
-dimension = embeddings.shape[1]
-index = faiss.IndexFlatIP(dimension)
-index.add(embeddings)
+def con_textos(pares, similitudes=None):
+    #(id, puntaje) -> (id, documento, similitud, puntaje), omitiendo ids ya
+    #eliminados. La similitud coseno solo se conoce si el documento vino de
+    #FAISS (similitudes: id -> coseno); si no, None
+    documentos = almacen.instantanea.documentos
+    similitudes = similitudes or {}
+    return [(idx, documentos[idx], similitudes.get(idx), puntaje) for idx, puntaje in pares if idx in documentos]
 
+def con_puntaje(filas):
+    #Semantica: el puntaje del ranking es la misma similitud coseno
+    return [(idx, documento, similitud, similitud) for idx, documento, similitud in filas]
 
-@app.get("/buscar/")
-def buscar(query: str = Query(...),k: int=3):
-    vec = modelo.encode([query],convert_to_numpy=True).astype("float32")
-    vec = vec/np.linalg.norm(vec)
-    similitudes, indices = index.search(vec,k)
+def buscar_documentos(query, k, mode, fusion, alpha, nprobe, ef_search, proyecto=None, tipo=None,
+                      rerank=None, min_similitud=None):
+    #Los filtros (proyecto, tipo de activo) se aplican dentro de cada busqueda
+    filtros = {"proyecto": proyecto, "tipo": tipo}
+    if mode == "semantic":
+        return con_puntaje(microlotes.enviar(query,k,nprobe=nprobe,ef_search=ef_search,proyecto=proyecto,
+                                             tipo=tipo,rerank=rerank,min_similitud=min_similitud))
+    codigo = codigo_de(query)
+    if codigo and min_similitud is None:
+        #Consulta que es un codigo exacto (FWL-YAP-002): si algun documento lo
+        #tiene no hace falta el modelo; si no, sigue la busqueda normal
+        with tramo("bm25"):
+            exactos = indice_lexico.buscar_codigo(codigo, k, filtros)
+        if exactos:
+            return con_textos(exactos)
+    if mode == "lexical":
+        with tramo("bm25"):
+            return con_textos(indice_lexico.buscar(query, k, filtros))
+
+    #Hibrido: candidatos de ambos lados y fusion de rankings (min_similitud
+    #se aplica a los candidatos semanticos)
+    profundidad = max(4 * k, 20)
+    with tramo("bm25"):
+        lexica = indice_lexico.buscar(query, profundidad, filtros)
+    semantica = [(idx, sim) for idx, _, sim in
+                 microlotes.enviar(query,profundidad,nprobe=nprobe,ef_search=ef_search,
+                                   proyecto=proyecto,tipo=tipo,rerank=rerank,min_similitud=min_similitud)]
+    with tramo("fusion"):
+        if fusion == "ponderada":
+            return con_textos(fusion_ponderada(semantica, lexica, k, alpha), dict(semantica))
+        return con_textos(fusion_rrf([semantica, lexica], k), dict(semantica))
+
+#Campos que se pueden pedir con campos=... (proyecto, codigo, tipo y
+#descripcion salen de separar la linea del documento). similitud es siempre
+#la coseno (None si el documento no vino de FAISS); puntaje es el valor por
+#el que se ordena en cada modo (coseno, BM25 o el de la fusion)
+CAMPOS_RESULTADO = ("id", "documento", "similitud", "puntaje", "proyecto", "codigo", "tipo", "descripcion")
+
+def leer_campos(campos):
+    if not campos:
+        return None
+    pedidos = [c.strip() for c in campos.split(",") if c.strip()]
+    desconocidos = [c for c in pedidos if c not in CAMPOS_RESULTADO]
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(desconocidos)}; "
+                                                    f"disponibles: {', '.join(CAMPOS_RESULTADO)}")
+    return pedidos
+
+def formatear_resultados(filas, campos=None):
+    #Sin campos: id, documento, similitud y puntaje (respuesta completa)
     resultados = []
-    for i,idx in enumerate(indices[0]):
-        resultados.append({
-            "documento": documentos[idx],
-            "similitud":float(similitudes[0][i])
-        })
-    return {"consulta": query,"resultados":resultados}
-
-# Endpoint para obtener recursos de un grupo específico
-@app.get("/azure-resources/")
-def get_azure_resources(search: str = None):
+    for idx, documento, similitud, puntaje in filas:
+        if campos is None:
+            resultados.append({
+                "id": idx,
+                "documento": documento,
+                "similitud": similitud,
+                "puntaje": puntaje
+            })
+            continue
+        valores = {"id": idx, "documento": documento, "similitud": similitud, "puntaje": puntaje}
+        if any(c not in valores for c in campos):
+            valores.update(separar_campos(documento))
+        resultados.append({c: valores[c] for c in campos})
+    return resultados
+
+#Paginacion de /buscar/: el cursor lleva la consulta con sus parametros,
+#el desplazamiento y la version del indice. La pagina siguiente busca con
+#k = desde + k (el vector de la consulta sale de la cache de embeddings, sin
+#volver a pasar por el modelo) y se queda con la parte nueva
+MAX_PROFUNDIDAD = int(os.environ.get("BCP_MAX_PROFUNDIDAD", "1000"))
+
+CLAVES_CURSOR = {"query", "k", "mode", "fusion", "alpha", "nprobe", "ef_search", "proyecto", "tipo", "rerank",
+                 "min_similitud", "campos", "desde", "version"}
+
+def crear_cursor(parametros):
+    texto = json.dumps(parametros, separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii").rstrip("=")
+
+def leer_cursor(cursor):
     try:
-        # Obtener recursos del grupo de recursos RSGYAPE001 usando Azure CLI a través de PowerShell
-        print(f"Ejecutando Azure CLI a través de PowerShell")
-        print("Consultando recursos del grupo RSGYAPE001...")
-        
-        # Comando PowerShell para ejecutar Azure CLI
-        powershell_command = "powershell -Command \"az resource list --resource-group RSGYAPE001\""
-        
-        # Este comando utiliza la autenticación actual de Azure CLI
-        result = subprocess.run(
-            powershell_command,
-            shell=True,
-            capture_output=True, 
-            text=True
-        )
-        
-        if result.returncode != 0:
-            print(f"Error en Azure CLI: {result.stderr}")
-            return {"error": f"Error al ejecutar Azure CLI: {result.stderr}"}
-        
-        resources_json = result.stdout
-        print(f"Datos recibidos de Azure CLI: {len(resources_json)} bytes")
-        
+        parametros = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(parametros, dict) or not CLAVES_CURSOR <= parametros.keys():
+            raise ValueError(cursor)
+        return parametros
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def responder(contenido):
+    #La conversion a JSON se mide como una etapa mas (Server-Timing)
+    with tramo("serializacion"):
+        return JSONResponse(jsonable_encoder(contenido))
+
+
+@app.get("/buscar/", dependencies=LISTO)
+async def buscar(query: str = None,k: int = Query(3, ge=1),
+           mode: Literal["semantic", "lexical", "hybrid"] = MODO_BUSQUEDA,
+           fusion: Literal["rrf", "ponderada"] = "rrf",
+           alpha: float = Query(0.5, ge=0.0, le=1.0),
+           nprobe: int = Query(None, ge=1), ef_search: int = Query(None, ge=1),
+           proyecto: str = None, tipo: str = None, rerank: int = Query(None, ge=0),
+           min_similitud: float = Query(None, ge=-1.0, le=1.0), campos: str = None,
+           cursor: str = None):
+    #mode: semantica (FAISS), lexica (BM25) o hibrida (fusion rrf/ponderada)
+    #nprobe (IVF) y ef_search (HNSW) ajustan precision vs latencia por peticion
+    #proyecto=YAPE / tipo=FWL,SRV restringen los candidatos antes de buscar
+    #rerank=r reordena k*r candidatos con la similitud exacta (indices compactos)
+    #min_similitud=0.5 descarta los vecinos con menor similitud (range search)
+    #campos=id,codigo,similitud devuelve solo esos campos (sin el texto completo)
+    #cursor (campo "siguiente" de la respuesta) pide la pagina siguiente; los
+    #demas parametros se toman del cursor
+    if cursor:
+        p = leer_cursor(cursor)
+        if p.get("version") != almacen.version:
+            raise HTTPException(status_code=409, detail="El índice cambió desde la primera página, repita la búsqueda")
+    elif query is None:
+        raise HTTPException(status_code=400, detail="Falta query (o cursor)")
+    else:
+        p = {"query": query, "k": k, "mode": mode, "fusion": fusion, "alpha": alpha, "nprobe": nprobe,
+             "ef_search": ef_search, "proyecto": proyecto, "tipo": tipo, "rerank": rerank,
+             "min_similitud": min_similitud, "campos": campos, "desde": 0, "version": almacen.version}
+    if p["min_similitud"] is not None and p["mode"] == "lexical":
+        raise HTTPException(status_code=400, detail="min_similitud no aplica al modo lexical")
+    proyeccion = leer_campos(p["campos"])
+    desde, k = p["desde"], p["k"]
+    if desde + k > MAX_PROFUNDIDAD:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_PROFUNDIDAD} resultados por búsqueda")
+
+    #Se pide uno de mas para saber si hay otra pagina
+    n = desde + k + 1
+    argumentos = (p["query"], n, p["mode"], p["fusion"], p["alpha"], p["nprobe"], p["ef_search"], p["proyecto"],
+                  p["tipo"], p["rerank"], p["min_similitud"])
+    clave = (clave_consulta(p["query"]),) + argumentos[1:]
+    version = almacen.version
+    filas = cache_resultados.obtener(clave)
+    if filas is None:
+        #Las respuestas en cache no ocupan el pool de inferencia
+        filas = await pool_inferencia.ejecutar(buscar_documentos, *argumentos)
+        #No guardar si el indice cambio mientras se buscaba
+        if almacen.version == version:
+            cache_resultados.guardar(clave, filas)
+    siguiente = crear_cursor(dict(p, desde=desde + k)) if len(filas) > desde + k else None
+    return responder({"consulta": p["query"], "modo": p["mode"], "desde": desde,
+                      "resultados": formatear_resultados(filas[desde:desde + k], proyeccion),
+                      "siguiente": siguiente})
+
+
+class ConsultasLote(BaseModel):
+    #Mismos limites que los parametros de /buscar/ (un valor fuera de rango es 422)
+    consultas: list[str]
+    k: int = Field(3, ge=1, le=MAX_PROFUNDIDAD)
+    nprobe: Optional[int] = Field(None, ge=1)
+    ef_search: Optional[int] = Field(None, ge=1)
+    proyecto: Optional[str] = None
+    tipo: Optional[str] = None
+    rerank: Optional[int] = Field(None, ge=0)
+    min_similitud: Optional[float] = Field(None, ge=-1.0, le=1.0)
+    campos: Optional[str] = None
+
+# Varias consultas en una sola llamada
+@app.post("/buscar/batch", dependencies=LISTO)
+async def buscar_batch(body: ConsultasLote):
+    if not body.consultas:
+        return {"resultados": []}
+    if len(body.consultas) > MAX_CONSULTAS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_CONSULTAS_LOTE} consultas por lote")
+    proyeccion = leer_campos(body.campos)
+    TAMANO_LOTES.observar(len(body.consultas), "batch")
+    filas = await pool_inferencia.ejecutar(buscar_lote, body.consultas, body.k, body.nprobe,
+                                           body.ef_search, body.proyecto, body.tipo, body.rerank,
+                                           body.min_similitud)
+    return responder({"resultados": [
+        {"consulta": consulta, "resultados": formatear_resultados(con_puntaje(f), proyeccion)}
+        for consulta, f in zip(body.consultas, filas)
+    ]})
+
+# Contadores de las caches de consultas (para dimensionarlas)
+@app.get("/stats/cache", dependencies=LISTO)
+async def stats_cache():
+    return {
+        "embeddings": cache_embeddings.estadisticas(),
+        "resultados": cache_resultados.estadisticas(),
+        "version_indice": almacen.version
+    }
+
+# Tipo de indice en uso y parametros de busqueda por defecto
+@app.get("/stats/indice", dependencies=LISTO)
+async def stats_indice():
+    return {
+        "configuracion": CONFIG_INDICE,
+        "codificador": TIPO_CODIFICADOR,
+        "documentos": len(almacen),
+        "agregados": almacen.instantanea.agregados,
+        "eliminados": len(almacen.instantanea.eliminados),
+        "compactaciones": almacen.compactaciones,
+        "nprobe": NPROBE,
+        "ef_search": EF_SEARCH,
+        "rerank": RERANK
+    }
+
+
+class NuevoDocumento(BaseModel):
+    documento: str
+
+class LoteDocumentos(BaseModel):
+    documentos: list[str]
+
+# Agregar un documento al indice sin reiniciar
+@app.post("/documentos", dependencies=LISTO)
+async def agregar_documento(body: NuevoDocumento):
+    ids = await pool_ingesta.ejecutar(almacen.agregar, [body.documento])
+    if ids[0] is None:
+        raise HTTPException(status_code=400, detail="El documento está vacío")
+    return {"id": ids[0], "total": len(almacen)}
+
+# Agregar varios documentos (se codifican por lotes)
+@app.post("/documentos/lote", dependencies=LISTO)
+async def agregar_documentos(body: LoteDocumentos):
+    ids = await pool_ingesta.ejecutar(almacen.agregar, body.documentos)
+    return {"ids": ids, "total": len(almacen)}
+
+# Valores disponibles para filtrar /buscar/ (proyecto, tipo de activo)
+@app.get("/documentos/campos", dependencies=LISTO)
+async def campos_documentos():
+    return almacen.instantanea.columnas.valores()
+
+# Eliminar un documento del indice por su id
+@app.delete("/documentos/{doc_id}", dependencies=LISTO)
+async def eliminar_documento(doc_id: int):
+    if not await pool_ingesta.ejecutar(almacen.eliminar, [doc_id]):
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    return {"eliminado": doc_id, "total": len(almacen)}
+
+# Liveness: el proceso responde (solo falla si la carga termino con error)
+@app.get("/healthz")
+async def healthz():
+    if arranque.estado == "error":
+        return JSONResponse(status_code=503, content={"estado": "error", "error": arranque.error})
+    return {"estado": "vivo"}
+
+# Readiness: 200 cuando el modelo y el indice estan cargados; mientras tanto
+# 503 con la fase en curso, el avance de la codificacion y lo que tardo cada fase
+@app.get("/readyz")
+async def readyz():
+    resumen = arranque.resumen()
+    if not arranque.listo:
+        return JSONResponse(status_code=503, content=resumen, headers={"Retry-After": "5"})
+    return resumen
+
+#Inventario de Azure en memoria, refrescado en segundo plano con el SDK
+inventario = InventarioAzure()
+
+#Motor de ranking de recursos. Con una carga completa del inventario se
+#reconstruye; con cambios se le aplican solo esos (ver MotorRanking.aplicar).
+#Cuando el modelo esta cargado incluye los vectores de los recursos
+#(indice_recursos solo codifica los nuevos o modificados)
+motor_recursos = MotorRanking([])
+indice_recursos = None
+
+#Modo por defecto de /azure-resources/search: hibrido (puntaje por niveles
+#mezclado con la similitud semantica) o lexico
+MODO_RECURSOS = os.environ.get("BCP_RECURSOS_MODO", "hibrido")
+ALPHA_RECURSOS = float(os.environ.get("BCP_RECURSOS_ALPHA", "0.5"))
+
+#Se reconstruye igual si el cambio toca mas de esta proporcion del inventario
+#o si el motor acumula demasiadas filas borradas
+MAX_CAMBIOS_INCREMENTAL = float(os.environ.get("BCP_RECURSOS_MAX_CAMBIOS", "0.25"))
+MAX_FRAGMENTACION = float(os.environ.get("BCP_RECURSOS_MAX_FRAGMENTACION", "0.2"))
+
+def actualizar_motor_recursos(recursos, cambios=None):
+    global motor_recursos
+    motor = motor_recursos
+    if (cambios is not None and len(cambios) <= MAX_CAMBIOS_INCREMENTAL * max(len(motor), 1)
+            and motor.fragmentacion <= MAX_FRAGMENTACION
+            and motor.semantico == (indice_recursos is not None)):
+        quitar, agregar = resumir_cambios(cambios)
         try:
-            resources = json.loads(resources_json)
-        except json.JSONDecodeError:
-            return {"error": "Error al decodificar la respuesta de Azure CLI"}
-        
-        # Formatear los recursos para la respuesta
-        formatted_resources = []
-        for resource in resources:
-            formatted_resources.append({
-                "id": resource["id"],
-                "name": resource["name"], 
-                "type": resource["type"],
-                "location": resource.get("location", "Global")
-            })
+            embeddings = indice_recursos.vectores_de(agregar) if motor.semantico else None
+            motor_recursos = motor.aplicar(quitar, agregar, embeddings)
+            return
+        except Exception as e:
+            print(f"Error al aplicar los cambios de Azure al ranking: {str(e)}")
+    embeddings = None
+    if indice_recursos is not None:
+        try:
+            embeddings = indice_recursos.vectores(recursos)
+        except Exception as e:
+            #Sin vectores el ranking sigue siendo lexico
+            print(f"Error al codificar los recursos de Azure: {str(e)}")
+    motor_recursos = MotorRanking(recursos, embeddings)
+
+inventario.suscriptores.append(actualizar_motor_recursos)
+
+async def recursos_en_memoria(refrescar):
+    # Solo se ocupa el pool de Azure cuando hay que consultar a Azure
+    if refrescar or inventario.recursos is None:
+        await pool_azure.ejecutar(inventario.obtener, refrescar)
+    return inventario.recursos
+
+def coinciden_recursos(recursos, search):
+    #Generador: en las respuestas por partes se filtra mientras se envia
+    search = search.strip().lower()
+    for resource in recursos:
+        if (search in resource["name"].lower() or
+            search in resource["type"].lower() or
+            search in resource.get("location", "").lower()):
+            yield resource
+
+def filtrar_recursos(recursos, search):
+    with tramo("filtro_recursos"):
+        return list(coinciden_recursos(recursos, search))
+
+def codificar_consulta(q):
+    #El vector de la consulta sale de la cache de embeddings si ya se pidio
+    return codificar_consultas([q])[0]
+
+def rankear_recursos(motor, q, tipo, umbral, limit, vector=None, alpha=ALPHA_RECURSOS):
+    with tramo("ranking"):
+        return motor.buscar(q, tipo, umbral, limit, vector, alpha)
+
+# Endpoint para obtener los recursos de los grupos configurados; "errores"
+# lista los grupos que fallaron en el ultimo refresco (se sirven sus recursos anteriores).
+# formato=ndjson|sse envia los recursos a medida que se serializan (ver transmision.py)
+@app.get("/azure-resources/")
+async def get_azure_resources(search: str = None, refresh: bool = False,
+                              formato: Literal["json", "ndjson", "sse"] = "json"):
+    try:
+        # Se sirve la lista en memoria; refresh=true fuerza una consulta a Azure
+        formatted_resources = await recursos_en_memoria(refresh)
+        filtrar = bool(search and search.strip())
+
+        if formato != "json":
+            meta = {"total": None if filtrar else len(formatted_resources),
+                    "edad_segundos": inventario.edad_segundos(), "errores": inventario.errores,
+                    "secuencia": inventario.secuencia}
+            filas = coinciden_recursos(formatted_resources, search) if filtrar else formatted_resources
+            return responder_por_partes(formato, meta, filas)
         
         # Filtrar por término de búsqueda si se proporciona
-        if search and search.strip():
-            search = search.strip()
-            results = []
-            
-            for resource in formatted_resources:
-                if (search.lower() in resource["name"].lower() or 
-                    search.lower() in resource["type"].lower() or
-                    search.lower() in resource.get("location", "").lower()):
-                    results.append(resource)
-            
-            return {"resources": results}
+        if filtrar:
+            results = await pool_recursos.ejecutar(filtrar_recursos, formatted_resources, search)
+            return responder({"resources": results, "edad_segundos": inventario.edad_segundos(),
+                              "errores": inventario.errores, "secuencia": inventario.secuencia})
         
-        # Si no hay filtro, devolver todos los recursos
-        return {"resources": formatted_resources}
+        # Si no hay filtro, devolver todos los recursos ("secuencia" sirve
+        # para pedir despues solo los cambios a /azure-resources/changes)
+        return responder({"resources": formatted_resources, "edad_segundos": inventario.edad_segundos(),
+                          "errores": inventario.errores, "secuencia": inventario.secuencia})
         
+    except Saturado:
+        raise
+    except Exception as e:
+        print(f"Error al obtener recursos: {str(e)}")
+        return responder_error(formato, f"Error al obtener recursos: {str(e)}")
+
+#Resultados maximos de /azure-resources/search en JSON y por partes
+MAX_RESULTADOS_RECURSOS = 1000
+MAX_RESULTADOS_STREAM = int(os.environ.get("BCP_STREAM_MAX_RESULTADOS", "100000"))
+
+# Búsqueda difusa de recursos en el servidor (misma escala que el frontend)
+@app.get("/azure-resources/search")
+async def buscar_azure_resources(q: str = Query(...), tipo: str = None,
+                                 umbral: float = Query(0.3, ge=0.0, le=1.0),
+                                 limit: int = Query(50, ge=1),
+                                 modo: Literal["hibrido", "lexico"] = MODO_RECURSOS,
+                                 alpha: float = Query(ALPHA_RECURSOS, ge=0.0, le=1.0),
+                                 refresh: bool = False,
+                                 formato: Literal["json", "ndjson", "sse"] = "json"):
+    #modo=hibrido mezcla el puntaje por niveles con la similitud semantica
+    #(peso alpha); mientras el modelo no este cargado se usa el lexico
+    maximo = MAX_RESULTADOS_RECURSOS if formato == "json" else MAX_RESULTADOS_STREAM
+    if limit > maximo:
+        raise HTTPException(status_code=400, detail=f"Máximo {maximo} resultados con formato={formato}")
+    try:
+        await recursos_en_memoria(refresh)
+    except Saturado:
+        raise
     except Exception as e:
         print(f"Error al obtener recursos: {str(e)}")
-        return {"error": f"Error al obtener recursos: {str(e)}"}
\ No newline at end of file
+        return responder_error(formato, f"Error al obtener recursos: {str(e)}")
+    motor = motor_recursos
+    semantico = modo == "hibrido" and motor.semantico and arranque.listo
+    #La consulta se codifica en el pool de inferencia (el del modelo); el
+    #pool de recursos solo hace el ranking
+    vector = await pool_inferencia.ejecutar(codificar_consulta, q) if semantico else None
+    total, resultados = await pool_recursos.ejecutar(rankear_recursos, motor, q, tipo, umbral, limit,
+                                                     vector, alpha)
+    meta = {
+        "consulta": q,
+        "modo": "hibrido" if semantico else "lexico",
+        "total": total,
+        "recursos_totales": len(motor),
+        "edad_segundos": inventario.edad_segundos(),
+        "errores": inventario.errores
+    }
+    if formato != "json":
+        return responder_por_partes(formato, meta, resultados)
+    return responder({**meta, "resources": resultados})
+
+def leer_cambios(desde, limit):
+    #desde: secuencia (entero) o instante ISO 8601; devuelve (secuencia de
+    #partida, cambios, ultima secuencia del registro)
+    if desde.isdigit():
+        return (int(desde),) + inventario.cambios(int(desde), limit + 1)
+    try:
+        momento = datetime.fromisoformat(desde.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since debe ser una secuencia o una fecha ISO 8601")
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=timezone.utc)
+    cambios, ultima = inventario.cambios(None, limit + 1, momento.timestamp())
+    return (cambios[0][0] - 1 if cambios else ultima), cambios, ultima
+
+# Cambios del inventario (altas, modificaciones y bajas) posteriores a
+# `since`: el cliente guarda "hasta" y lo pasa en la siguiente llamada.
+# 410 si esos cambios ya se descartaron (hay que pedir la lista completa)
+@app.get("/azure-resources/changes")
+async def cambios_azure_resources(since: str = Query(...), limit: int = Query(1000, ge=1, le=10000)):
+    try:
+        desde, cambios, ultima = await pool_recursos.ejecutar(leer_cambios, since, limit)
+    except HistorialIncompleto as e:
+        raise HTTPException(status_code=410, detail=f"El registro de cambios empieza en la secuencia {e.args[0]}, "
+                                                    "vuelva a pedir /azure-resources/")
+    hay_mas = len(cambios) > limit
+    cambios = cambios[:limit]
+    return responder({
+        "desde": desde,
+        "hasta": cambios[-1][0] if cambios else ultima,
+        "ultima": ultima,
+        "hay_mas": hay_mas,
+        "cambios": [{"secuencia": secuencia, "operacion": operacion, "id": id_, "recurso": recurso,
+                     "momento": datetime.fromtimestamp(momento, timezone.utc).isoformat()}
+                    for secuencia, operacion, id_, recurso, momento in cambios]
+    })
+
+# Estado del inventario (antigüedad de la lista, errores y tiempos por grupo)
+@app.get("/azure-resources/estado")
+async def estado_azure_resources():
+    estado = inventario.estado()
+    estado["indice_semantico"] = indice_recursos.estadisticas() if indice_recursos is not None else None
+    return estado
+
+# Ocupacion de cada pool de ejecucion y tareas rechazadas (503)
+@app.get("/stats/ejecutores")
+async def stats_ejecutores():
+    return {pool.nombre: pool.estadisticas() for pool in pools_de_ejecucion()}
+
+def pools_de_ejecucion():
+    pools = [pool_inferencia, pool_ingesta, pool_azure, pool_recursos]
+    if pool_modelo is not None:
+        pools.append(pool_modelo)
+    return pools
+
+#Metricas que se leen al exponer /metrics (tamaño del indice, caches, pools, inventario)
+CACHES = (("embeddings", cache_embeddings), ("resultados", cache_resultados))
+Calculada("bcp_indice_documentos", "Documentos en el indice vectorial",
+          lambda: len(almacen) if almacen is not None else None)
+Calculada("bcp_cache_aciertos_ratio", "Aciertos sobre consultas de cada cache",
+          lambda: [((nombre,), cache.estadisticas()["tasa_aciertos"]) for nombre, cache in CACHES], ("cache",))
+Calculada("bcp_cache_consultas_total", "Consultas a cada cache por resultado",
+          lambda: [((nombre, resultado), cache.estadisticas()[resultado])
+                   for nombre, cache in CACHES for resultado in ("aciertos", "fallos")],
+          ("cache", "resultado"), tipo="counter")
+Calculada("bcp_pool_en_curso", "Tareas en ejecucion o en cola en cada pool",
+          lambda: [((pool.nombre,), pool.estadisticas()["en_curso"]) for pool in pools_de_ejecucion()], ("pool",))
+Calculada("bcp_pool_rechazadas_total", "Tareas rechazadas (503) por pool saturado",
+          lambda: [((pool.nombre,), pool.estadisticas()["rechazadas"]) for pool in pools_de_ejecucion()],
+          ("pool",), tipo="counter")
+Calculada("bcp_inventario_recursos", "Recursos de Azure en memoria",
+          lambda: len(inventario.recursos) if inventario.recursos is not None else None)
+Calculada("bcp_inventario_edad_segundos", "Antigüedad de la lista de recursos de Azure", inventario.edad_segundos)
+Calculada("bcp_recursos_codificados_total", "Recursos de Azure pasados por el modelo (indice semantico)",
+          lambda: indice_recursos.codificados if indice_recursos is not None else None, tipo="counter")
+Calculada("bcp_listo", "1 cuando el modelo y el indice estan cargados", lambda: int(arranque.listo))
+
+# Metricas en formato de texto de Prometheus
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
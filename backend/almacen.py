@@ -0,0 +1,446 @@
+#------------------------------------------------------
+#----Almacen de documentos con ingesta en caliente-----
+#------------------------------------------------------
+# Mantiene el indice FAISS vivo mientras se agregan o eliminan documentos.
+# Cada cambio se aplica sobre una copia (copy-on-write) y luego se publica
+# con una sola asignacion, asi las busquedas concurrentes nunca ven un
+# indice a medio construir. Las escrituras se serializan con un lock.
+#
+# Los documentos agregados no tocan el indice principal ni su matriz (que
+# puede estar en memory-map): van a un segmento aparte, con su propio
+# indice exacto, que se busca junto con el principal. En disco se agregan
+# al final de documentos.txt y del registro de agregados, sin reescribir el
+# artefacto. Con mas de BCP_MAX_AGREGADOS en el segmento se compacta: se
+# incorporan al indice principal y se reescribe el artefacto completo.
+#
+# Eliminar tampoco reescribe nada: el documento queda marcado (su fila sigue
+# en los indices, pero las busquedas la excluyen) y la eliminacion se anota
+# en el mismo registro. Con mas de BCP_MAX_ELIMINADOS marcados se compacta
+# y sus filas salen del indice, de la matriz y de documentos.txt.
+
+import os
+import threading
+
+import faiss
+import numpy as np
+
+from campos import ColumnasDocumentos
+from indice_vectorial import (RERANK, RUTA_INDICE, admite_mmap, aplicar_parametros, bloqueo_indice,
+                              buscar_indice, buscar_rango, cargar_indice, clonar_indice, crear_indice, crear_meta,
+                              es_binario, guardar_indice, hash_documento, id_documento, leer_agregados,
+                              leer_eliminados, parametros_busqueda, registrar_agregados, registrar_eliminados,
+                              reordenar_exacto, vectores_para)
+from metricas import tramo
+
+# Tamaño de lote para codificar documentos nuevos
+TAMANO_LOTE = int(os.environ.get("BCP_TAMANO_LOTE", "64"))
+
+# Con filtros que dejan hasta esta cantidad de filas se calcula la similitud
+# exacta solo sobre ellas (costo proporcional al subconjunto, no al corpus);
+# con mas filas se busca en FAISS con un selector de ids
+MAX_FILAS_FILTRO_EXACTO = int(os.environ.get("BCP_MAX_FILAS_FILTRO_EXACTO", "50000"))
+
+# Documentos agregados que se acumulan en el segmento aparte antes de compactar
+MAX_AGREGADOS = int(os.environ.get("BCP_MAX_AGREGADOS", "10000"))
+
+# Documentos eliminados (filas marcadas) que se acumulan antes de compactar
+MAX_ELIMINADOS = int(os.environ.get("BCP_MAX_ELIMINADOS", "10000"))
+
+
+def limpiar_texto(texto):
+    # Cada documento ocupa una linea de documentos.txt (se conservan los
+    # tabuladores que separan los campos)
+    return texto.replace("\r", " ").replace("\n", " ").strip()
+
+
+def _agregar_lineas(ruta, textos):
+    # Al final del archivo, sin reescribirlo (si la ultima linea no terminaba
+    # en salto de linea, se agrega uno antes)
+    with open(ruta, "a+b") as f:
+        separador = b""
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            separador = b"" if f.read(1) == b"\n" else b"\n"
+        f.write(separador + "".join(t + "\n" for t in textos).encode("utf-8"))
+
+
+class MatrizSegmentada:
+    """
+    Matriz principal (p. ej. el memory-map de embeddings.npy) seguida de las
+    filas agregadas despues, sin copiar la principal. Admite las lecturas
+    que hace el almacen: filas por indices o por mascara booleana.
+    """
+    def __init__(self, principal, agregadas=None):
+        self.principal = principal
+        if agregadas is None:
+            agregadas = np.empty((0, principal.shape[1]), dtype="float32")
+        self.agregadas = agregadas
+        self.shape = (len(principal) + len(agregadas), principal.shape[1])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def con_filas(self, filas):
+        # Nueva matriz con `filas` al final (solo se copian las agregadas)
+        return MatrizSegmentada(self.principal, np.vstack([self.agregadas, filas]))
+
+    def __getitem__(self, filas):
+        filas = np.asarray(filas)
+        if filas.dtype == bool:
+            filas = np.flatnonzero(filas)
+        if not len(self.agregadas):
+            return self.principal[filas]
+        n = len(self.principal)
+        en_principal = filas < n
+        salida = np.empty((len(filas), self.shape[1]), dtype="float32")
+        salida[en_principal] = self.principal[filas[en_principal]]
+        salida[~en_principal] = self.agregadas[filas[~en_principal] - n]
+        return salida
+
+    def completa(self):
+        # Una sola matriz en memoria (para compactar)
+        return np.vstack([self.principal, self.agregadas])
+
+
+def indice_agregados(index, vectores, ids):
+    # Indice exacto del segmento de agregados (binario si el principal lo es,
+    # para que las similitudes se puedan comparar)
+    if not len(ids):
+        return None
+    return crear_indice({"tipo": "binario" if es_binario(index) else "flat"}, vectores, ids)[0]
+
+
+def combinar_busquedas(principal, agregados, k):
+    # Las k mejores de cada consulta entre los resultados de los dos indices
+    similitudes = np.hstack([principal[0], agregados[0]])
+    ids = np.hstack([principal[1], agregados[1]])
+    orden = np.argsort(-similitudes, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(similitudes, orden, axis=1), np.take_along_axis(ids, orden, axis=1)
+
+
+class Instantanea:
+    # Estado publicado: no se modifica despues de crearse
+    def __init__(self, documentos, embeddings, ids, index, columnas, version=0, index_agregados=None,
+                 eliminados=None):
+        self.documentos = documentos  # id -> texto (sin los eliminados)
+        self.embeddings = embeddings  # MatrizSegmentada float32 exacta, fila i <-> ids[i]
+        self.ids = ids
+        self.index = index            # indice principal: filas de embeddings.principal
+        self.index_agregados = index_agregados  # el resto de las filas (o None)
+        self.columnas = columnas      # campos (proyecto, codigo, tipo) por fila, sin los eliminados
+        self.version = version  # aumenta con cada cambio publicado
+        self.eliminados = eliminados or {}  # id -> fila de los documentos eliminados sin compactar
+        # Selector que excluye los eliminados de las busquedas sin filtros (el
+        # lote se guarda junto al selector: FAISS solo recibe un puntero)
+        self._excluidos = None
+        if self.eliminados:
+            lote = faiss.IDSelectorBatch(np.fromiter(self.eliminados, dtype="int64", count=len(self.eliminados)))
+            self._excluidos = (lote, faiss.IDSelectorNot(lote))
+        self._orden_ids = None
+
+    @property
+    def agregados(self):
+        return len(self.embeddings.agregadas)
+
+    @property
+    def selector_vigentes(self):
+        return self._excluidos[1] if self._excluidos else None
+
+    def vigentes(self):
+        # Mascara de las filas que no estan eliminadas
+        vigentes = np.ones(len(self.ids), dtype=bool)
+        vigentes[list(self.eliminados.values())] = False
+        return vigentes
+
+    def filas_de(self, ids):
+        # Fila de la matriz de cada id (busqueda binaria sobre los ids ordenados)
+        if self._orden_ids is None:
+            self._orden_ids = np.argsort(self.ids, kind="stable")
+        orden = self._orden_ids
+        return orden[np.searchsorted(self.ids[orden], ids)]
+
+
+class AlmacenDocumentos:
+    def __init__(self, documentos, embeddings, index, codificar, nombre_modelo, config_indice,
+                 ruta_documentos="data/documentos.txt", ruta_indice=RUTA_INDICE, codificador="torch"):
+        # codificar(textos) -> matriz float32 con filas normalizadas
+        self.codificar = codificar
+        self.nombre_modelo = nombre_modelo
+        self.codificador = codificador
+        self.config_indice = config_indice
+        self.ruta_documentos = ruta_documentos
+        self.ruta_indice = ruta_indice
+        self.lock_escritura = threading.Lock()
+        self.compactaciones = 0
+        # Funciones a llamar con cada estado nuevo: los preparadores antes de
+        # publicarlo (indices derivados, p. ej. BM25) y los suscriptores despues
+        # (p. ej. caches)
+        self.preparadores = []
+        self.suscriptores = []
+        hashes = [hash_documento(d) for d in documentos]
+        ids = np.array([id_documento(h) for h in hashes], dtype="int64")
+        # Los documentos que siguen a las filas del artefacto se agregaron
+        # por la API: su vector esta en el registro de agregados
+        matriz = MatrizSegmentada(embeddings)
+        if len(documentos) > len(embeddings):
+            registro = leer_agregados(embeddings.shape[1], ruta_indice)
+            matriz = matriz.con_filas(np.vstack([registro[h] for h in hashes[len(embeddings):]]))
+        # Los eliminados despues de la ultima compactacion siguen en documentos.txt
+        marcados = leer_eliminados(ruta_indice)
+        eliminados = {int(ids[fila]): fila for fila, h in enumerate(hashes) if h in marcados}
+        columnas = ColumnasDocumentos.desde_textos(documentos)
+        if eliminados:
+            columnas = columnas.sin_filas(list(eliminados.values()))
+        self.instantanea = Instantanea({i: d for i, d in zip(ids.tolist(), documentos) if i not in eliminados},
+                                       matriz, ids, index, columnas,
+                                       index_agregados=indice_agregados(index, matriz.agregadas,
+                                                                        ids[len(embeddings):]),
+                                       eliminados=eliminados)
+
+    def __len__(self):
+        return len(self.instantanea.documentos)
+
+    @property
+    def version(self):
+        return self.instantanea.version
+
+    def buscar(self, vectores, k, nprobe=None, ef_search=None, filtros=None, rerank=None, min_similitud=None):
+        # Se toma una sola referencia al estado publicado. Con min_similitud
+        # solo se devuelven vecinos con similitud >= ese valor (range search)
+        instantanea = self.instantanea
+        rerank = RERANK if rerank is None else rerank
+        with tramo("filtro"):
+            filas = instantanea.columnas.filas_filtradas(filtros) if filtros else None
+        # Las columnas ya no tienen las filas eliminadas; sin filtros se
+        # excluyen con un selector
+        selector = instantanea.selector_vigentes
+        if filas is not None:
+            if len(filas) == 0:
+                return [[] for _ in range(len(vectores))]
+            if len(filas) <= MAX_FILAS_FILTRO_EXACTO:
+                with tramo("busqueda_exacta"):
+                    return self._buscar_en_filas(instantanea, vectores, k, filas, min_similitud)
+            selector = faiss.IDSelectorBatch(instantanea.ids[filas])
+        candidatos = k * rerank if rerank > 1 else k
+        with tramo("faiss"):
+            similitudes, indices = self._buscar_en_indice(instantanea.index, vectores, candidatos, min_similitud,
+                                                          parametros_busqueda(instantanea.index, nprobe,
+                                                                              ef_search, selector))
+            if instantanea.index_agregados is not None:
+                agregados = self._buscar_en_indice(instantanea.index_agregados, vectores, candidatos,
+                                                   min_similitud,
+                                                   parametros_busqueda(instantanea.index_agregados,
+                                                                       selector=selector))
+                similitudes, indices = combinar_busquedas((similitudes, indices), agregados, candidatos)
+        if rerank > 1:
+            with tramo("rerank"):
+                return self._reordenar(instantanea, vectores, indices, k, min_similitud)
+        resultados = []
+        for fila_sim, fila_ids in zip(similitudes, indices):
+            resultados.append([
+                (int(idx), instantanea.documentos[int(idx)], float(sim))
+                for sim, idx in zip(fila_sim, fila_ids)
+                if idx != -1 and int(idx) in instantanea.documentos
+            ])
+        return resultados
+
+    @staticmethod
+    def _buscar_en_indice(index, vectores, k, min_similitud, params):
+        if min_similitud is None:
+            return buscar_indice(index, vectores, k, params)
+        return buscar_rango(index, vectores, min_similitud, k, params)
+
+    def _reordenar(self, instantanea, vectores, indices, k, min_similitud=None):
+        # Los candidatos del indice compacto se ordenan con la similitud
+        # exacta float32 de la matriz en disco
+        resultados = []
+        for vector, fila_ids in zip(vectores, indices):
+            fila_ids = fila_ids[fila_ids != -1]
+            fila_ids = fila_ids[[int(i) in instantanea.documentos for i in fila_ids]]
+            if not len(fila_ids):
+                resultados.append([])
+                continue
+            filas, similitudes = reordenar_exacto(vector, instantanea.filas_de(fila_ids), instantanea.embeddings, k)
+            if min_similitud is not None:
+                # El umbral se vuelve a aplicar sobre la similitud exacta
+                filas, similitudes = filas[similitudes >= min_similitud], similitudes[similitudes >= min_similitud]
+            resultados.append([
+                (int(instantanea.ids[fila]), instantanea.documentos[int(instantanea.ids[fila])], float(sim))
+                for fila, sim in zip(filas, similitudes)
+            ])
+        return resultados
+
+    def _buscar_en_filas(self, instantanea, vectores, k, filas, min_similitud=None):
+        # Similitud exacta solo sobre las filas candidatas (sub-indice al vuelo)
+        similitudes = vectores @ np.asarray(instantanea.embeddings[filas], dtype="float32").T
+        k = min(k, len(filas))
+        resultados = []
+        for fila_sim in similitudes:
+            mejores = np.argpartition(-fila_sim, k - 1)[:k]
+            mejores = mejores[np.argsort(-fila_sim[mejores], kind="stable")]
+            resultados.append([
+                (int(instantanea.ids[filas[j]]), instantanea.documentos[int(instantanea.ids[filas[j]])], float(fila_sim[j]))
+                for j in mejores
+                if min_similitud is None or fila_sim[j] >= min_similitud
+            ])
+        return resultados
+
+    def agregar(self, textos):
+        """
+        Codifica solo los textos nuevos (en lotes) y los agrega al segmento
+        de agregados (los que se habian eliminado sin compactar solo vuelven
+        a quedar vigentes). Devuelve la lista de ids en el mismo orden de `textos`.
+        """
+        textos = [limpiar_texto(t) for t in textos]
+        ids = [id_documento(hash_documento(t)) if t else None for t in textos]
+
+        # Filtrar vacios, repetidos y documentos que ya estan en el indice
+        nuevos = {}
+        for idx, texto in zip(ids, textos):
+            if idx is not None and idx not in self.instantanea.documentos:
+                nuevos[idx] = texto
+        if not nuevos:
+            return ids
+
+        # La codificacion (lo mas costoso) se hace fuera del lock
+        lista_ids = list(nuevos)
+        vectores = np.vstack([
+            self.codificar([nuevos[i] for i in lista_ids[inicio:inicio + TAMANO_LOTE]])
+            for inicio in range(0, len(lista_ids), TAMANO_LOTE)
+        ])
+
+        with self.lock_escritura:
+            actual = self.instantanea
+            pendientes = {idx for idx in lista_ids if idx not in actual.documentos}
+            if pendientes:
+                # Un documento eliminado sin compactar sigue en los indices:
+                # solo se desmarca (y su linea sigue en documentos.txt)
+                revividos = {idx: actual.eliminados[idx] for idx in lista_ids if idx in pendientes and idx in actual.eliminados}
+                filas = [i for i, idx in enumerate(lista_ids) if idx in pendientes and idx not in revividos]
+                vectores_nuevos = np.ascontiguousarray(vectores[filas], dtype="float32")
+                ids_nuevos = np.array([lista_ids[i] for i in filas], dtype="int64")
+                textos_nuevos = [nuevos[lista_ids[i]] for i in filas]
+                documentos = dict(actual.documentos)
+                documentos.update(zip(ids_nuevos.tolist(), textos_nuevos))
+                documentos.update((idx, nuevos[idx]) for idx in revividos)
+                embeddings, ids_todos = actual.embeddings, actual.ids
+                columnas, index_agregados = actual.columnas, actual.index_agregados
+                if filas:
+                    # Solo se copian las filas del segmento de agregados, no la matriz principal
+                    embeddings = embeddings.con_filas(vectores_nuevos)
+                    ids_todos = np.concatenate([ids_todos, ids_nuevos])
+                    columnas = columnas.agregar(textos_nuevos)
+                    index_agregados = indice_agregados(actual.index, embeddings.agregadas,
+                                                       ids_todos[len(embeddings.principal):])
+                filas_revividas = np.array(list(revividos.values()), dtype="int64")
+                if revividos:
+                    columnas = columnas.con_filas(filas_revividas)
+                self._publicar(Instantanea(
+                    documentos,
+                    embeddings,
+                    ids_todos,
+                    actual.index,
+                    columnas,
+                    actual.version + 1,
+                    index_agregados,
+                    {idx: fila for idx, fila in actual.eliminados.items() if idx not in revividos}
+                ))
+                # Una linea con vector despues de la eliminacion la anula
+                self._registrar(textos_nuevos,
+                                [hash_documento(t) for t in textos_nuevos] +
+                                [hash_documento(nuevos[idx]) for idx in revividos],
+                                np.vstack([vectores_nuevos, actual.embeddings[filas_revividas]]))
+                if self.instantanea.agregados > MAX_AGREGADOS:
+                    self._compactar()
+        return ids
+
+    def eliminar(self, ids):
+        # Devuelve la cantidad de documentos eliminados. Solo se marcan: el
+        # indice, la matriz y documentos.txt no cambian hasta compactar
+        with self.lock_escritura:
+            actual = self.instantanea
+            existentes = sorted({i for i in ids if i in actual.documentos})
+            if not existentes:
+                return 0
+            filas = actual.filas_de(np.array(existentes, dtype="int64"))
+            documentos = dict(actual.documentos)
+            textos = [documentos.pop(i) for i in existentes]
+            eliminados = dict(actual.eliminados)
+            eliminados.update(zip(existentes, filas.tolist()))
+            self._publicar(Instantanea(documentos, actual.embeddings, actual.ids, actual.index,
+                                       actual.columnas.sin_filas(filas), actual.version + 1,
+                                       actual.index_agregados, eliminados))
+            with bloqueo_indice(self.ruta_indice):
+                registrar_eliminados([hash_documento(t) for t in textos], self.ruta_indice)
+            if len(eliminados) > MAX_ELIMINADOS:
+                self._compactar()
+            return len(existentes)
+
+    def _compactar(self):
+        # Incorpora el segmento de agregados al indice principal, quita las
+        # filas eliminadas y reescribe el artefacto. El contenido visible no
+        # cambia: se publica con la misma version, sin avisar a preparadores
+        # ni suscriptores (el BM25 anterior sigue siendo valido con sus filas)
+        actual = self.instantanea
+        n = len(actual.embeddings.principal)
+        vigentes = actual.vigentes()
+        ids = actual.ids[vigentes]
+        embeddings = np.ascontiguousarray(actual.embeddings[vigentes])
+        try:
+            index = clonar_indice(actual.index)
+            eliminados_principal = actual.ids[:n][~vigentes[:n]]
+            if len(eliminados_principal):
+                index.remove_ids(eliminados_principal)
+            quedan = np.flatnonzero(vigentes[n:])
+            if len(quedan):
+                index.add_with_ids(vectores_para(index, actual.embeddings.agregadas[quedan]), actual.ids[n:][quedan])
+        except RuntimeError:
+            # HNSW no permite eliminar: se reconstruye con los vectores restantes
+            index, _ = crear_indice(self.config_indice, embeddings, ids)
+        columnas = actual.columnas.filtrar(vigentes)
+        compactada = Instantanea(actual.documentos, MatrizSegmentada(embeddings), ids, index, columnas,
+                                 actual.version)
+        embeddings, index = self._persistir(compactada, reabrir=True)
+        self.instantanea = Instantanea(actual.documentos, MatrizSegmentada(embeddings), ids, index, columnas,
+                                       actual.version)
+        self.compactaciones += 1
+
+    def _publicar(self, instantanea):
+        # Los preparadores terminan antes de que cambie la version: lo que se
+        # guarde en cache con la version nueva ya usa sus indices. Luego se
+        # publica (los lectores ya ven el cambio); quien publica lo anota en
+        # disco despues para que sobreviva a un reinicio
+        for funcion in self.preparadores:
+            funcion(instantanea)
+        self.instantanea = instantanea
+        for funcion in self.suscriptores:
+            funcion(instantanea)
+
+    def _registrar(self, textos, hashes, vectores):
+        # Las lineas nuevas al final de documentos.txt y los vectores (de
+        # esas lineas y de los documentos que vuelven) al registro
+        with bloqueo_indice(self.ruta_indice):
+            if textos and not os.path.isdir(self.ruta_documentos):
+                _agregar_lineas(self.ruta_documentos, textos)
+            registrar_agregados(hashes, vectores, self.ruta_indice)
+
+    def _persistir(self, instantanea, reabrir=False):
+        # Reescribe documentos.txt y el artefacto completo (borra el registro
+        # de agregados y eliminados). Con reabrir=True devuelve (embeddings,
+        # index) abiertos de nuevo desde disco (memory-map), como al arrancar
+        textos = [instantanea.documentos[i] for i in instantanea.ids.tolist()]
+        meta = crear_meta(self.nombre_modelo, instantanea.index.d, self.config_indice, textos, self.codificador)
+
+        # El mismo bloqueo que al construir: otro proceso no abre el artefacto a medias
+        with bloqueo_indice(self.ruta_indice):
+            # Con una carpeta de exportes como origen no se reescriben esos archivos
+            if not os.path.isdir(self.ruta_documentos):
+                with open(self.ruta_documentos + ".tmp", "w", encoding="utf-8") as f:
+                    for texto in textos:
+                        f.write(texto + "\n")
+                os.replace(self.ruta_documentos + ".tmp", self.ruta_documentos)
+            guardar_indice(instantanea.embeddings.principal, instantanea.index, meta, self.ruta_indice)
+            if reabrir:
+                embeddings, index = cargar_indice(self.ruta_indice, admite_mmap(self.config_indice))
+                aplicar_parametros(index)
+                return embeddings, index
@@ -0,0 +1,92 @@
+#------------------------------------------------------
+#----Arranque por fases (liveness/readiness)-----------
+#------------------------------------------------------
+# Importar BCP_app solo prepara objetos livianos; el modelo, el indice y el
+# almacen se cargan despues (en el lifespan de FastAPI o antes del fork en
+# servidor.py). Cada fase se cronometra y su estado se expone en /readyz,
+# con el avance de la codificacion cuando hay documentos nuevos.
+
+import threading
+import time
+
+
+class NoListo(Exception):
+    # El servicio todavia no termino de cargar (la API responde 503)
+    def __init__(self, estado):
+        super().__init__("El servicio se está iniciando, intente nuevamente" if estado != "error"
+                         else "El servicio no pudo iniciarse")
+        self.estado = estado
+
+
+class EstadoArranque:
+    def __init__(self):
+        # estado: pendiente -> cargando -> listo | error
+        self.estado = "pendiente"
+        self.error = None
+        self.fases = []
+        self.avance = None
+        self.lock = threading.Lock()
+        self.inicio = time.monotonic()
+        self.fin = None
+
+    @property
+    def listo(self):
+        return self.estado == "listo"
+
+    def registrar(self, nombre, segundos):
+        # Fase ya medida por fuera (por ejemplo, las importaciones)
+        self.fases.append({"nombre": nombre, "estado": "listo", "segundos": round(segundos, 3)})
+        print(f"Arranque: {nombre} en {segundos:.2f} s")
+
+    def medir(self, nombre, funcion, *args, **kwargs):
+        # Ejecuta una fase y guarda su duracion
+        fase = {"nombre": nombre, "estado": "en curso", "segundos": None}
+        self.fases.append(fase)
+        self.avance = None
+        inicio = time.perf_counter()
+        try:
+            resultado = funcion(*args, **kwargs)
+        except BaseException:
+            fase["estado"] = "error"
+            raise
+        finally:
+            fase["segundos"] = round(time.perf_counter() - inicio, 3)
+        fase["estado"] = "listo"
+        print(f"Arranque: {nombre} en {fase['segundos']:.2f} s")
+        return resultado
+
+    def avanzar(self, hechos, total):
+        # Avance de la fase en curso (documentos codificados)
+        self.avance = {"hechos": hechos, "total": total}
+
+    def ejecutar(self, cargar):
+        # Corre la carga una sola vez, aunque se llame desde varios lugares
+        with self.lock:
+            if self.estado != "pendiente":
+                return
+            self.estado = "cargando"
+        try:
+            cargar()
+        except BaseException as e:
+            self.estado = "error"
+            self.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.fin = time.monotonic()
+        self.estado = "listo"
+        print(f"Arranque completo en {self.fin - self.inicio:.2f} s")
+
+    def exigir_listo(self):
+        if not self.listo:
+            raise NoListo(self.estado)
+
+    def resumen(self):
+        fin = self.fin if self.fin is not None else time.monotonic()
+        return {
+            "estado": self.estado,
+            "error": self.error,
+            "segundos": round(fin - self.inicio, 3),
+            "fase_actual": next((f["nombre"] for f in self.fases if f["estado"] == "en curso"), None),
+            "avance": self.avance,
+            "fases": list(self.fases),
+        }
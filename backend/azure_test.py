@@ -1,14 +1,18 @@
 """
-Script para probar la conexión a Azure y listar recursos del grupo RSGYAPE001.
+Script para probar la conexión a Azure y listar los recursos de los grupos
+configurados (AZURE_SUBSCRIPTION_IDS / AZURE_RESOURCE_GROUPS, ver inventario_azure.py).
 Este script se puede usar para verificar que las credenciales son correctas.
 """
 
 import os
 import sys
+import tempfile
 from dotenv import load_dotenv
 from azure.identity import ClientSecretCredential, DefaultAzureCredential
 from azure.mgmt.resource import ResourceManagementClient
 from azure.core.exceptions import ClientAuthenticationError
+from inventario_azure import InventarioAzure, destinos_configurados, nombre_destino
+from registro_inventario import RegistroInventario
 
 # Cargar variables de entorno desde archivo .env
 load_dotenv()
@@ -77,15 +81,23 @@ def test_azure_connection():
         for group in resource_client.resource_groups.list():
             print(f"- {group.name} (ubicación: {group.location})")
         
-        # Intentar listar recursos del grupo específico
-        print(f"\nListando recursos en el grupo RSGYAPE001:")
-        resources = list(resource_client.resources.list_by_resource_group("RSGYAPE001"))
-        
-        if not resources:
-            print("⚠️ No se encontraron recursos en este grupo o no tiene acceso.")
+        # Listar los recursos de todos los grupos configurados (en paralelo,
+        # con la misma credencial)
+        destinos = destinos_configurados()
+        print(f"\nListando recursos en {', '.join(nombre_destino(s, g) for s, g in destinos)}:")
+        # Registro temporal: la prueba no toca el inventario guardado de la app
+        registro = RegistroInventario(os.path.join(tempfile.mkdtemp(), "inventario.sqlite"))
+        inventario = InventarioAzure(destinos=destinos, crear_credencial=lambda: credential, registro=registro)
+        inventario.refrescar()
+        for grupo, datos in inventario.grupos.items():
+            print(f"- {grupo}: {datos['recursos']} recursos en {datos['segundos']:.2f} s")
+        for grupo, error in inventario.errores.items():
+            print(f"⚠️ {grupo}: {error}")
+        if not inventario.recursos:
+            print("⚠️ No se encontraron recursos en estos grupos o no tiene acceso.")
         else:
-            for resource in resources:
-                print(f"- {resource.name} (tipo: {resource.type})")
+            for resource in inventario.recursos[:50]:
+                print(f"- {resource['name']} (tipo: {resource['type']}, grupo: {resource['resourceGroup']})")
         
         print("\n✅ Conexión exitosa a Azure!")
         return True
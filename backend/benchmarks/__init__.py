@@ -0,0 +1,10 @@
+#Benchmarks del backend (se ejecutan desde la carpeta backend/):
+#   python -m benchmarks.suite --tamanos 10000 100000 1000000
+#   python -m benchmarks.suite --comparar antes.json despues.json
+#   python -m benchmarks.corpus --documentos 100000 --salida data/benchmarks/corpus-100000.tsv
+#   python -m benchmarks.carga_buscar --url http://127.0.0.1:8000
+#   python -m benchmarks.recall_indices --sintetico 100000
+#   python -m benchmarks.memoria_workers --workers 1 2 4 --modos prefork uvicorn
+#   python -m benchmarks.codificadores --backends torch onnx onnx-int8
+#   python -m benchmarks.ranking_azure --recursos 100000
+#   python -m benchmarks.inventario_paralelo --suscripciones 3 --grupos 20 --latencia 0.2
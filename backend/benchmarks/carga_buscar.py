@@ -0,0 +1,106 @@
+#------------------------------------------------------
+#----Generador de carga para /buscar/------------------
+#------------------------------------------------------
+# Lanza N clientes concurrentes contra la API en ejecucion y reporta
+# latencia p50/p99 y throughput. Tambien mide /buscar/batch.
+#
+#   python -m benchmarks.carga_buscar --url http://127.0.0.1:8000 --clientes 1 8 64
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+CONSULTAS = [
+    "Firewall del Area Perimetral para FrontEnd Sugerencias",
+    "Firewall del Area Perimetral para FrontEnd Ideas",
+    "Firewall del Area Perimetral para FrontEnd Reclamos",
+    "servidor de transacciones diarias",
+    "base de datos de seguridad",
+    "FWL-YAP-002",
+    "mirroring de transacciones",
+    "red interna multibanking",
+]
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    pos = min(len(ordenados) - 1, int(round(p / 100.0 * (len(ordenados) - 1))))
+    return ordenados[pos]
+
+
+def resumen(latencias, duracion):
+    return {
+        "peticiones": len(latencias),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p90_ms": round(percentil(latencias, 90) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "throughput_rps": round(len(latencias) / duracion, 1) if duracion > 0 else 0.0,
+    }
+
+
+def medir(funcion, clientes, peticiones_por_cliente, consultas=CONSULTAS):
+    # Cada cliente usa su propia sesion (conexion keep-alive)
+    latencias = []
+    lock = threading.Lock()
+
+    def cliente(n):
+        sesion = requests.Session()
+        propias = []
+        for i in range(peticiones_por_cliente):
+            inicio = time.perf_counter()
+            funcion(sesion, consultas[(n + i) % len(consultas)])
+            propias.append(time.perf_counter() - inicio)
+        with lock:
+            latencias.extend(propias)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as pool:
+        list(pool.map(cliente, range(clientes)))
+    return resumen(latencias, time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga concurrente sobre /buscar/")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--peticiones", type=int, default=50, help="peticiones por cliente")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--lote", type=int, default=8, help="consultas por llamada a /buscar/batch")
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    def simple(sesion, consulta):
+        r = sesion.get(f"{args.url}/buscar/", params={"query": consulta, "k": args.k})
+        r.raise_for_status()
+
+    def lote(sesion, consulta):
+        consultas = [CONSULTAS[(CONSULTAS.index(consulta) + j) % len(CONSULTAS)] for j in range(args.lote)]
+        r = sesion.post(f"{args.url}/buscar/batch", json={"consultas": consultas, "k": args.k})
+        r.raise_for_status()
+
+    # Calentamiento (carga perezosa del modelo, conexiones, etc.)
+    medir(simple, 1, 5)
+
+    resultados = []
+    for clientes in args.clientes:
+        for nombre, funcion in (("buscar", simple), ("buscar_batch", lote)):
+            fila = {"endpoint": nombre, "clientes": clientes}
+            fila.update(medir(funcion, clientes, args.peticiones))
+            if nombre == "buscar_batch":
+                fila["consultas_por_seg"] = round(fila["throughput_rps"] * args.lote, 1)
+            resultados.append(fila)
+            print(json.dumps(fila))
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#------------------------------------------------------
+#----Latencia y throughput por backend del modelo------
+#------------------------------------------------------
+# Mide cada codificador (torch, onnx, onnx-int8) en un proceso nuevo, asi
+# el tiempo de arranque incluye importar sus librerias y cargar el modelo.
+# Reporta latencia de una consulta (p50/p99), documentos por segundo en
+# lotes y el coseno contra la salida de torch. Los modelos ONNX se
+# exportan antes con `python codificadores.py exportar`.
+#
+#   python -m benchmarks.codificadores --backends torch onnx onnx-int8
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.carga_buscar import CONSULTAS, percentil
+from codificadores import cosenos, textos_de_muestra
+
+
+def medir(backend, nombre_modelo, repeticiones, tamano_lote, archivo_vectores):
+    # Se ejecuta en el proceso hijo
+    inicio = time.perf_counter()
+    from codificadores import crear_codificador
+    codificador = crear_codificador(nombre_modelo, backend)
+    arranque = time.perf_counter() - inicio
+
+    codificador.encode(CONSULTAS[:2])  # calentamiento
+    latencias = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        codificador.encode([CONSULTAS[i % len(CONSULTAS)]])
+        latencias.append(time.perf_counter() - inicio)
+
+    textos = textos_de_muestra()
+    lote = (textos * (tamano_lote // len(textos) + 1))[:tamano_lote]
+    inicio = time.perf_counter()
+    for _ in range(max(1, repeticiones // 20)):
+        codificador.encode(lote)
+    por_segundo = max(1, repeticiones // 20) * len(lote) / (time.perf_counter() - inicio)
+
+    np.save(archivo_vectores, codificador.encode(textos))
+    return {
+        "backend": backend,
+        "arranque_s": round(arranque, 2),
+        "consulta_p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "consulta_p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "docs_por_seg": round(por_segundo, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia, throughput y paridad por backend del modelo")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--modelo", default=os.environ.get("BCP_MODELO", "all-MiniLM-L6-v2"))
+    parser.add_argument("--repeticiones", type=int, default=200)
+    parser.add_argument("--lote", type=int, default=64)
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--medir", help=argparse.SUPPRESS)
+    parser.add_argument("--vectores", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.medir, args.modelo, args.repeticiones, args.lote, args.vectores)))
+        return
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as carpeta:
+        vectores = {}
+        for backend in args.backends:
+            archivo = os.path.join(carpeta, f"{backend}.npy")
+            proceso = subprocess.run(
+                [sys.executable, "-m", "benchmarks.codificadores", "--medir", backend, "--modelo", args.modelo,
+                 "--repeticiones", str(args.repeticiones), "--lote", str(args.lote), "--vectores", archivo],
+                capture_output=True, text=True)
+            if proceso.returncode != 0:
+                print(f"{backend}: error\n{proceso.stderr[-2000:]}", file=sys.stderr)
+                continue
+            fila = json.loads(proceso.stdout.strip().splitlines()[-1])
+            vectores[backend] = np.load(archivo)
+            resultados.append(fila)
+
+        # Paridad contra torch (si se midio)
+        for fila in resultados:
+            if "torch" in vectores:
+                similitud = cosenos(vectores["torch"], vectores[fila["backend"]])
+                fila["coseno_min_vs_torch"] = round(float(similitud.min()), 6)
+            print(json.dumps(fila))
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
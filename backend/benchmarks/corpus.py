@@ -0,0 +1,99 @@
+#------------------------------------------------------
+#----Corpus e inventario sinteticos--------------------
+#------------------------------------------------------
+# Genera documentos con la forma de data/documentos.txt (proyecto, codigo
+# de activo y descripcion separados por tabs) y un inventario de Azure con
+# el formato de `az resource list` para BCP_AZURE_FAKE. Con la misma semilla
+# la salida es identica, asi los resultados se comparan entre commits.
+#
+#   python -m benchmarks.corpus --documentos 100000 --salida data/benchmarks/corpus-100000.tsv
+
+import argparse
+import json
+import os
+import random
+
+from benchmarks.ranking_azure import inventario_sintetico
+
+PROYECTOS = {"YAPE": "YAP", "MBBK": "MBK", "BANCA": "BNC", "SEGUROS": "SEG", "PAGOS": "PAG", "CANALES": "CNL"}
+ACTIVOS = {
+    "FWL": ["Firewall", "Firewall perimetral", "Firewall de aplicaciones"],
+    "SRV": ["Servidor", "Servidor de aplicaciones", "Servidor web"],
+    "BDD": ["Base de Datos", "Base de Datos relacional", "Replica de Base de Datos"],
+    "RED": ["Red interna", "Red virtual", "Segmento de red"],
+    "BAL": ["Balanceador de carga", "Balanceador"],
+    "COL": ["Cola de mensajes", "Bus de eventos"],
+}
+FUNCIONES = ["de Transacciones Diarias", "de Acceso a los recursos", "de Seguridad", "de Resguardo y mirroring",
+             "de Pagos en linea", "de Autenticacion", "de Reportes", "de Conciliacion", "de Notificaciones",
+             "de Monitoreo", "de Clientes", "de Tarjetas"]
+AREAS = ["del FrontEnd", "del BackEnd", "de la Red Interna", "del Area Perimetral", "para Personas",
+         "para Empresas", "del Area de Seguridad Global", "de la infraestructura", "de Produccion",
+         "de Contingencia"]
+DETALLES = ["", "", "", "HTML", "primario", "secundario", "zona 1", "zona 2", "alta disponibilidad",
+            "solo lectura", "con cifrado", "legado"]
+
+
+def generar_documentos(n, semilla=0):
+    # Lineas "PROYECTO\tCODIGO\tDescripcion" con codigos unicos
+    rng = random.Random(semilla)
+    digitos = max(3, len(str(n)))
+    for i in range(n):
+        proyecto = rng.choice(list(PROYECTOS))
+        activo = rng.choice(list(ACTIVOS))
+        descripcion = " ".join(p for p in (rng.choice(ACTIVOS[activo]), rng.choice(FUNCIONES),
+                                           rng.choice(AREAS), rng.choice(DETALLES)) if p)
+        yield f"{proyecto}\t{activo}-{PROYECTOS[proyecto]}-{i + 1:0{digitos}d}\t{descripcion}"
+
+
+def escribir_corpus(ruta, n, semilla=0):
+    with open(ruta, "w", encoding="utf-8") as f:
+        for linea in generar_documentos(n, semilla):
+            f.write(linea + "\n")
+    return ruta
+
+
+def consultas_sinteticas(n, cantidad=64, semilla=1):
+    # Mezcla de consultas en lenguaje natural y de codigos exactos del corpus
+    rng = random.Random(semilla)
+    digitos = max(3, len(str(n)))
+    consultas = []
+    for i in range(cantidad):
+        activo = rng.choice(list(ACTIVOS))
+        if i % 4 == 3:
+            proyecto = rng.choice(list(PROYECTOS.values()))
+            consultas.append(f"{activo}-{proyecto}-{rng.randint(1, n):0{digitos}d}")
+        else:
+            consultas.append(f"{rng.choice(ACTIVOS[activo]).lower()} {rng.choice(FUNCIONES)} {rng.choice(AREAS)}")
+    return consultas
+
+
+def escribir_inventario(ruta, n, grupo="RSGYAPE001", semilla=0):
+    # Inventario para BCP_AZURE_FAKE (sin conexion a Azure)
+    recursos = inventario_sintetico(n, semilla)
+    for recurso in recursos:
+        recurso["resourceGroup"] = grupo
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(recursos, f)
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un corpus (y un inventario de Azure) sinteticos")
+    parser.add_argument("--documentos", type=int, default=10000)
+    parser.add_argument("--salida", required=True, help="archivo .tsv del corpus")
+    parser.add_argument("--recursos", type=int, help="ademas, inventario de N recursos (.json junto al corpus)")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.salida) or ".", exist_ok=True)
+    escribir_corpus(args.salida, args.documentos, args.semilla)
+    print(f"{args.documentos} documentos en {args.salida}")
+    if args.recursos:
+        ruta = args.salida.rsplit(".", 1)[0] + "-recursos.json"
+        escribir_inventario(ruta, args.recursos, semilla=args.semilla)
+        print(f"{args.recursos} recursos en {ruta}")
+
+
+if __name__ == "__main__":
+    main()
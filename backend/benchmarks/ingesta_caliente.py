@@ -0,0 +1,99 @@
+#------------------------------------------------------
+#----Latencia de la ingesta en caliente----------------
+#------------------------------------------------------
+# Mide agregar y eliminar un documento en el almacen vivo sobre un corpus
+# sintetico, con y sin los preparadores que registra la API (el BM25 de
+# BCP_app se actualiza antes de publicar cada version, bajo el mismo lock de
+# escritura). Los vectores salen de un codificador falso (determinista por
+# texto) para medir el almacen y no el modelo; --modelo usa uno real.
+#
+#   python -m benchmarks.ingesta_caliente --documentos 200000 --operaciones 50
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+from benchmarks.carga_buscar import percentil
+from benchmarks.corpus import escribir_corpus, generar_documentos
+
+
+class CodificadorFalso:
+    # Un vector fijo por texto, sin cargar un modelo
+    def __init__(self, dimension):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, textos, convert_to_numpy=True, **opciones):
+        return np.vstack([np.random.default_rng(zlib.crc32(t.encode("utf-8"))).standard_normal(self.dimension)
+                          for t in textos]).astype("float32")
+
+
+def medir(funcion, argumentos):
+    latencias = []
+    for argumento in argumentos:
+        inicio = time.perf_counter()
+        funcion(argumento)
+        latencias.append(1000 * (time.perf_counter() - inicio))
+    return {"p50_ms": round(percentil(latencias, 50), 2), "p99_ms": round(percentil(latencias, 99), 2),
+            "max_ms": round(max(latencias), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de agregar/eliminar un documento, con y sin BM25")
+    parser.add_argument("--documentos", type=int, default=200000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--tipo", default="flat", help="tipo de indice (BCP_INDICE_TIPO)")
+    parser.add_argument("--operaciones", type=int, default=50, help="documentos agregados y eliminados por prueba")
+    parser.add_argument("--modelo", help="modelo real en lugar del codificador falso")
+    parser.add_argument("--carpeta", help="corpus e indice (por defecto una carpeta temporal)")
+    args = parser.parse_args()
+
+    carpeta = args.carpeta or tempfile.mkdtemp(prefix="bcp-ingesta-")
+    os.makedirs(carpeta, exist_ok=True)
+    os.environ.update(BCP_INDICE_TIPO=args.tipo, BCP_INVENTARIO="0",
+                      BCP_RUTA_DOCUMENTOS=os.path.join(carpeta, "documentos.txt"),
+                      BCP_RUTA_INDICE=os.path.join(carpeta, "indice"))
+
+    import BCP_app
+    from almacen import AlmacenDocumentos
+    from codificadores import crear_codificador
+    from indice_vectorial import ARCHIVO_AGREGADOS, configuracion_indice, construir_indice, normalizar
+    from ingesta import documentos_unicos
+
+    modelo = crear_codificador(args.modelo) if args.modelo else CodificadorFalso(args.dimension)
+    config = configuracion_indice()
+    for variante in ("sin_preparadores", "bm25"):
+        # Cada variante parte del mismo corpus (el indice se reutiliza, sin
+        # los agregados y eliminados de la anterior)
+        escribir_corpus(os.environ["BCP_RUTA_DOCUMENTOS"], args.documentos)
+        registro = os.path.join(os.environ["BCP_RUTA_INDICE"], ARCHIVO_AGREGADOS)
+        if os.path.exists(registro):
+            os.remove(registro)
+        documentos = documentos_unicos(os.environ["BCP_RUTA_DOCUMENTOS"])
+        embeddings, index = construir_indice(documentos, modelo, "benchmark", config, os.environ["BCP_RUTA_INDICE"])
+        almacen = AlmacenDocumentos(documentos, embeddings, index, lambda t: normalizar(modelo.encode(t)),
+                                    "benchmark", config, os.environ["BCP_RUTA_DOCUMENTOS"],
+                                    os.environ["BCP_RUTA_INDICE"])
+        if variante == "bm25":
+            # Lo mismo que registra BCP_app al cargar
+            almacen.preparadores.append(BCP_app.actualizar_indice_lexico)
+            BCP_app.indice_lexico = BCP_app.crear_indice_lexico(almacen.instantanea)
+
+        nuevos = list(generar_documentos(args.documentos + args.operaciones, semilla=1))[-args.operaciones:]
+        fila = {"documentos": args.documentos, "tipo": args.tipo, "preparadores": variante}
+        fila["agregar"] = medir(lambda texto: almacen.agregar([texto]), nuevos)
+        ids = [int(i) for i in almacen.instantanea.ids[:args.operaciones]]
+        fila["eliminar"] = medir(lambda idx: almacen.eliminar([idx]), ids)
+        fila["compactaciones"] = almacen.compactaciones
+        print(json.dumps(fila))
+
+
+if __name__ == "__main__":
+    main()
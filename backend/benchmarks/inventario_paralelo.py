@@ -0,0 +1,62 @@
+#------------------------------------------------------
+#----Inventario de Azure: listado en paralelo----------
+#------------------------------------------------------
+# Genera un inventario falso repartido en varias suscripciones y grupos y
+# mide cuanto tarda un refresco completo segun los hilos usados. La latencia
+# por pagina del cliente falso (BCP_AZURE_FAKE_LATENCIA) simula la de Azure.
+# El segundo refresco de cada corrida es delta (solo lo modificado; aqui nada).
+#
+#   python -m benchmarks.inventario_paralelo --suscripciones 3 --grupos 20 --latencia 0.2
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.ranking_azure import inventario_sintetico
+
+
+def escribir(ruta, recursos, suscripciones, grupos):
+    for i, recurso in enumerate(recursos):
+        suscripcion, grupo = f"sub-{i % suscripciones}", f"RSG{i % grupos:03d}"
+        recurso["id"] = recurso["id"].replace("/subscriptions/0000/resourceGroups/RSGYAPE001",
+                                              f"/subscriptions/{suscripcion}/resourceGroups/{grupo}")
+        recurso["resourceGroup"] = grupo
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(recursos, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de refresco del inventario segun los hilos")
+    parser.add_argument("--recursos", type=int, default=20000)
+    parser.add_argument("--suscripciones", type=int, default=3)
+    parser.add_argument("--grupos", type=int, default=20)
+    parser.add_argument("--latencia", type=float, default=0.2, help="segundos por pagina")
+    parser.add_argument("--pagina", type=int, default=100, help="recursos por pagina")
+    parser.add_argument("--hilos", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    ruta = os.path.join(tempfile.mkdtemp(), "inventario.json")
+    escribir(ruta, inventario_sintetico(args.recursos), args.suscripciones, args.grupos)
+    os.environ.update(BCP_AZURE_FAKE=ruta, BCP_AZURE_FAKE_LATENCIA=str(args.latencia),
+                      BCP_AZURE_FAKE_PAGINA=str(args.pagina), BCP_AZURE_DELTA_MARGEN="0")
+
+    from inventario_azure import InventarioAzure
+    from registro_inventario import RegistroInventario
+    destinos = [(f"sub-{s}", "*") for s in range(args.suscripciones)]
+    for hilos in args.hilos:
+        # Cada corrida parte de un registro vacio
+        registro = RegistroInventario(os.path.join(tempfile.mkdtemp(), "inventario.sqlite"))
+        inventario = InventarioAzure(destinos=destinos, paralelo=hilos, registro=registro)
+        inicio = time.perf_counter()
+        inventario.refrescar()
+        completo = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        inventario.refrescar()
+        print(json.dumps({"hilos": hilos, "grupos": len(inventario.grupos), "recursos": len(inventario.recursos),
+                          "segundos": round(completo, 2), "segundos_delta": round(time.perf_counter() - inicio, 2)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#------------------------------------------------------
+#----Memoria por worker y throughput vs. workers-------
+#------------------------------------------------------
+# Levanta la API con N workers, mide la memoria de cada worker y el
+# throughput de /buscar/ con carga concurrente. Compara el modo prefork
+# (servidor.py: una carga y fork) con `uvicorn --workers N` (cada worker
+# carga el modelo por su cuenta). Solo Linux (lee /proc).
+#
+#   python -m benchmarks.memoria_workers --workers 1 2 4 8 --modos prefork uvicorn
+#
+# RSS cuenta tambien las paginas compartidas; PSS las reparte entre los
+# procesos que las comparten, por eso la suma de PSS es la memoria real.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from benchmarks.carga_buscar import medir
+
+COMANDOS = {
+    "prefork": lambda n, port: [sys.executable, "servidor.py", "--workers", str(n),
+                                "--port", str(port), "--log-level", "warning"],
+    "uvicorn": lambda n, port: [sys.executable, "-m", "uvicorn", "BCP_app:app", "--workers", str(n),
+                                "--port", str(port), "--log-level", "warning"],
+}
+
+
+def hijos(pid):
+    # Procesos hijos directos (lee /proc/<pid>/task/*/children)
+    resultado = []
+    for tarea in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{tarea}/children") as f:
+                resultado.extend(int(p) for p in f.read().split())
+        except OSError:
+            pass
+    return resultado
+
+
+def memoria_kb(pid):
+    # RSS y PSS en kB (smaps_rollup)
+    valores = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for linea in f:
+            partes = linea.split()
+            if partes[0] in ("Rss:", "Pss:"):
+                valores[partes[0][:-1].lower()] = int(partes[1])
+    return valores
+
+
+def workers_de(pid, esperados):
+    # prefork: los workers son hijos del padre. uvicorn: hijos del
+    # supervisor, que puede tener ademas un proceso auxiliar sin la app
+    # (con --workers 1 uvicorn no crea hijos: el worker es el proceso)
+    procesos = hijos(pid) or [pid]
+    if len(procesos) > esperados:
+        procesos = sorted(procesos, key=lambda p: memoria_kb(p)["rss"], reverse=True)[:esperados]
+    return procesos
+
+
+def esperar_listo(url, proceso, timeout):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError("El servidor termino antes de estar listo")
+        try:
+            if requests.get(f"{url}/readyz", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError("El servidor no respondio a tiempo")
+
+
+def medir_modo(modo, workers, port, clientes, peticiones, timeout):
+    url = f"http://127.0.0.1:{port}"
+    # Carga dentro del lifespan: un worker de uvicorn acepta conexiones recien
+    # con todo cargado (si no, /readyz de uno no garantiza que los demas esten listos)
+    entorno = dict(os.environ, BCP_CARGA_EN_SEGUNDO_PLANO="0")
+    proceso = subprocess.Popen(COMANDOS[modo](workers, port), env=entorno)
+    try:
+        esperar_listo(url, proceso, timeout)
+
+        def simple(sesion, consulta):
+            r = sesion.get(f"{url}/buscar/", params={"query": consulta, "k": 3})
+            r.raise_for_status()
+
+        # Calentamiento: cada worker atiende algunas consultas
+        medir(simple, workers, 5)
+        carga = medir(simple, clientes, peticiones)
+
+        procesos = workers_de(proceso.pid, workers)
+        memorias = [memoria_kb(p) for p in procesos]
+        fila = {
+            "modo": modo,
+            "workers": workers,
+            "rss_mb_por_worker": round(sum(m["rss"] for m in memorias) / len(memorias) / 1024, 1),
+            "pss_mb_por_worker": round(sum(m["pss"] for m in memorias) / len(memorias) / 1024, 1),
+            "pss_mb_total": round(sum(memoria_kb(p)["pss"] for p in {proceso.pid, *procesos}) / 1024, 1),
+        }
+        fila.update(carga)
+        return fila
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria por worker y throughput segun cantidad de workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modos", nargs="+", choices=sorted(COMANDOS), default=["prefork", "uvicorn"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--peticiones", type=int, default=50, help="peticiones por cliente")
+    parser.add_argument("--timeout", type=float, default=600, help="segundos para que arranque el servidor")
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    resultados = []
+    for modo in args.modos:
+        for workers in args.workers:
+            fila = medir_modo(modo, workers, args.port, args.clientes, args.peticiones, args.timeout)
+            resultados.append(fila)
+            print(json.dumps(fila))
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
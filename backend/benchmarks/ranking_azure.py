@@ -0,0 +1,153 @@
+#------------------------------------------------------
+#----Ranking de recursos: paridad y tiempos------------
+#------------------------------------------------------
+# Compara MotorRanking con la funcion calcular_similitud original del
+# frontend (copiada abajo tal cual) sobre un inventario sintetico, y mide
+# el tiempo de ranking por consulta.
+#
+#   python -m benchmarks.ranking_azure --recursos 100000
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+
+import numpy as np
+
+from ranking_recursos import MotorRanking
+
+TIPOS = [
+    "Microsoft.Network/azureFirewalls", "Microsoft.Network/virtualNetworks",
+    "Microsoft.Network/networkInterfaces", "Microsoft.Compute/virtualMachines",
+    "Microsoft.Compute/disks", "Microsoft.Sql/servers", "Microsoft.Web/sites",
+    "Microsoft.Storage/storageAccounts", "Microsoft.KeyVault/vaults",
+]
+UBICACIONES = ["eastus2", "centralus", "westeurope", "global"]
+PREFIJOS = ["fwl", "srv", "bdd", "app", "vnet", "kv", "st", "nsg"]
+PROYECTOS = ["yap", "mbk", "web", "sec"]
+SUFIJOS = ["", "-frontend", "_OsDisk_1", "-nic", " db", "-backup"]
+
+CONSULTAS = ["fwl", "fwl-yap-001", "FWL-YAP-002", "yap", "frontend", "sql", "east",
+             "srv mbk", "disk", "nic", "a", "kv-sec-12", "app-web-5", "-nic", "firewall", "wxyz"]
+
+# Incluye bordes .xx5 (1 de 4 caracteres en comun = 0.075, que el frontend muestra como 0.07)
+UMBRALES = [0.08, 0.17, 0.3]
+
+
+def inventario_sintetico(n, semilla=0):
+    # Recursos con el formato de /azure-resources/ (nombres repetidos incluidos)
+    rng = random.Random(semilla)
+    recursos = []
+    for i in range(n):
+        tipo = rng.choice(TIPOS)
+        nombre = f"{rng.choice(PREFIJOS)}-{rng.choice(PROYECTOS)}-{rng.randint(0, 999):03d}{rng.choice(SUFIJOS)}"
+        if i % 7 == 0:
+            nombre = nombre.upper()
+        recursos.append({
+            "id": f"/subscriptions/0000/resourceGroups/RSGYAPE001/providers/{tipo}/{nombre}-{i}",
+            "name": nombre,
+            "type": tipo,
+            "location": rng.choice(UBICACIONES),
+        })
+    return recursos
+
+
+# Copia literal de frontend/bcp_stream_app.py (referencia de paridad)
+def calcular_similitud(recurso, busqueda, tipo_filtro=None):
+    if not busqueda:
+        return 0
+    busqueda = busqueda.lower()
+    nombre = recurso['Nombre'].lower()
+    tipo = recurso['Tipo'].lower()
+    ubicacion = recurso['Ubicación'].lower()
+    if tipo_filtro and tipo_filtro.lower() != tipo:
+        return 0
+    score = 0
+    if nombre == busqueda:
+        if tipo_filtro and tipo == tipo_filtro.lower():
+            return 1.0
+        return 0.9
+    if nombre.startswith(busqueda):
+        score = max(score, 0.8)
+    if re.search(r'\b' + re.escape(busqueda) + r'\b', nombre):
+        score = max(score, 0.7)
+    if busqueda in nombre:
+        score = max(score, 0.6)
+    if busqueda in tipo:
+        score = max(score, 0.5)
+    if busqueda in ubicacion:
+        score = max(score, 0.4)
+    chars_en_comun = sum(1 for c in busqueda if c in nombre)
+    if len(busqueda) > 0:
+        proporcion = chars_en_comun / len(busqueda)
+        score = max(score, proporcion * 0.3)
+    return score
+
+
+def verificar_paridad(motor, recursos, consultas, muestra=20000):
+    """
+    Compara los puntajes de cada recurso y, para cada umbral, que recursos
+    lo superan: el frontend filtraba con float(f"{sim:.2f}") >= umbral.
+    Devuelve la lista de diferencias (vacia si hay paridad).
+    """
+    filas = [{"Nombre": r["name"], "Tipo": r["type"], "Ubicación": r["location"]} for r in recursos[:muestra]]
+    ids = [r["id"] for r in recursos[:muestra]]
+    errores = []
+    for consulta in consultas:
+        for tipo_filtro in (None, TIPOS[5]):
+            esperado = np.array([calcular_similitud(f, consulta, tipo_filtro) for f in filas])
+            obtenido = motor.puntuar(consulta, tipo_filtro)[:len(filas)]
+            if not np.array_equal(esperado, obtenido):
+                errores.append({"consulta": consulta, "tipo": tipo_filtro,
+                                "filas": np.flatnonzero(esperado != obtenido)[:5].tolist()})
+            for umbral in UMBRALES:
+                esperados = {i for i, sim in zip(ids, esperado.tolist()) if float(f"{sim:.2f}") >= umbral}
+                _, resultados = motor.buscar(consulta, tipo_filtro, umbral, None)
+                obtenidos = {r["id"] for r in resultados} & set(ids)
+                if esperados != obtenidos:
+                    errores.append({"consulta": consulta, "tipo": tipo_filtro, "umbral": umbral,
+                                    "ids": sorted(esperados ^ obtenidos)[:5]})
+    return errores
+
+
+def medir(motor, consultas, repeticiones=5, limite=50):
+    tiempos = []
+    for _ in range(repeticiones):
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            motor.buscar(consulta, None, 0.3, limite)
+            tiempos.append((time.perf_counter() - inicio) * 1000.0)
+    tiempos.sort()
+    return {
+        "p50_ms": round(tiempos[len(tiempos) // 2], 3),
+        "p99_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))], 3),
+        "max_ms": round(tiempos[-1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y tiempos del ranking de recursos")
+    parser.add_argument("--recursos", type=int, default=100000)
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    recursos = inventario_sintetico(args.recursos)
+    inicio = time.perf_counter()
+    motor = MotorRanking(recursos)
+    resultado = {"recursos": args.recursos, "construccion_s": round(time.perf_counter() - inicio, 3)}
+    resultado.update(medir(motor, CONSULTAS))
+    errores = verificar_paridad(motor, recursos, CONSULTAS)
+    resultado["paridad"] = not errores
+    print(json.dumps(resultado))
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2)
+    if errores:
+        print(json.dumps(errores, indent=2))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#------------------------------------------------------
+#----Recall@k vs latencia de los tipos de indice-------
+#------------------------------------------------------
+# Compara los tipos de indice contra la busqueda exacta (flat): ivf-flat,
+# ivf-pq y hnsw para distintos nprobe / efSearch, y los compactos (sq-fp16,
+# sq-int8, binario) sin y con re-ranking exacto float32 de k*r candidatos.
+# Reporta tambien la memoria del indice serializado. Usa la matriz de
+# data/indice o un corpus sintetico agrupado (--sintetico N).
+#
+#   python -m benchmarks.recall_indices --sintetico 100000 --k 10
+
+import argparse
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+from indice_vectorial import (ARCHIVO_EMBEDDINGS, RUTA_INDICE, buscar_indice, configuracion_indice, crear_indice,
+                              es_binario, normalizar, reordenar_exacto)
+
+BARRIDO = {
+    "ivf-flat": ("nprobe", [1, 4, 16, 64]),
+    "ivf-pq": ("nprobe", [1, 4, 16, 64]),
+    "hnsw": ("ef_search", [16, 32, 64, 128, 256]),
+    "sq-fp16": ("rerank", [0, 2]),
+    "sq-int8": ("rerank", [0, 2, 4]),
+    "binario": ("rerank", [0, 2, 4, 10, 20]),
+}
+
+
+def corpus_sintetico(n, dimension=384, grupos=256, semilla=0):
+    # Vectores agrupados alrededor de centros (se parece mas a texto real
+    # que un ruido uniforme) y normalizados
+    rng = np.random.default_rng(semilla)
+    centros = rng.standard_normal((grupos, dimension)).astype("float32")
+    asignacion = rng.integers(0, grupos, n)
+    datos = centros[asignacion] + 0.6 * rng.standard_normal((n, dimension)).astype("float32")
+    return normalizar(datos)
+
+
+def consultas_de(embeddings, nq, semilla=1):
+    rng = np.random.default_rng(semilla)
+    filas = rng.choice(len(embeddings), min(nq, len(embeddings)), replace=False)
+    ruido = 0.3 * rng.standard_normal((len(filas), embeddings.shape[1])).astype("float32")
+    return normalizar(np.asarray(embeddings[filas], dtype="float32") + ruido)
+
+
+def recall(exactos, aproximados, k):
+    aciertos = sum(len(set(e[:k]) & set(a[:k])) for e, a in zip(exactos, aproximados))
+    return aciertos / float(len(exactos) * k)
+
+
+def medir_busqueda(index, consultas, k, params=None, rerank=0, embeddings=None):
+    # Con rerank > 1 se reordenan k*rerank candidatos con la matriz float32
+    # (los ids del benchmark son las filas de la matriz)
+    inicio = time.perf_counter()
+    _, indices = buscar_indice(index, consultas, k * rerank if rerank > 1 else k, params)
+    if rerank > 1:
+        indices = [reordenar_exacto(q, fila[fila != -1], embeddings, k)[0] for q, fila in zip(consultas, indices)]
+    return indices, (time.perf_counter() - inicio) * 1000.0 / len(consultas)
+
+
+def memoria_mb(index):
+    # Tamaño del indice serializado (lo que ocupa en RAM al cargarlo)
+    serializado = faiss.serialize_index_binary(index) if es_binario(index) else faiss.serialize_index(index)
+    return round(serializado.nbytes / 2 ** 20, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs latencia por tipo de indice")
+    parser.add_argument("--sintetico", type=int, help="usar un corpus sintetico de N vectores")
+    parser.add_argument("--consultas", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--tipos", nargs="+",
+                        default=["ivf-flat", "ivf-pq", "hnsw", "sq-fp16", "sq-int8", "binario"])
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    if args.sintetico:
+        embeddings = corpus_sintetico(args.sintetico)
+    else:
+        embeddings = np.load(os.path.join(RUTA_INDICE, ARCHIVO_EMBEDDINGS), mmap_mode="r")
+    ids = np.arange(len(embeddings), dtype="int64")
+    consultas = consultas_de(embeddings, args.consultas)
+
+    # Referencia exacta
+    inicio = time.perf_counter()
+    exacto, _ = crear_indice(configuracion_indice("flat"), embeddings, ids)
+    construccion = time.perf_counter() - inicio
+    verdad, ms = medir_busqueda(exacto, consultas, args.k)
+    filas = [{"tipo": "flat", "parametro": None, "valor": None, "recall": 1.0,
+              "ms_por_consulta": round(ms, 4), "construccion_s": round(construccion, 2),
+              "memoria_mb": memoria_mb(exacto)}]
+    print(json.dumps(filas[0]))
+
+    for tipo in args.tipos:
+        inicio = time.perf_counter()
+        index, efectiva = crear_indice(configuracion_indice(tipo), embeddings, ids)
+        construccion = time.perf_counter() - inicio
+        parametro, valores = BARRIDO[efectiva["tipo"]] if efectiva["tipo"] in BARRIDO else (None, [None])
+        for valor in valores:
+            params = None
+            if parametro == "nprobe":
+                params = faiss.SearchParametersIVF(nprobe=valor)
+            elif parametro == "ef_search":
+                params = faiss.SearchParametersHNSW(efSearch=valor)
+            rerank = valor if parametro == "rerank" else 0
+            indices, ms = medir_busqueda(index, consultas, args.k, params, rerank, embeddings)
+            fila = {"tipo": efectiva["tipo"], "parametro": parametro, "valor": valor,
+                    "recall": round(recall(verdad, indices, args.k), 4),
+                    "ms_por_consulta": round(ms, 4), "construccion_s": round(construccion, 2),
+                    "memoria_mb": memoria_mb(index)}
+            filas.append(fila)
+            print(json.dumps(fila))
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(filas, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
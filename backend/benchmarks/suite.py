@@ -0,0 +1,223 @@
+#------------------------------------------------------
+#----Suite reproducible de rendimiento-----------------
+#------------------------------------------------------
+# Para cada tamaño de corpus sintetico (por defecto 10k, 100k y 1M lineas):
+#   - genera el corpus TSV y un inventario de Azure falso (sin conexion)
+#   - levanta la API con ese corpus y mide el arranque: construccion del
+#     indice (fases de /readyz) y memoria del servidor (RSS/PSS)
+#   - latencia p50/p90/p99 y throughput de /buscar/ (una consulta) y de
+#     /buscar/batch, con distintos clientes concurrentes
+#   - latencia de /azure-resources/search y su etapa de ranking (Server-Timing)
+# Escribe un JSON con el commit, la maquina y la configuracion BCP_* de la
+# corrida, para comparar resultados entre commits:
+#
+#   python -m benchmarks.suite --tamanos 10000 100000 1000000
+#   python -m benchmarks.suite --comparar data/benchmarks/antes.json data/benchmarks/despues.json
+#
+# Los corpus y sus indices quedan en data/benchmarks y se reutilizan entre
+# corridas; --reconstruir borra el indice para medir la construccion desde
+# cero. Las caches de consultas se desactivan salvo con --con-cache.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from benchmarks.carga_buscar import medir, percentil
+from benchmarks.corpus import consultas_sinteticas, escribir_corpus, escribir_inventario
+from benchmarks.memoria_workers import COMANDOS, esperar_listo, hijos, memoria_kb
+
+CONSULTAS_RECURSOS = ["fwl", "fwl-yap-001", "yap", "frontend", "sql", "east", "srv mbk", "disk", "nic", "kv-sec-12"]
+
+# Metricas que se comparan entre dos corridas (menor es mejor, salvo throughput)
+COMPARABLES = ["arranque_s", "indice_s", "rss_mb", "pss_mb", "p50_ms", "p90_ms", "p99_ms", "throughput_rps",
+               "ranking_p50_ms"]
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def entorno():
+    # Datos para saber con que se midio cada archivo de resultados
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "cambios_sin_commit": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "configuracion": {k: v for k, v in sorted(os.environ.items()) if k.startswith("BCP_")},
+    }
+
+
+def memoria_servidor(pid):
+    # Suma de RSS/PSS del servidor y sus workers (None fuera de Linux)
+    try:
+        procesos = [pid] + hijos(pid)
+        memorias = [memoria_kb(p) for p in procesos]
+    except OSError:
+        return {"rss_mb": None, "pss_mb": None}
+    return {
+        "rss_mb": round(sum(m["rss"] for m in memorias) / 1024, 1),
+        "pss_mb": round(sum(m["pss"] for m in memorias) / 1024, 1),
+    }
+
+
+def preparar(carpeta, tamano, recursos, semilla):
+    corpus = os.path.join(carpeta, f"corpus-{tamano}.tsv")
+    if not os.path.exists(corpus):
+        print(f"Generando {corpus}...")
+        escribir_corpus(corpus, tamano, semilla)
+    inventario = os.path.join(carpeta, f"recursos-{recursos}.json")
+    if not os.path.exists(inventario):
+        escribir_inventario(inventario, recursos, semilla=semilla)
+    return corpus, inventario
+
+
+def medir_tamano(tamano, args):
+    corpus, inventario = preparar(args.carpeta, tamano, args.recursos, args.semilla)
+    ruta_indice = os.path.join(args.carpeta, f"indice-{tamano}")
+    if args.reconstruir and os.path.isdir(ruta_indice):
+        shutil.rmtree(ruta_indice)
+
+    variables = dict(os.environ,
+                     BCP_RUTA_DOCUMENTOS=corpus, BCP_RUTA_INDICE=ruta_indice, BCP_AZURE_FAKE=inventario,
+                     BCP_INVENTARIO_INTERVALO="0", BCP_CARGA_EN_SEGUNDO_PLANO="1")
+    if not args.con_cache:
+        variables.update(BCP_CACHE_EMBEDDINGS="0", BCP_CACHE_RESULTADOS="0")
+
+    url = f"http://127.0.0.1:{args.port}"
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(COMANDOS[args.modo](args.workers, args.port), env=variables)
+    filas = []
+    try:
+        esperar_listo(url, proceso, args.timeout)
+        arranque = {
+            "tamano": tamano,
+            "prueba": "arranque",
+            "arranque_s": round(time.perf_counter() - inicio, 2),
+            "documentos": requests.get(f"{url}/stats/indice", timeout=10).json()["documentos"],
+        }
+        fases = {f["nombre"]: f["segundos"] for f in requests.get(f"{url}/readyz", timeout=10).json()["fases"]}
+        arranque["indice_s"] = fases.get("indice")
+        arranque["fases"] = fases
+        arranque.update(memoria_servidor(proceso.pid))
+        filas.append(arranque)
+        print(json.dumps(arranque))
+
+        consultas = consultas_sinteticas(tamano, semilla=args.semilla + 1)
+        ranking = []
+
+        def simple(sesion, consulta):
+            r = sesion.get(f"{url}/buscar/", params={"query": consulta, "k": args.k})
+            r.raise_for_status()
+
+        def lote(sesion, consulta):
+            j = consultas.index(consulta)
+            grupo = [consultas[(j + i) % len(consultas)] for i in range(args.lote)]
+            r = sesion.post(f"{url}/buscar/batch", json={"consultas": grupo, "k": args.k})
+            r.raise_for_status()
+
+        def recursos(sesion, consulta):
+            r = sesion.get(f"{url}/azure-resources/search", params={"q": consulta, "limit": 50},
+                           headers={"X-Server-Timing": "1"})
+            r.raise_for_status()
+            for parte in r.headers.get("Server-Timing", "").split(","):
+                nombre, _, duracion = parte.strip().partition(";dur=")
+                if nombre == "ranking":
+                    ranking.append(float(duracion))
+
+        # Calentamiento (conexiones, primeras pasadas del modelo)
+        medir(simple, 1, 10, consultas)
+        pruebas = (("buscar", simple, consultas), ("buscar_batch", lote, consultas),
+                   ("azure_search", recursos, CONSULTAS_RECURSOS))
+        for clientes in args.clientes:
+            for nombre, funcion, lista in pruebas:
+                ranking.clear()
+                fila = {"tamano": tamano, "prueba": nombre, "clientes": clientes}
+                fila.update(medir(funcion, clientes, args.peticiones, lista))
+                if nombre == "buscar_batch":
+                    fila["consultas_por_seg"] = round(fila["throughput_rps"] * args.lote, 1)
+                if ranking:
+                    fila["ranking_p50_ms"] = round(percentil(ranking, 50), 3)
+                    fila["ranking_p99_ms"] = round(percentil(ranking, 99), 3)
+                filas.append(fila)
+                print(json.dumps(fila))
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=60)
+    return filas
+
+
+def comparar(archivo_a, archivo_b):
+    # Cambio relativo de cada metrica entre dos corridas (mismas pruebas)
+    with open(archivo_a, "r", encoding="utf-8") as f:
+        a = json.load(f)
+    with open(archivo_b, "r", encoding="utf-8") as f:
+        b = json.load(f)
+    print(f"A: {a['entorno']['commit']}  B: {b['entorno']['commit']}")
+    clave = lambda fila: (fila["tamano"], fila["prueba"], fila.get("clientes"))
+    anteriores = {clave(fila): fila for fila in a["resultados"]}
+    for fila in b["resultados"]:
+        previa = anteriores.get(clave(fila))
+        if previa is None:
+            continue
+        for metrica in COMPARABLES:
+            antes, despues = previa.get(metrica), fila.get(metrica)
+            if antes is None or despues is None:
+                continue
+            cambio = f"{100.0 * (despues - antes) / antes:+.1f}%" if antes else "n/a"
+            print(f"{fila['tamano']:>8} {fila['prueba']:<13} {str(fila.get('clientes') or ''):>3} "
+                  f"{metrica:<15} {antes:>10} -> {despues:<10} {cambio}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de rendimiento con corpus sinteticos, sin conexion a Azure")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--recursos", type=int, default=10000, help="recursos del inventario de Azure falso")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--peticiones", type=int, default=50, help="peticiones por cliente")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lote", type=int, default=16, help="consultas por llamada a /buscar/batch")
+    parser.add_argument("--modo", choices=sorted(COMANDOS), default="uvicorn")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--carpeta", default="data/benchmarks", help="corpus, inventario e indices generados")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--reconstruir", action="store_true", help="borrar el indice y medir la construccion")
+    parser.add_argument("--con-cache", action="store_true", help="mantener las caches de consultas")
+    parser.add_argument("--timeout", type=float, default=6 * 3600, help="segundos para que el servidor este listo")
+    parser.add_argument("--salida", help="archivo JSON (por defecto data/benchmarks/resultados-<commit>-<fecha>.json)")
+    parser.add_argument("--comparar", nargs=2, metavar=("A", "B"), help="comparar dos archivos de resultados")
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    os.makedirs(args.carpeta, exist_ok=True)
+    datos = {"entorno": entorno(), "parametros": vars(args), "resultados": []}
+    for tamano in args.tamanos:
+        datos["resultados"].extend(medir_tamano(tamano, args))
+
+    salida = args.salida or os.path.join(
+        args.carpeta, f"resultados-{(datos['entorno']['commit'] or 'sin-git')[:8]}-"
+                      f"{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2)
+    print(f"Resultados en {salida}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#------------------------------------------------------
+#----Cache LRU con TTL para consultas------------------
+#------------------------------------------------------
+# Se usa para dos cosas en /buscar/:
+#   - texto normalizado de la consulta -> embedding normalizado
+#   - (texto, k) -> resultados finales (se invalida cuando cambia el indice)
+# Los contadores de aciertos, fallos y desalojos se exponen en /stats/cache.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalizar_consulta(texto, minusculas=False):
+    # Colapsar espacios no cambia el embedding y aumenta los aciertos; pasar
+    # a minusculas solo con un modelo "uncased" (all-MiniLM-L6-v2), con uno
+    # que distingue mayusculas "SRV" y "srv" tienen embeddings distintos
+    texto = " ".join(texto.split())
+    return texto.lower() if minusculas else texto
+
+
+class CacheLRU:
+    def __init__(self, maximo=1024, ttl_segundos=600.0):
+        # maximo=0 desactiva la cache; ttl_segundos=0 = sin expiracion
+        self.maximo = maximo
+        self.ttl = ttl_segundos
+        self.datos = OrderedDict()
+        self.lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.expirados = 0
+
+    def obtener(self, clave):
+        # Devuelve None si no esta (o si expiro)
+        with self.lock:
+            entrada = self.datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            valor, creado = entrada
+            if self.ttl and time.monotonic() - creado > self.ttl:
+                del self.datos[clave]
+                self.expirados += 1
+                self.fallos += 1
+                return None
+            self.datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        if self.maximo <= 0:
+            return
+        with self.lock:
+            self.datos[clave] = (valor, time.monotonic())
+            self.datos.move_to_end(clave)
+            while len(self.datos) > self.maximo:
+                self.datos.popitem(last=False)
+                self.desalojos += 1
+
+    def limpiar(self):
+        with self.lock:
+            self.datos.clear()
+
+    def estadisticas(self):
+        with self.lock:
+            total = self.aciertos + self.fallos
+            return {
+                "tamano": len(self.datos),
+                "maximo": self.maximo,
+                "ttl_segundos": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos,
+                "expirados": self.expirados,
+                "tasa_aciertos": round(self.aciertos / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,130 @@
+#------------------------------------------------------
+#----Campos estructurados de los documentos------------
+#------------------------------------------------------
+# Cada linea de documentos.txt es "PROYECTO  CODIGO  descripcion" separada
+# por tabuladores o espacios (p. ej. YAPE  FWL-YAP-002  Firewall ...). Aqui
+# se separan esos campos en columnas alineadas con las filas del indice,
+# con la lista de filas de cada valor precalculada, para que /buscar/ pueda
+# restringir los candidatos por proyecto o tipo de activo (FWL, SRV, BDD)
+# antes de buscar, en lugar de traer de mas y filtrar despues.
+
+import re
+
+import numpy as np
+
+PATRON_LINEA = re.compile(r"^(\S+)\s+([0-9A-Za-z]+(?:-[0-9A-Za-z]+)+)\s+(.*)$")
+
+FILTROS = ("proyecto", "tipo")
+
+VACIO = np.empty(0, dtype=np.int64)
+
+
+def separar_campos(texto):
+    # Devuelve {"proyecto", "codigo", "tipo", "descripcion"} de una linea
+    coincidencia = PATRON_LINEA.match(texto.strip())
+    if not coincidencia:
+        return {"proyecto": "", "codigo": "", "tipo": "", "descripcion": texto.strip()}
+    proyecto, codigo, descripcion = coincidencia.groups()
+    return {
+        "proyecto": proyecto.upper(),
+        "codigo": codigo.upper(),
+        "tipo": codigo.split("-")[0].upper(),
+        "descripcion": descripcion.strip()
+    }
+
+
+def _valores_del_filtro(valor):
+    # "FWL,SRV" -> {"FWL", "SRV"}
+    return {v.strip().upper() for v in valor.split(",") if v.strip()}
+
+
+class ColumnasDocumentos:
+    # Columnas inmutables; agregar() y filtrar() devuelven una copia nueva
+    def __init__(self, columnas, filas_por_valor=None):
+        self.columnas = columnas  # nombre -> np.array (object) alineado con las filas
+        if filas_por_valor is not None:
+            self.filas_por_valor = filas_por_valor
+            return
+        self.filas_por_valor = {}
+        for nombre in FILTROS:
+            valores, codigos = np.unique(columnas[nombre], return_inverse=True)
+            orden = np.argsort(codigos, kind="stable")
+            cortes = np.searchsorted(codigos[orden], np.arange(len(valores) + 1))
+            self.filas_por_valor[nombre] = {
+                valor: orden[cortes[i]:cortes[i + 1]].astype(np.int64)
+                for i, valor in enumerate(valores.tolist())
+            }
+
+    @classmethod
+    def desde_textos(cls, textos):
+        separados = [separar_campos(t) for t in textos]
+        return cls({
+            nombre: np.array([s[nombre] for s in separados], dtype=object)
+            for nombre in ("proyecto", "codigo", "tipo")
+        })
+
+    def __len__(self):
+        return len(self.columnas["proyecto"])
+
+    def agregar(self, textos):
+        # Solo se extienden las filas de los valores que aparecen en los textos
+        # nuevos (sin volver a agrupar todo el corpus)
+        nuevas = ColumnasDocumentos.desde_textos(textos)
+        inicio = len(self)
+        filas_por_valor = {}
+        for nombre, por_valor in self.filas_por_valor.items():
+            por_valor = dict(por_valor)
+            for valor, filas in nuevas.filas_por_valor[nombre].items():
+                previas = por_valor.get(valor, VACIO)
+                por_valor[valor] = np.concatenate([previas, filas + inicio])
+            filas_por_valor[nombre] = por_valor
+        return ColumnasDocumentos({
+            nombre: np.concatenate([columna, nuevas.columnas[nombre]])
+            for nombre, columna in self.columnas.items()
+        }, filas_por_valor)
+
+    def sin_filas(self, filas):
+        # Las filas (documentos eliminados) dejan de aparecer en los filtros y
+        # en valores(), sin renumerar las demas
+        return self._reagrupar(filas, lambda previas, quitar: np.setdiff1d(previas, quitar, assume_unique=True))
+
+    def con_filas(self, filas):
+        # Vuelve a incluir filas quitadas con sin_filas()
+        return self._reagrupar(filas, np.union1d)
+
+    def _reagrupar(self, filas, operacion):
+        filas = np.asarray(filas, dtype=np.int64)
+        filas_por_valor = {}
+        for nombre, por_valor in self.filas_por_valor.items():
+            por_valor = dict(por_valor)
+            valores = self.columnas[nombre][filas]
+            for valor in set(valores.tolist()):
+                por_valor[valor] = operacion(por_valor.get(valor, VACIO), filas[valores == valor])
+            filas_por_valor[nombre] = por_valor
+        return ColumnasDocumentos(self.columnas, filas_por_valor)
+
+    def filtrar(self, mantener):
+        # mantener: mascara booleana de las filas que siguen en el indice
+        return ColumnasDocumentos({nombre: columna[mantener] for nombre, columna in self.columnas.items()})
+
+    def valores(self):
+        # Valores disponibles por filtro y cuantos documentos tiene cada uno
+        return {
+            nombre: {valor: len(filas) for valor, filas in por_valor.items() if valor and len(filas)}
+            for nombre, por_valor in self.filas_por_valor.items()
+        }
+
+    def filas_filtradas(self, filtros):
+        """
+        Filas (ordenadas) que cumplen todos los filtros, p. ej.
+        {"proyecto": "YAPE", "tipo": "FWL,SRV"}. None si no hay filtros.
+        """
+        resultado = None
+        for nombre, valor in filtros.items():
+            if not valor:
+                continue
+            por_valor = self.filas_por_valor[nombre]
+            listas = [por_valor[v] for v in _valores_del_filtro(valor) if v in por_valor]
+            filas = np.sort(np.concatenate(listas)) if listas else VACIO
+            resultado = filas if resultado is None else np.intersect1d(resultado, filas, assume_unique=True)
+        return resultado
@@ -0,0 +1,296 @@
+#------------------------------------------------------
+#----Codificadores de texto (PyTorch u ONNX Runtime)---
+#------------------------------------------------------
+# El backend del modelo se elige con BCP_CODIFICADOR:
+#   torch      --SentenceTransformer (por defecto)
+#   onnx       --el mismo modelo exportado a ONNX, con ONNX Runtime
+#   onnx-int8  --el modelo ONNX con cuantizacion dinamica int8
+# Los codificadores ONNX no importan torch (la API arranca mas rapido) y
+# solo usan onnxruntime y tokenizers. Todos exponen encode() y
+# get_sentence_embedding_dimension() como SentenceTransformer, y
+# `minusculas`: True si el modelo no distingue mayusculas ("uncased"), es
+# decir, si pasar el texto a minusculas no cambia su embedding.
+#
+# La exportacion se hace una vez (requiere torch y sentence-transformers)
+# y verifica que el coseno contra PyTorch sea > 0.99 en cada documento de
+# muestra; un modelo ONNX que no paso la verificacion no se carga:
+#
+#   python codificadores.py exportar --modelo all-MiniLM-L6-v2
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from metricas import tramo
+
+TIPOS_CODIFICADOR = ("torch", "onnx", "onnx-int8")
+
+# Carpeta de los modelos exportados: <carpeta>/<modelo>-onnx/
+CARPETA_MODELOS = os.environ.get("BCP_CARPETA_MODELOS", "data/modelos")
+
+ARCHIVO_ONNX = "modelo.onnx"
+ARCHIVO_ONNX_INT8 = "modelo-int8.onnx"
+ARCHIVO_CONFIG = "codificador.json"
+ARCHIVO_PARIDAD = "paridad.json"
+
+# Coseno minimo contra la salida de PyTorch para aceptar un modelo ONNX
+UMBRAL_PARIDAD = 0.99
+
+# Consultas de muestra para la verificacion (ademas de data/documentos.txt)
+TEXTOS_PARIDAD = [
+    "Firewall del Area Perimetral para FrontEnd",
+    "servidor de transacciones diarias",
+    "base de datos de seguridad",
+    "FWL-YAP-002",
+    "mirroring de transacciones",
+    "red interna multibanking",
+    "a",
+]
+
+
+def carpeta_onnx(nombre_modelo, carpeta=CARPETA_MODELOS):
+    return os.path.join(carpeta, nombre_modelo.replace("/", "_") + "-onnx")
+
+
+def fijar_hilos_torch(hilos):
+    # Limita los hilos intra-op de torch (por proceso) para que varias
+    # inferencias en paralelo no compitan por los mismos nucleos
+    if not hilos:
+        return
+    import torch
+    torch.set_num_threads(hilos)
+
+
+class CodificadorTorch:
+    def __init__(self, nombre_modelo, hilos=None):
+        from sentence_transformers import SentenceTransformer
+        fijar_hilos_torch(hilos)
+        self.modelo = SentenceTransformer(nombre_modelo)
+        # El tokenizador (do_lower_case) o el modulo Transformer pasan el texto a minusculas
+        self.minusculas = any(getattr(m, "do_lower_case", False) or
+                              getattr(getattr(m, "tokenizer", None), "do_lower_case", False)
+                              for m in self.modelo)
+
+    def get_sentence_embedding_dimension(self):
+        return self.modelo.get_sentence_embedding_dimension()
+
+    def encode(self, textos, convert_to_numpy=True):
+        return self.modelo.encode(textos, convert_to_numpy=True).astype("float32")
+
+
+class CodificadorOnnx:
+    def __init__(self, carpeta, cuantizado=False, hilos=None, verificar=True):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        archivo = ARCHIVO_ONNX_INT8 if cuantizado else ARCHIVO_ONNX
+        with open(os.path.join(carpeta, ARCHIVO_CONFIG), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        if verificar:
+            verificar_paridad_guardada(carpeta, archivo)
+
+        ruta_tokenizador = os.path.join(carpeta, "tokenizer.json")
+        self.tokenizador = Tokenizer.from_file(ruta_tokenizador)
+        with open(ruta_tokenizador, "r", encoding="utf-8") as f:
+            self.minusculas = normalizador_en_minusculas(json.load(f).get("normalizer"))
+        self.tokenizador.enable_truncation(self.config["max_seq_length"])
+        self.tokenizador.enable_padding(pad_id=self.config["pad_id"], pad_token=self.config["pad_token"])
+
+        opciones = ort.SessionOptions()
+        if hilos:
+            opciones.intra_op_num_threads = hilos
+            opciones.inter_op_num_threads = 1
+        self.sesion = ort.InferenceSession(os.path.join(carpeta, archivo), opciones,
+                                           providers=["CPUExecutionProvider"])
+        self.entradas = {e.name for e in self.sesion.get_inputs()}
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dimension"]
+
+    def encode(self, textos, convert_to_numpy=True, tamano_lote=64):
+        if isinstance(textos, str):
+            textos = [textos]
+        salida = np.empty((len(textos), self.config["dimension"]), dtype="float32")
+        for inicio in range(0, len(textos), tamano_lote):
+            salida[inicio:inicio + tamano_lote] = self._codificar_lote(textos[inicio:inicio + tamano_lote])
+        return salida
+
+    def _codificar_lote(self, textos):
+        with tramo("tokenizacion"):
+            codificados = self.tokenizador.encode_batch(list(textos))
+            mascara = np.array([c.attention_mask for c in codificados], dtype="int64")
+            entradas = {
+                "input_ids": np.array([c.ids for c in codificados], dtype="int64"),
+                "attention_mask": mascara,
+                "token_type_ids": np.array([c.type_ids for c in codificados], dtype="int64"),
+            }
+        with tramo("inferencia"):
+            tokens = self.sesion.run(None, {k: v for k, v in entradas.items() if k in self.entradas})[0]
+        with tramo("pooling"):
+            # Mean pooling sobre los tokens reales (igual que el modulo Pooling)
+            peso = mascara[:, :, None].astype("float32")
+            vectores = (tokens * peso).sum(axis=1) / np.clip(peso.sum(axis=1), 1e-9, None)
+            if self.config.get("normalizar"):
+                vectores /= np.clip(np.linalg.norm(vectores, axis=1, keepdims=True), 1e-12, None)
+        return vectores
+
+
+def normalizador_en_minusculas(normalizador):
+    # "normalizer" de tokenizer.json: BertNormalizer(lowercase), Lowercase o una Sequence
+    if not normalizador:
+        return False
+    if normalizador.get("type") == "Sequence":
+        return any(normalizador_en_minusculas(n) for n in normalizador.get("normalizers", []))
+    return normalizador.get("type") == "Lowercase" or bool(normalizador.get("lowercase"))
+
+
+def crear_codificador(nombre_modelo, tipo=None, hilos=None):
+    tipo = (tipo or os.environ.get("BCP_CODIFICADOR", "torch")).lower()
+    if tipo not in TIPOS_CODIFICADOR:
+        raise ValueError(f"Codificador desconocido: {tipo} (opciones: {', '.join(TIPOS_CODIFICADOR)})")
+    if tipo == "torch":
+        return CodificadorTorch(nombre_modelo, hilos)
+    carpeta = carpeta_onnx(nombre_modelo)
+    if not os.path.exists(os.path.join(carpeta, ARCHIVO_CONFIG)):
+        raise FileNotFoundError(f"No hay modelo ONNX en {carpeta}: "
+                                f"python codificadores.py exportar --modelo {nombre_modelo}")
+    return CodificadorOnnx(carpeta, cuantizado=tipo == "onnx-int8", hilos=hilos)
+
+
+def cosenos(a, b):
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
+
+
+def verificar_paridad_guardada(carpeta, archivo):
+    try:
+        with open(os.path.join(carpeta, ARCHIVO_PARIDAD), "r", encoding="utf-8") as f:
+            paridad = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        paridad = {}
+    resultado = paridad.get(archivo)
+    if not resultado or resultado["coseno_min"] < UMBRAL_PARIDAD:
+        raise ValueError(f"{archivo} no paso la verificacion de paridad con PyTorch "
+                         f"(coseno minimo {resultado and resultado['coseno_min']}, se exige > {UMBRAL_PARIDAD})")
+
+
+def textos_de_muestra(ruta_documentos="data/documentos.txt", maximo=512):
+    textos = list(TEXTOS_PARIDAD)
+    if os.path.exists(ruta_documentos):
+        with open(ruta_documentos, "r", encoding="utf-8") as f:
+            for linea in f:
+                if linea.strip():
+                    textos.append(linea.strip())
+                if len(textos) >= maximo:
+                    break
+    return textos
+
+
+def modo_pooling(pooling):
+    # get_pooling_mode_str() en sentence-transformers 2.x/3.x; pooling_mode en versiones nuevas
+    if hasattr(pooling, "get_pooling_mode_str"):
+        return pooling.get_pooling_mode_str()
+    return pooling.get_config_dict().get("pooling_mode")
+
+
+def exportar_onnx(nombre_modelo, carpeta=None, cuantizar=True, textos=None):
+    """
+    Exporta el transformer de un SentenceTransformer a ONNX (y su version
+    int8), guarda el tokenizador y la configuracion de pooling, y escribe
+    paridad.json con el coseno minimo y medio contra PyTorch.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    carpeta = carpeta or carpeta_onnx(nombre_modelo)
+    os.makedirs(carpeta, exist_ok=True)
+    referencia = SentenceTransformer(nombre_modelo, device="cpu")
+    modulos = [type(m).__name__ for m in referencia]
+    transformer, pooling = referencia[0], referencia[1]
+    if modulos[:2] != ["Transformer", "Pooling"] or modo_pooling(pooling) != "mean" \
+            or any(m not in ("Transformer", "Pooling", "Normalize") for m in modulos):
+        raise ValueError(f"Solo se exportan modelos Transformer + mean Pooling (+ Normalize): {modulos}")
+
+    tokenizador = transformer.tokenizer
+    tokenizador.save_pretrained(carpeta)
+    config = {
+        "modelo": nombre_modelo,
+        "dimension": referencia.get_sentence_embedding_dimension(),
+        "max_seq_length": referencia.max_seq_length,
+        "pad_id": tokenizador.pad_token_id,
+        "pad_token": tokenizador.pad_token,
+        "normalizar": "Normalize" in modulos,
+    }
+    with open(os.path.join(carpeta, ARCHIVO_CONFIG), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+    class SoloTokens(torch.nn.Module):
+        # El transformer devuelve un ModelOutput; ONNX recibe solo los tokens
+        def __init__(self, modelo):
+            super().__init__()
+            self.modelo = modelo
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.modelo(input_ids=input_ids, attention_mask=attention_mask,
+                               token_type_ids=token_type_ids)[0]
+
+    ejemplo = tokenizador(["texto de ejemplo", "otro texto"], padding=True, return_tensors="pt")
+    ejes = {"lote": 0, "secuencia": 1}
+    torch.onnx.export(
+        SoloTokens(transformer.auto_model).eval(),
+        (ejemplo["input_ids"], ejemplo["attention_mask"], ejemplo["token_type_ids"]),
+        os.path.join(carpeta, ARCHIVO_ONNX),
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["tokens"],
+        dynamic_axes={
+            "input_ids": {0: "lote", 1: "secuencia"},
+            "attention_mask": {0: "lote", 1: "secuencia"},
+            "token_type_ids": {0: "lote", 1: "secuencia"},
+            "tokens": {0: "lote", 1: "secuencia"},
+        },
+        opset_version=17,
+        dynamo=False,
+    )
+    archivos = [ARCHIVO_ONNX]
+    if cuantizar:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(os.path.join(carpeta, ARCHIVO_ONNX), os.path.join(carpeta, ARCHIVO_ONNX_INT8),
+                         weight_type=QuantType.QInt8)
+        archivos.append(ARCHIVO_ONNX_INT8)
+
+    # Paridad contra la salida de PyTorch en los textos de muestra
+    textos = textos or textos_de_muestra()
+    esperado = referencia.encode(textos, convert_to_numpy=True)
+    paridad = {}
+    for archivo in archivos:
+        codificador = CodificadorOnnx(carpeta, cuantizado=archivo == ARCHIVO_ONNX_INT8, verificar=False)
+        similitud = cosenos(esperado, codificador.encode(textos))
+        paridad[archivo] = {"coseno_min": round(float(similitud.min()), 6),
+                            "coseno_medio": round(float(similitud.mean()), 6),
+                            "textos": len(textos)}
+    with open(os.path.join(carpeta, ARCHIVO_PARIDAD), "w", encoding="utf-8") as f:
+        json.dump(paridad, f, indent=2)
+    return paridad
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el modelo de embeddings a ONNX")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    exportar = subcomandos.add_parser("exportar")
+    exportar.add_argument("--modelo", default=os.environ.get("BCP_MODELO", "all-MiniLM-L6-v2"))
+    exportar.add_argument("--carpeta", help="por defecto data/modelos/<modelo>-onnx")
+    exportar.add_argument("--sin-int8", action="store_true", help="no generar la version cuantizada")
+    args = parser.parse_args()
+
+    paridad = exportar_onnx(args.modelo, args.carpeta, cuantizar=not args.sin_int8)
+    print(json.dumps(paridad, indent=2))
+    fallidos = [a for a, r in paridad.items() if r["coseno_min"] < UMBRAL_PARIDAD]
+    if fallidos:
+        raise SystemExit(f"Paridad insuficiente en {', '.join(fallidos)} (coseno minimo < {UMBRAL_PARIDAD})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+#------------------------------------------------------
+#----Coordinador de shards (scatter-gather)------------
+#------------------------------------------------------
+# El corpus se reparte en N shards (particiones.py) y cada uno se sirve con
+# BCP_app en su propio proceso: su modelo, su indice FAISS y su BM25. Este
+# coordinador recibe /buscar/ (y /buscar/batch), consulta en paralelo a los shards que pueden
+# tener resultados y combina sus listas (ya ordenadas) con un heap.
+#
+#   BCP_SHARDS=http://127.0.0.1:8001,http://127.0.0.1:8002
+#   BCP_SHARD_TIMEOUT=2        (segundos por shard; timeout= por peticion)
+#   BCP_SHARD_MANIFIESTO=data/particiones/proyecto-2
+#     (opcional: con clave proyecto, proyecto=YAPE solo consulta su shard)
+#
+# Si un shard no responde a tiempo o falla, la respuesta se arma con los
+# demas y lo indica: "parcial": true y el motivo en "shards"."errores".
+# Solo si fallan todos se responde 503.
+#
+# Cada shard devuelve sus desde + k mejores con el puntaje de su ranking. En
+# semantic es la similitud coseno, que se compara igual entre shards, asi el
+# modo semantico da el mismo resultado que un solo indice. En lexical e hybrid el puntaje de cada shard usa sus propias
+# estadisticas (IDF de BM25, rangos de RRF) y la mezcla es aproximada.
+#
+# Para probar en una sola maquina, el mismo modulo reparte el corpus,
+# levanta un BCP_app por shard (puertos port+1, port+2, ...) y sirve el
+# coordinador en --port:
+#
+#   python coordinador.py --shards 3 --clave proyecto --port 8000
+#   python -m benchmarks.carga_buscar --url http://127.0.0.1:8000
+#
+# Los documentos se agregan en el corpus de origen (BCP_RUTA_DOCUMENTOS);
+# al volver a lanzar se reparten de nuevo.
+
+import argparse
+import asyncio
+import base64
+import heapq
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
+
+from metricas import Contador, Histograma, MiddlewareMetricas, exponer, tramo
+from particiones import CLAVES, RUTA_DOCUMENTOS, carpeta_particiones, dividir, leer_manifiesto, shards_de_proyectos
+
+TIMEOUT_SHARD = float(os.environ.get("BCP_SHARD_TIMEOUT", "2"))
+MAX_PROFUNDIDAD = int(os.environ.get("BCP_MAX_PROFUNDIDAD", "1000"))
+
+LATENCIA_SHARD = Histograma("bcp_shard_segundos", "Duracion de cada consulta a un shard", ("shard",))
+ERRORES_SHARD = Contador("bcp_shard_errores_total", "Consultas a shards que fallaron o vencieron",
+                         ("shard", "motivo"))
+
+#Se asignan en configurar()
+shards = []
+manifiesto = None
+
+
+def configurar(urls, carpeta_manifiesto=None):
+    global shards, manifiesto
+    shards = [u.strip().rstrip("/") for u in urls if u.strip()]
+    manifiesto = None
+    if carpeta_manifiesto:
+        leido = leer_manifiesto(carpeta_manifiesto)
+        if len(leido["shards"]) == len(shards):
+            manifiesto = leido
+        else:
+            print(f"El manifiesto tiene {len(leido['shards'])} shards y BCP_SHARDS {len(shards)}; se consultan todos")
+
+
+configurar(os.environ.get("BCP_SHARDS", "").split(","), os.environ.get("BCP_SHARD_MANIFIESTO"))
+
+cliente = None
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    #Un solo cliente con conexiones keep-alive hacia los shards
+    global cliente
+    cliente = httpx.AsyncClient(timeout=TIMEOUT_SHARD,
+                                limits=httpx.Limits(max_connections=64 * max(len(shards), 1),
+                                                    max_keepalive_connections=16 * max(len(shards), 1)))
+    yield
+    await cliente.aclose()
+
+
+app = FastAPI(lifespan=ciclo_de_vida)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Server-Timing"]
+)
+
+app.add_middleware(MiddlewareMetricas)
+
+
+class ErrorDeConsulta(Exception):
+    # Un shard rechazo la consulta (4xx): el error es de la peticion, no del shard
+    def __init__(self, estado, detalle):
+        super().__init__(detalle)
+        self.estado = estado
+        self.detalle = detalle
+
+
+def _detalle(respuesta):
+    try:
+        return respuesta.json().get("detail", respuesta.text)
+    except ValueError:
+        return respuesta.text
+
+
+async def consultar_shard(url, ruta, params, timeout, cuerpo=None):
+    # Devuelve (datos, error, segundos); error es None si respondio bien.
+    # Con cuerpo se hace un POST con ese JSON
+    inicio = time.perf_counter()
+    if cuerpo is None:
+        peticion = cliente.get(f"{url}{ruta}", params=params, timeout=timeout)
+    else:
+        peticion = cliente.post(f"{url}{ruta}", json=cuerpo, timeout=timeout)
+    try:
+        respuesta = await asyncio.wait_for(peticion, timeout)
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        ERRORES_SHARD.incrementar(url, "timeout")
+        return None, f"sin respuesta en {timeout:g} s", time.perf_counter() - inicio
+    except httpx.HTTPError as e:
+        ERRORES_SHARD.incrementar(url, "conexion")
+        return None, f"{type(e).__name__}: {str(e)}", time.perf_counter() - inicio
+    finally:
+        LATENCIA_SHARD.observar(time.perf_counter() - inicio, url)
+    segundos = time.perf_counter() - inicio
+    if 400 <= respuesta.status_code < 500:
+        raise ErrorDeConsulta(respuesta.status_code, _detalle(respuesta))
+    if respuesta.status_code != 200:
+        ERRORES_SHARD.incrementar(url, str(respuesta.status_code))
+        return None, f"HTTP {respuesta.status_code}: {_detalle(respuesta)}", segundos
+    return respuesta.json(), None, segundos
+
+
+def combinar(listas, n):
+    # Mezcla de k listas ordenadas por puntaje (mayor primero) con un heap,
+    # sin ids repetidos, hasta n resultados
+    vistos, combinados = set(), []
+    for resultado in heapq.merge(*listas, key=lambda r: -r["puntaje"]):
+        if resultado["id"] in vistos:
+            continue
+        vistos.add(resultado["id"])
+        combinados.append(resultado)
+        if len(combinados) == n:
+            break
+    return combinados
+
+
+def crear_cursor(parametros):
+    texto = json.dumps(parametros, separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def leer_cursor(cursor):
+    try:
+        parametros = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(parametros, dict) or "query" not in parametros or "desde" not in parametros:
+            raise ValueError(cursor)
+        return parametros
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+async def repartir(elegidos, ruta, params, timeout=None, cuerpo=None):
+    # Consulta en paralelo los shards elegidos: devuelve (respuestas de los
+    # que respondieron, informe para la respuesta). 503 si no respondio ninguno
+    if not shards:
+        raise HTTPException(status_code=503, detail="No hay shards configurados (BCP_SHARDS)")
+    espera = timeout or TIMEOUT_SHARD
+    try:
+        with tramo("shards"):
+            respuestas = await asyncio.gather(*(consultar_shard(shards[i], ruta, params, espera, cuerpo)
+                                                for i in elegidos))
+    except ErrorDeConsulta as e:
+        raise HTTPException(status_code=e.estado, detail=e.detalle)
+    datos_ok, errores, segundos = [], {}, {}
+    for i, (datos, error, duracion) in zip(elegidos, respuestas):
+        segundos[shards[i]] = round(duracion, 4)
+        if error is not None:
+            errores[shards[i]] = error
+        else:
+            datos_ok.append(datos)
+    if elegidos and not datos_ok:
+        raise HTTPException(status_code=503, detail={"mensaje": "Ningún shard respondió", "errores": errores},
+                            headers={"Retry-After": "1"})
+    return datos_ok, {"consultados": len(elegidos), "respondieron": len(datos_ok), "errores": errores,
+                      "segundos": segundos}
+
+
+def shards_para(proyecto):
+    # Indices de los shards a consultar: todos, salvo que el corpus este
+    # particionado por proyecto (con otra clave cualquier shard puede tenerlo)
+    if proyecto and manifiesto is not None:
+        elegidos = shards_de_proyectos(manifiesto, proyecto)
+        if elegidos is not None:
+            return elegidos
+    return list(range(len(shards)))
+
+
+@app.get("/buscar/")
+async def buscar(query: str = None, k: int = Query(3, ge=1),
+                 mode: Literal["semantic", "lexical", "hybrid"] = None,
+                 fusion: Literal["rrf", "ponderada"] = None,
+                 alpha: float = Query(None, ge=0.0, le=1.0),
+                 nprobe: int = Query(None, ge=1), ef_search: int = Query(None, ge=1),
+                 proyecto: str = None, tipo: str = None, rerank: int = Query(None, ge=0),
+                 min_similitud: float = Query(None, ge=-1.0, le=1.0), campos: str = None,
+                 cursor: str = None, timeout: float = Query(None, gt=0)):
+    #Mismos parametros que /buscar/ de BCP_app (los que no se pasan quedan
+    #con el valor por defecto de cada shard); timeout= reemplaza a
+    #BCP_SHARD_TIMEOUT en esta peticion
+    if cursor:
+        p = leer_cursor(cursor)
+    elif query is None:
+        raise HTTPException(status_code=400, detail="Falta query (o cursor)")
+    else:
+        p = {"query": query, "k": k, "mode": mode, "fusion": fusion, "alpha": alpha, "nprobe": nprobe,
+             "ef_search": ef_search, "proyecto": proyecto, "tipo": tipo, "rerank": rerank,
+             "min_similitud": min_similitud, "campos": campos, "desde": 0}
+    desde, k = p["desde"], p["k"]
+    if desde + k > MAX_PROFUNDIDAD:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_PROFUNDIDAD} resultados por búsqueda")
+
+    #Cada shard devuelve sus desde + k + 1 mejores (uno de mas para saber si
+    #hay otra pagina); para combinar hacen falta id y puntaje
+    pedidos = [c.strip() for c in p["campos"].split(",") if c.strip()] if p["campos"] else None
+    params = {clave: valor for clave, valor in p.items()
+              if valor is not None and clave not in ("desde", "k", "campos")}
+    params["k"] = desde + k + 1
+    if pedidos is not None:
+        params["campos"] = ",".join(dict.fromkeys(pedidos + ["id", "puntaje"]))
+
+    elegidos = shards_para(p["proyecto"])
+    respuestas, informe = await repartir(elegidos, "/buscar/", params, timeout)
+    listas = [datos["resultados"] for datos in respuestas]
+    modo = respuestas[0]["modo"] if respuestas else p["mode"]
+
+    with tramo("combinar"):
+        filas = combinar(listas, desde + k + 1)
+    pagina = filas[desde:desde + k]
+    if pedidos is not None:
+        pagina = [{c: r[c] for c in pedidos} for r in pagina]
+    siguiente = crear_cursor(dict(p, desde=desde + k)) if len(filas) > desde + k else None
+    return {
+        "consulta": p["query"],
+        "modo": modo,
+        "desde": desde,
+        "resultados": pagina,
+        "siguiente": siguiente,
+        "parcial": bool(informe["errores"]),
+        "shards": informe
+    }
+
+
+class ConsultasLote(BaseModel):
+    consultas: list[str]
+    k: int = 3
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    proyecto: Optional[str] = None
+    tipo: Optional[str] = None
+    rerank: Optional[int] = None
+    min_similitud: Optional[float] = None
+    campos: Optional[str] = None
+
+
+# Varias consultas en una sola llamada: cada shard recibe el lote completo
+@app.post("/buscar/batch")
+async def buscar_batch(body: ConsultasLote, timeout: float = Query(None, gt=0)):
+    if not body.consultas:
+        return {"resultados": []}
+    pedidos = [c.strip() for c in body.campos.split(",") if c.strip()] if body.campos else None
+    cuerpo = body.model_dump(exclude_none=True)
+    if pedidos is not None:
+        cuerpo["campos"] = ",".join(dict.fromkeys(pedidos + ["id", "puntaje"]))
+    respuestas, informe = await repartir(shards_para(body.proyecto), "/buscar/batch", None, timeout, cuerpo)
+    resultados = []
+    with tramo("combinar"):
+        for n, consulta in enumerate(body.consultas):
+            filas = combinar([datos["resultados"][n]["resultados"] for datos in respuestas], body.k)
+            if pedidos is not None:
+                filas = [{c: r[c] for c in pedidos} for r in filas]
+            resultados.append({"consulta": consulta, "resultados": filas})
+    return {"resultados": resultados, "parcial": bool(informe["errores"]), "shards": informe}
+
+
+async def estado_shards(ruta):
+    # url -> (respuesta del shard o None, error o None)
+    respuestas = await asyncio.gather(*(consultar_shard(url, ruta, {}, TIMEOUT_SHARD) for url in shards),
+                                      return_exceptions=True)
+    estado = {}
+    for url, respuesta in zip(shards, respuestas):
+        if isinstance(respuesta, Exception):
+            estado[url] = (None, str(respuesta))
+        else:
+            estado[url] = respuesta[:2]
+    return estado
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"estado": "ok", "shards": len(shards)}
+
+
+# 200 cuando todos los shards estan listos; con alguno caido /buscar/ igual
+# responde (parcial), pero /readyz da 503 para que se note
+@app.get("/readyz")
+async def readyz():
+    estado = await estado_shards("/readyz")
+    listos = sum(1 for _, error in estado.values() if error is None)
+    contenido = {"listos": listos,
+                 "shards": {url: datos if error is None else {"error": error} for url, (datos, error) in estado.items()}}
+    if not shards or listos < len(shards):
+        return JSONResponse(status_code=503, content=contenido, headers={"Retry-After": "5"})
+    return contenido
+
+
+# Documentos, proyectos y estado de cada shard
+@app.get("/stats/shards")
+async def stats_shards():
+    indices = await estado_shards("/stats/indice")
+    return {
+        "clave": manifiesto["clave"] if manifiesto else None,
+        "timeout": TIMEOUT_SHARD,
+        "shards": [{
+            "url": url,
+            "proyectos": manifiesto["shards"][i]["proyectos"] if manifiesto else None,
+            "documentos": indices[url][0]["documentos"] if indices[url][0] else None,
+            "error": indices[url][1]
+        } for i, url in enumerate(shards)]
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def lanzar_shards(manifiesto_local, host, puerto_base, log_level):
+    # Un proceso BCP_app por shard, con su archivo de documentos y su indice
+    procesos, urls = [], []
+    for i, shard in enumerate(manifiesto_local["shards"]):
+        puerto = puerto_base + 1 + i
+        entorno = dict(os.environ, BCP_RUTA_DOCUMENTOS=shard["documentos"], BCP_RUTA_INDICE=shard["indice"],
+                       BCP_INVENTARIO="0")
+        procesos.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "BCP_app:app", "--host", host, "--port", str(puerto),
+             "--log-level", log_level],
+            env=entorno))
+        urls.append(f"http://{host}:{puerto}")
+    return procesos, urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shards locales de BCP_app y coordinador de /buscar/")
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--clave", choices=CLAVES, default="proyecto")
+    parser.add_argument("--origen", default=RUTA_DOCUMENTOS, help="archivo o carpeta de documentos")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="warning", help="nivel de log de los shards")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    manifiesto_local = dividir(args.shards, args.clave, args.origen)
+    for i, shard in enumerate(manifiesto_local["shards"]):
+        proyectos = f" ({', '.join(shard['proyectos'])})" if shard["proyectos"] else ""
+        print(f"shard {i}: {shard['cantidad']} documentos{proyectos}")
+    procesos, urls = lanzar_shards(manifiesto_local, args.host, args.port, args.log_level)
+    configurar(urls, carpeta_particiones(args.shards, args.clave))
+    print(f"Coordinador en http://{args.host}:{args.port}, shards: {', '.join(urls)}")
+    # uvicorn vuelve a emitir la señal al terminar: con SIGTERM tambien se
+    # pasa por el finally que detiene los shards (SIGINT ya lo hace)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        uvicorn.run(app, host=args.host, port=args.port)
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+        for proceso in procesos:
+            proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#------------------------------------------------------
+#----Pools de ejecucion acotados-----------------------
+#------------------------------------------------------
+# Los endpoints son async: el trabajo bloqueante se envia a un pool propio
+# en lugar del threadpool por defecto de Starlette. La inferencia del modelo
+# y las llamadas a Azure usan pools distintos, asi un refresco lento de Azure
+# no ocupa los hilos de /buscar/. Cada pool admite como maximo
+# `trabajadores + max_cola` tareas a la vez; si esta lleno se rechaza la
+# tarea con Saturado (la API responde 503) en lugar de acumular latencia.
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from metricas import Histograma
+
+ESPERA_POOL = Histograma("bcp_pool_espera_segundos", "Tiempo en cola antes de que un hilo del pool tome la tarea",
+                         ("pool",))
+
+
+class Saturado(Exception):
+    # El pool no admite mas tareas en este momento
+    def __init__(self, nombre):
+        super().__init__(f"El pool '{nombre}' está saturado, intente nuevamente")
+        self.nombre = nombre
+
+
+class PoolAcotado:
+    def __init__(self, nombre, trabajadores, max_cola, tipo="thread", inicializador=None, argumentos=()):
+        # tipo: "thread" (mismo proceso) o "process" (la funcion y sus
+        # argumentos deben poder serializarse)
+        self.nombre = nombre
+        self.trabajadores = trabajadores
+        self.max_cola = max_cola
+        self.tipo = tipo
+        if tipo == "process":
+            self.executor = ProcessPoolExecutor(trabajadores, initializer=inicializador, initargs=argumentos)
+        else:
+            self.executor = ThreadPoolExecutor(trabajadores, thread_name_prefix=nombre,
+                                               initializer=inicializador, initargs=argumentos)
+        self.cupos = threading.BoundedSemaphore(trabajadores + max_cola)
+        self.lock = threading.Lock()
+        self.en_curso = 0
+        self.completadas = 0
+        self.rechazadas = 0
+
+    def enviar(self, funcion, *args, **kwargs):
+        # Devuelve un concurrent.futures.Future o lanza Saturado sin esperar
+        if not self.cupos.acquire(blocking=False):
+            with self.lock:
+                self.rechazadas += 1
+            raise Saturado(self.nombre)
+        with self.lock:
+            self.en_curso += 1
+        try:
+            if self.tipo == "thread":
+                # El contexto de la peticion (tiempos por etapa) sigue a la tarea
+                futuro = self.executor.submit(_en_contexto, contextvars.copy_context(), self.nombre,
+                                              time.perf_counter(), funcion, args, kwargs)
+            else:
+                futuro = self.executor.submit(funcion, *args, **kwargs)
+        except BaseException:
+            self._liberar(None)
+            raise
+        futuro.add_done_callback(self._liberar)
+        return futuro
+
+    def _liberar(self, futuro):
+        with self.lock:
+            self.en_curso -= 1
+            if futuro is not None:
+                self.completadas += 1
+        self.cupos.release()
+
+    async def ejecutar(self, funcion, *args, **kwargs):
+        # Version para endpoints async: espera sin bloquear el event loop
+        return await asyncio.wrap_future(self.enviar(funcion, *args, **kwargs))
+
+    def estadisticas(self):
+        with self.lock:
+            return {
+                "tipo": self.tipo,
+                "trabajadores": self.trabajadores,
+                "max_cola": self.max_cola,
+                "en_curso": self.en_curso,
+                "completadas": self.completadas,
+                "rechazadas": self.rechazadas
+            }
+
+
+def _en_contexto(contexto, nombre, enviado, funcion, args, kwargs):
+    ESPERA_POOL.observar(time.perf_counter() - enviado, nombre)
+    return contexto.run(funcion, *args, **kwargs)
+
+
+#Modelo cargado en cada proceso del pool de inferencia (tipo "process")
+_modelo_proceso = None
+
+
+def iniciar_proceso_modelo(nombre_modelo, tipo_codificador, hilos):
+    global _modelo_proceso
+    from codificadores import crear_codificador
+    _modelo_proceso = crear_codificador(nombre_modelo, tipo_codificador, hilos)
+
+
+def codificar_en_proceso(textos):
+    return _modelo_proceso.encode(textos, convert_to_numpy=True)
+
+
+def hilos_por_defecto(trabajadores):
+    # Reparte los nucleos entre los trabajadores de inferencia
+    return max(1, (os.cpu_count() or 1) // max(1, trabajadores))
+
+
+def pool_desde_entorno(nombre, trabajadores, max_cola, **opciones):
+    # BCP_<NOMBRE>_HILOS y BCP_<NOMBRE>_COLA reemplazan los valores por defecto
+    prefijo = f"BCP_{nombre.upper()}"
+    return PoolAcotado(
+        nombre,
+        int(os.environ.get(f"{prefijo}_HILOS", trabajadores)),
+        int(os.environ.get(f"{prefijo}_COLA", max_cola)),
+        **opciones
+    )
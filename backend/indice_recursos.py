@@ -0,0 +1,185 @@
+#------------------------------------------------------
+#----Indice semantico del inventario de Azure----------
+#------------------------------------------------------
+# Cada recurso (nombre, tipo, ubicacion y tags) se convierte en un texto y
+# se codifica con el mismo modelo de los documentos. Los vectores se guardan
+# en una carpeta aparte (BCP_RUTA_INDICE_RECURSOS):
+#   embeddings.npy --matriz float32 normalizada (una fila por recurso)
+#   meta.json      --modelo, id de Azure y hash del texto de cada fila
+# Con cada lista nueva del inventario solo se codifican los recursos nuevos
+# o cuyo texto cambio; los demas reutilizan su vector. La matriz que se
+# devuelve queda alineada con la lista, para que MotorRanking mezcle la
+# similitud coseno con su puntaje por niveles. Con un cambio incremental
+# del inventario, vectores_de() codifica solo los recursos que cambiaron y
+# los agrega a la matriz guardada (sin esperar a la proxima lista completa).
+#
+# El inventario es chico (miles de recursos): la similitud se calcula
+# contra toda la matriz, sin un indice aproximado.
+
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from indice_vectorial import hash_documento
+
+RUTA_INDICE_RECURSOS = os.environ.get("BCP_RUTA_INDICE_RECURSOS", "data/indice_recursos")
+
+ARCHIVO_EMBEDDINGS = "embeddings.npy"
+ARCHIVO_META = "meta.json"
+
+# Version del formato en disco
+FORMATO = 1
+
+# Recursos por llamada al modelo
+TAMANO_LOTE = int(os.environ.get("BCP_RECURSOS_LOTE", "256"))
+
+
+def _palabras(texto):
+    # "fwl-yap-001" -> "fwl yap 001" / "azureFirewalls" -> "azure Firewalls"
+    texto = re.sub(r"([a-z])([A-Z])", r"\1 \2", texto)
+    return " ".join(re.findall(r"[^\W_]+", texto))
+
+
+def texto_recurso(recurso):
+    # Texto que se codifica: nombre y tipo legibles, ubicacion y tags
+    proveedor, _, tipo = recurso["type"].rpartition("/")
+    partes = [
+        _palabras(recurso["name"]),
+        f"{_palabras(tipo)} ({_palabras(proveedor.split('.')[-1])})" if proveedor else _palabras(tipo),
+        recurso.get("location") or "",
+    ]
+    tags = recurso.get("tags") or {}
+    partes.extend(f"{clave}: {valor}" for clave, valor in sorted(tags.items()))
+    return ". ".join(p for p in partes if p)
+
+
+class IndiceRecursos:
+    def __init__(self, codificar, nombre_modelo, ruta=RUTA_INDICE_RECURSOS):
+        # codificar(textos) -> matriz float32 normalizada
+        self.codificar = codificar
+        self.nombre_modelo = nombre_modelo
+        self.ruta = ruta
+        self.lock = threading.Lock()
+        self.matriz = None
+        self.filas = {}   # id de Azure -> (hash del texto, fila en self.matriz)
+        self.codificados = 0  # recursos codificados desde que arranco el proceso
+        self._cargar()
+
+    def _cargar(self):
+        try:
+            with open(os.path.join(self.ruta, ARCHIVO_META), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            matriz = np.load(os.path.join(self.ruta, ARCHIVO_EMBEDDINGS))
+        except (OSError, ValueError):
+            return
+        # Con otro modelo los vectores guardados no sirven
+        if meta.get("formato") != FORMATO or meta.get("modelo") != self.nombre_modelo:
+            return
+        if len(meta["ids"]) != len(matriz):
+            return
+        self.matriz = matriz
+        self.filas = {id_: (h, fila) for fila, (id_, h) in enumerate(zip(meta["ids"], meta["hashes"]))}
+
+    def _guardar(self, ids, hashes, matriz):
+        os.makedirs(self.ruta, exist_ok=True)
+        archivo_embeddings = os.path.join(self.ruta, ARCHIVO_EMBEDDINGS)
+        archivo_meta = os.path.join(self.ruta, ARCHIVO_META)
+        with open(archivo_embeddings + ".tmp", "wb") as f:
+            np.save(f, matriz)
+        meta = {"formato": FORMATO, "modelo": self.nombre_modelo, "dimension": int(matriz.shape[1]),
+                "ids": ids, "hashes": hashes}
+        with open(archivo_meta + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        # meta.json se reemplaza al final: si no coincide con la matriz, se ignora al cargar
+        os.replace(archivo_embeddings + ".tmp", archivo_embeddings)
+        os.replace(archivo_meta + ".tmp", archivo_meta)
+
+    def _calcular(self, recursos):
+        # (matriz alineada con recursos, ids, hashes, posiciones codificadas)
+        ids = [r["id"] for r in recursos]
+        textos = [texto_recurso(r) for r in recursos]
+        hashes = [hash_documento(t) for t in textos]
+        previas = [self.filas.get(id_) for id_ in ids]
+        reutilizadas = [i for i, previa in enumerate(previas) if previa is not None and previa[0] == hashes[i]]
+        conocidas = set(reutilizadas)
+        pendientes = [i for i in range(len(ids)) if i not in conocidas]
+
+        nuevos = None
+        if pendientes:
+            nuevos = np.vstack([
+                self.codificar([textos[i] for i in pendientes[inicio:inicio + TAMANO_LOTE]])
+                for inicio in range(0, len(pendientes), TAMANO_LOTE)
+            ]).astype("float32", copy=False)
+        dimension = nuevos.shape[1] if nuevos is not None else self.matriz.shape[1]
+
+        matriz = np.empty((len(recursos), dimension), dtype="float32")
+        if reutilizadas:
+            matriz[reutilizadas] = self.matriz[[previas[i][1] for i in reutilizadas]]
+        if pendientes:
+            matriz[pendientes] = nuevos
+        self.codificados += len(pendientes)
+        return matriz, ids, hashes, pendientes
+
+    def vectores(self, recursos):
+        """
+        Matriz (solo lectura) con el vector de cada recurso, en el orden de
+        `recursos`. Solo se codifican los ids nuevos o con texto distinto;
+        si algo cambio, la matriz y sus hashes se guardan en disco.
+        """
+        if not recursos:
+            return None
+        with self.lock:
+            matriz, ids, hashes, pendientes = self._calcular(recursos)
+            matriz.setflags(write=False)
+            cambio = bool(pendientes) or self.filas.keys() != set(ids)
+            self.matriz = matriz
+            self.filas = {id_: (h, fila) for fila, (id_, h) in enumerate(zip(ids, hashes))}
+            if cambio:
+                self._guardar(ids, hashes, matriz)
+            if pendientes:
+                print(f"Indice de recursos: {len(pendientes)} de {len(recursos)} recursos codificados")
+            return matriz
+
+    def vectores_de(self, recursos):
+        """
+        Como vectores(), pero solo para los recursos agregados o modificados
+        de un cambio incremental del inventario (no se recibe la lista
+        completa). Los vectores codificados reemplazan o se agregan a las
+        filas guardadas y la matriz se escribe en disco, asi un reinicio
+        no los vuelve a codificar. Las filas de recursos eliminados se
+        descartan con la proxima llamada a vectores().
+        """
+        if not recursos:
+            return None
+        with self.lock:
+            matriz, ids, hashes, pendientes = self._calcular(recursos)
+            matriz.setflags(write=False)
+            if pendientes:
+                self._incorporar([ids[i] for i in pendientes], [hashes[i] for i in pendientes],
+                                 matriz[pendientes])
+            return matriz
+
+    def _incorporar(self, ids, hashes, vectores):
+        # Matriz guardada sin las filas anteriores de `ids`, seguida de sus
+        # vectores nuevos (self.matriz no se modifica: la usan motores publicados)
+        nuevos = set(ids)
+        previas = [(id_, h, fila) for id_, (h, fila) in self.filas.items() if id_ not in nuevos]
+        ids = [id_ for id_, _, _ in previas] + ids
+        hashes = [h for _, h, _ in previas] + hashes
+        matriz = vectores
+        if previas:
+            matriz = np.vstack((self.matriz[[fila for _, _, fila in previas]], vectores))
+        matriz.setflags(write=False)
+        self.matriz = matriz
+        self.filas = {id_: (h, fila) for fila, (id_, h) in enumerate(zip(ids, hashes))}
+        self._guardar(ids, hashes, matriz)
+
+    def estadisticas(self):
+        return {
+            "recursos": len(self.filas),
+            "codificados": self.codificados,
+            "modelo": self.nombre_modelo
+        }
@@ -0,0 +1,661 @@
+#------------------------------------------------------
+#----Persistencia del indice vectorial (FAISS)---------
+#------------------------------------------------------
+# El artefacto se guarda en una carpeta con tres archivos:
+#   embeddings.npy --matriz float32 normalizada (una fila por documento)
+#   indice.faiss   --indice FAISS construido sobre esa matriz
+#   meta.json      --modelo, configuracion del indice y hash de cada linea
+# Los workers lo abren con memory-map al arrancar y, al reconstruir,
+# solo se vuelven a codificar las lineas cuyo hash cambio. Si solo cambia
+# el tipo de indice, se reconstruye a partir de la matriz sin re-codificar.
+#
+# Los documentos agregados por la API no reescriben el artefacto: su vector
+# se agrega al final de agregados.jsonl (y su linea al de documentos.txt).
+# Al arrancar se abre el artefacto y los agregados se cargan del registro;
+# una construccion completa (compactacion) los incorpora y borra el registro.
+#
+# Durante la construccion la matriz se escribe por bloques en
+# embeddings.parcial.npy (memory-map) y progreso.json registra los bloques
+# terminados: la memoria usada no depende del tamaño del corpus y una
+# construccion interrumpida continua desde el ultimo bloque.
+#
+# Tipos de indice (BCP_INDICE_TIPO):
+#   flat     --busqueda exacta (IndexFlatIP), por defecto
+#   ivf-flat --IVF con vectores completos, se ajusta con nprobe
+#   ivf-pq   --IVF con product quantization (menos memoria), con nprobe
+#   hnsw     --grafo HNSW, se ajusta con efSearch
+#   sq-fp16  --vectores en float16 (IndexScalarQuantizer, la mitad de memoria)
+#   sq-int8  --cuantizacion escalar a 8 bits (un cuarto de la memoria)
+#   binario  --un bit por dimension (signo) con distancia de Hamming (1/32)
+# Con BCP_RERANK=r > 1 se buscan k*r candidatos en el indice y se reordenan
+# con la similitud exacta float32 de embeddings.npy (leida del memory-map).
+
+import base64
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Carpeta donde se guarda el indice (configurable por variable de entorno)
+RUTA_INDICE = os.environ.get("BCP_RUTA_INDICE", "data/indice")
+
+ARCHIVO_EMBEDDINGS = "embeddings.npy"
+ARCHIVO_INDICE = "indice.faiss"
+ARCHIVO_META = "meta.json"
+ARCHIVO_PARCIAL = "embeddings.parcial.npy"
+ARCHIVO_PROGRESO = "progreso.json"
+ARCHIVO_AGREGADOS = "agregados.jsonl"
+
+# Se guarda en meta.json para no abrir artefactos de un formato anterior
+FORMATO = 2
+
+TIPOS_INDICE = ("flat", "ivf-flat", "ivf-pq", "hnsw", "sq-fp16", "sq-int8", "binario")
+
+CUANTIZADORES = {
+    "sq-fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq-int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Parametros de busqueda por defecto (se pueden cambiar en cada peticion)
+NPROBE = int(os.environ.get("BCP_NPROBE", "16"))
+EF_SEARCH = int(os.environ.get("BCP_EF_SEARCH", "64"))
+RERANK = int(os.environ.get("BCP_RERANK", "0"))
+
+# Maximo de vectores usados para entrenar IVF / PQ
+MUESTRA_ENTRENAMIENTO = int(os.environ.get("BCP_MUESTRA_ENTRENAMIENTO", "50000"))
+
+# Documentos por bloque al codificar y al agregar al indice
+TAMANO_BLOQUE = int(os.environ.get("BCP_TAMANO_BLOQUE", "4096"))
+
+
+def hash_documento(texto):
+    # Hash de contenido de una linea del corpus
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def id_documento(hash_texto):
+    # Id estable del documento derivado de su hash (52 bits: cabe en un int64
+    # y se representa sin perdida como numero en JSON/JavaScript)
+    return int(hash_texto[:13], 16)
+
+
+def normalizar(matriz):
+    # Normaliza las filas en el mismo arreglo (sin crear otra copia)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    matriz /= normas
+    return matriz
+
+
+def leer_meta(ruta=RUTA_INDICE):
+    try:
+        with open(os.path.join(ruta, ARCHIVO_META), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def es_archivo_binario(archivo):
+    # FAISS serializa los indices binarios con un fourcc que empieza con "IB"
+    with open(archivo, "rb") as f:
+        return f.read(2) == b"IB"
+
+
+def leer_indice_faiss(archivo, mmap=True):
+    # Intentar abrir el indice con memory-map; si la version de FAISS
+    # no lo soporta para este tipo de indice, se lee en memoria.
+    # IO_FLAG_MMAP_IFC deja los codigos de los indices flat (vectores de
+    # flat y HNSW, codigos de SQ y binario) en el archivo mapeado, en paginas
+    # compartidas entre procesos; con IO_FLAG_MMAP solo, FAISS los copia a
+    # la memoria privada de cada proceso
+    leer = faiss.read_index_binary if es_archivo_binario(archivo) else faiss.read_index
+    if not mmap:
+        return leer(archivo)
+    try:
+        return leer(archivo, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    except (RuntimeError, AttributeError):
+        return leer(archivo)
+
+
+class _VistaIndice:
+    # Expone un bloque de memoria del indice como arreglo numpy y mantiene
+    # vivo el indice mientras exista el arreglo
+    def __init__(self, index, vista):
+        self.index = index
+        self.__array_interface__ = vista.__array_interface__
+
+
+def matriz_del_indice(index):
+    """
+    Vectores float32 que guarda el propio indice (flat o HNSW flat), como
+    arreglo de solo lectura sin copiarlos, en el orden en que se agregaron
+    (el de las filas de embeddings.npy). None si el indice guarda codigos
+    comprimidos (SQ, PQ, binario): la matriz exacta es embeddings.npy.
+    """
+    base = indice_base(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base = faiss.downcast_index(base.storage)
+    if not isinstance(base, faiss.IndexFlat):
+        return None
+    if base.ntotal == 0:
+        return np.empty((0, base.d), dtype="float32")
+    vista = faiss.rev_swig_ptr(base.get_xb(), base.ntotal * base.d).reshape(base.ntotal, base.d)
+    matriz = np.asarray(_VistaIndice(index, vista))
+    matriz.setflags(write=False)
+    return matriz
+
+
+def cargar_indice(ruta=RUTA_INDICE, mmap_indice=True):
+    # Abre el artefacto ya construido, mapeado en memoria (compartido entre
+    # procesos por el page cache del sistema operativo). Con flat o HNSW la
+    # matriz exacta es la del indice: embeddings.npy no se abre y los
+    # vectores no quedan dos veces en memoria
+    index = leer_indice_faiss(os.path.join(ruta, ARCHIVO_INDICE), mmap_indice)
+    embeddings = matriz_del_indice(index)
+    if embeddings is None:
+        embeddings = np.load(os.path.join(ruta, ARCHIVO_EMBEDDINGS), mmap_mode="r")
+    return embeddings, index
+
+
+def es_binario(index):
+    return isinstance(index, faiss.IndexBinary)
+
+
+def vectores_para(index, vectores):
+    # Los indices binarios reciben el signo de cada dimension empaquetado en bits
+    if es_binario(index):
+        return np.packbits(np.asarray(vectores) > 0, axis=1)
+    return np.ascontiguousarray(vectores, dtype="float32")
+
+
+def clonar_indice(index):
+    # Copia modificable: se serializa porque faiss.clone_index no admite
+    # IndexBinaryIDMap y, con el indice abierto con memory-map, su copia
+    # seguiria apuntando al archivo (agregar o eliminar en ella falla)
+    if es_binario(index):
+        return faiss.deserialize_index_binary(faiss.serialize_index_binary(index))
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+def buscar_indice(index, vectores, k, params=None):
+    # Devuelve (similitudes, ids) como index.search; en los indices binarios
+    # la distancia de Hamming h se lleva a la escala del coseno: 1 - 2h/d
+    x = vectores_para(index, vectores)
+    if params is None:
+        distancias, ids = index.search(x, k)
+    else:
+        distancias, ids = index.search(x, k, params=params)
+    if es_binario(index):
+        return 1.0 - 2.0 * distancias.astype("float32") / index.d, ids
+    return distancias, ids
+
+
+def buscar_rango(index, vectores, umbral, k, params=None):
+    """
+    Como buscar_indice, pero solo con los vecinos de similitud >= umbral
+    (range_search de FAISS): las k mejores de cada consulta, rellenando
+    con id -1 como index.search cuando hay menos de k sobre el umbral.
+    """
+    x = vectores_para(index, vectores)
+    if es_binario(index):
+        # 1 - 2h/d >= umbral  <=>  h <= (1 - umbral) * d / 2 (FAISS toma h < radio)
+        radio = int(np.floor((1.0 - umbral) * index.d / 2.0)) + 1
+    else:
+        # FAISS devuelve similitud > radio; se incluye el umbral mismo
+        radio = float(np.nextafter(np.float32(umbral), np.float32(-np.inf)))
+    if params is None:
+        limites, distancias, ids = index.range_search(x, radio)
+    else:
+        limites, distancias, ids = index.range_search(x, radio, params=params)
+    if es_binario(index):
+        distancias = 1.0 - 2.0 * distancias.astype("float32") / index.d
+
+    similitudes = np.full((len(x), k), -np.inf, dtype="float32")
+    resultado = np.full((len(x), k), -1, dtype="int64")
+    for i in range(len(x)):
+        sims, encontrados = distancias[limites[i]:limites[i + 1]], ids[limites[i]:limites[i + 1]]
+        if len(sims) > k:
+            mejores = np.argpartition(-sims, k - 1)[:k]
+            sims, encontrados = sims[mejores], encontrados[mejores]
+        orden = np.argsort(-sims, kind="stable")
+        similitudes[i, :len(orden)] = sims[orden]
+        resultado[i, :len(orden)] = encontrados[orden]
+    return similitudes, resultado
+
+
+def reordenar_exacto(vector, filas, matriz, k):
+    # Similitud exacta float32 de las filas candidatas de `matriz` (en orden
+    # de fila, para leer el memory-map secuencialmente); las k mejores
+    filas = np.sort(filas)
+    similitudes = np.asarray(matriz[filas], dtype="float32") @ vector
+    mejores = np.argsort(-similitudes, kind="stable")[:k]
+    return filas[mejores], similitudes[mejores]
+
+
+@contextmanager
+def bloqueo_indice(ruta=RUTA_INDICE):
+    # Bloqueo entre procesos sobre la carpeta del indice: si varios workers
+    # arrancan a la vez, uno construye el artefacto y los demas lo abren
+    os.makedirs(ruta, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(ruta, ".lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def guardar_indice(embeddings, index, meta, ruta=RUTA_INDICE):
+    os.makedirs(ruta, exist_ok=True)
+    archivo_meta = os.path.join(ruta, ARCHIVO_META)
+    # Se borra primero meta.json: si el proceso se corta a mitad de la
+    # escritura, el siguiente arranque hara una reconstruccion completa
+    if os.path.exists(archivo_meta):
+        os.remove(archivo_meta)
+
+    archivo_embeddings = os.path.join(ruta, ARCHIVO_EMBEDDINGS)
+    archivo_parcial = os.path.join(ruta, ARCHIVO_PARCIAL)
+    if es_parcial(embeddings, archivo_parcial):
+        # La matriz ya esta en disco (construccion por bloques): solo se renombra
+        embeddings.flush()
+        os.replace(archivo_parcial, archivo_embeddings)
+    else:
+        with open(archivo_embeddings + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(embeddings, dtype="float32"))
+        os.replace(archivo_embeddings + ".tmp", archivo_embeddings)
+
+    archivo_indice = os.path.join(ruta, ARCHIVO_INDICE)
+    if es_binario(index):
+        faiss.write_index_binary(index, archivo_indice + ".tmp")
+    else:
+        faiss.write_index(index, archivo_indice + ".tmp")
+    os.replace(archivo_indice + ".tmp", archivo_indice)
+
+    with open(archivo_meta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(archivo_meta + ".tmp", archivo_meta)
+
+    # La construccion termino: el progreso y los agregados ya no hacen falta.
+    # Las eliminaciones de documentos que siguen en el artefacto se conservan
+    # (documentos.txt mantiene su linea hasta que el almacen compacta)
+    eliminados = leer_eliminados(ruta) & set(meta["hashes"])
+    for archivo in (ARCHIVO_PROGRESO, ARCHIVO_AGREGADOS):
+        if os.path.exists(os.path.join(ruta, archivo)):
+            os.remove(os.path.join(ruta, archivo))
+    if eliminados:
+        registrar_eliminados(sorted(eliminados), ruta)
+
+
+def registrar_agregados(hashes, vectores, ruta=RUTA_INDICE):
+    # Una linea por documento al final de agregados.jsonl: hash del texto y
+    # vector float32 en base64
+    with open(os.path.join(ruta, ARCHIVO_AGREGADOS), "a", encoding="utf-8") as f:
+        for hash_texto, vector in zip(hashes, vectores):
+            datos = base64.b64encode(np.asarray(vector, dtype="float32").tobytes()).decode("ascii")
+            f.write(json.dumps({"hash": hash_texto, "vector": datos}) + "\n")
+
+
+def registrar_eliminados(hashes, ruta=RUTA_INDICE):
+    # En el mismo registro: una linea por documento eliminado (sin vector)
+    with open(os.path.join(ruta, ARCHIVO_AGREGADOS), "a", encoding="utf-8") as f:
+        for hash_texto in hashes:
+            f.write(json.dumps({"hash": hash_texto, "eliminado": True}) + "\n")
+
+
+def leer_eliminados(ruta=RUTA_INDICE):
+    # Hashes cuya ultima linea en el registro es una eliminacion (un
+    # documento eliminado y vuelto a agregar queda vigente)
+    eliminados = set()
+    try:
+        with open(os.path.join(ruta, ARCHIVO_AGREGADOS), "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                    hash_texto = registro["hash"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if registro.get("eliminado"):
+                    eliminados.add(hash_texto)
+                else:
+                    eliminados.discard(hash_texto)
+    except OSError:
+        pass
+    return eliminados
+
+
+def leer_agregados(dimension, ruta=RUTA_INDICE):
+    # hash -> vector de los documentos agregados desde la ultima construccion
+    # completa. Una linea incompleta (escritura cortada) se ignora: ese
+    # documento se vuelve a codificar en la siguiente construccion
+    agregados = {}
+    try:
+        with open(os.path.join(ruta, ARCHIVO_AGREGADOS), "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                    vector = np.frombuffer(base64.b64decode(registro["vector"]), dtype="float32")
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if len(vector) == dimension:
+                    agregados[registro["hash"]] = vector
+    except OSError:
+        pass
+    return agregados
+
+
+def es_parcial(embeddings, archivo_parcial):
+    return (isinstance(embeddings, np.memmap) and os.path.exists(archivo_parcial)
+            and os.path.samefile(embeddings.filename, archivo_parcial))
+
+
+def configuracion_indice(tipo=None):
+    # Configuracion del indice a partir de variables de entorno
+    tipo = (tipo or os.environ.get("BCP_INDICE_TIPO", "flat")).lower()
+    if tipo not in TIPOS_INDICE:
+        raise ValueError(f"Tipo de indice desconocido: {tipo} (opciones: {', '.join(TIPOS_INDICE)})")
+    config = {"tipo": tipo}
+    if tipo.startswith("ivf"):
+        config["nlist"] = int(os.environ.get("BCP_IVF_NLIST", "1024"))
+    if tipo == "ivf-pq":
+        config["pq_m"] = int(os.environ.get("BCP_PQ_M", "48"))
+        config["pq_nbits"] = int(os.environ.get("BCP_PQ_NBITS", "8"))
+    if tipo == "hnsw":
+        config["hnsw_m"] = int(os.environ.get("BCP_HNSW_M", "32"))
+        config["ef_construccion"] = int(os.environ.get("BCP_HNSW_EF_CONSTRUCCION", "200"))
+    return config
+
+
+def indice_base(index):
+    # El indice que esta debajo de IndexIDMap (si lo hay)
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def aplicar_parametros(index, nprobe=NPROBE, ef_search=EF_SEARCH):
+    base = indice_base(index)
+    if hasattr(base, "nprobe"):
+        base.nprobe = nprobe
+    if hasattr(base, "hnsw"):
+        base.hnsw.efSearch = ef_search
+
+
+def parametros_busqueda(index, nprobe=None, ef_search=None, selector=None):
+    # Parametros por peticion (no modifican el indice compartido). El
+    # selector restringe la busqueda a un subconjunto de ids
+    base = indice_base(index)
+    opciones = {"sel": selector} if selector is not None else {}
+    if hasattr(base, "nprobe") and (nprobe or selector is not None):
+        return faiss.SearchParametersIVF(nprobe=nprobe or base.nprobe, **opciones)
+    if hasattr(base, "hnsw") and (ef_search or selector is not None):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or base.hnsw.efSearch, **opciones)
+    if selector is not None:
+        return faiss.SearchParameters(**opciones)
+    return None
+
+
+def muestra_entrenamiento(embeddings, maximo=MUESTRA_ENTRENAMIENTO):
+    if len(embeddings) <= maximo:
+        return np.ascontiguousarray(embeddings, dtype="float32")
+    filas = np.sort(np.random.default_rng(0).choice(len(embeddings), maximo, replace=False))
+    return np.ascontiguousarray(embeddings[filas], dtype="float32")
+
+
+def crear_indice(config, embeddings, ids):
+    """
+    Crea el indice indicado por `config`, lo entrena con una muestra (IVF)
+    y agrega los vectores con sus ids. Devuelve (index, config_efectiva):
+    si el corpus es demasiado pequeño para entrenar, se usa flat.
+    """
+    n, dimension = embeddings.shape
+    tipo = config["tipo"]
+    if (tipo.startswith("ivf") or tipo == "sq-int8") and n == 0:
+        tipo = "flat"
+    if tipo == "binario" and dimension % 8:
+        print(f"Indice binario no aplicable (dimension {dimension}), se usa flat")
+        tipo = "flat"
+    if tipo == "ivf-pq" and (n < 2 ** config["pq_nbits"] or dimension % config["pq_m"]):
+        print(f"IVF-PQ no aplicable ({n} vectores, dimension {dimension}), se usa flat")
+        tipo = "flat"
+    efectiva = dict(config, tipo=tipo) if tipo == config["tipo"] else {"tipo": tipo}
+
+    if tipo == "flat":
+        #FAISS con Inner Product (FlatIP)  (similitud de Coseno), envuelto en
+        #IndexIDMap para poder agregar y eliminar documentos por id
+        index = faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
+    elif tipo == "hnsw":
+        base = faiss.IndexHNSWFlat(dimension, config["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = config["ef_construccion"]
+        index = faiss.IndexIDMap(base)
+    elif tipo in CUANTIZADORES:
+        # Cada dimension en float16 o en 8 bits (rango aprendido de la muestra)
+        base = faiss.IndexScalarQuantizer(dimension, CUANTIZADORES[tipo], faiss.METRIC_INNER_PRODUCT)
+        base.train(muestra_entrenamiento(embeddings))
+        index = faiss.IndexIDMap(base)
+    elif tipo == "binario":
+        index = faiss.IndexBinaryIDMap(faiss.IndexBinaryFlat(dimension))
+    else:
+        # IVF: cada celda necesita puntos para entrenar, no mas celdas que vectores
+        nlist = max(1, min(config["nlist"], n))
+        efectiva["nlist"] = nlist
+        cuantizador = faiss.IndexFlatIP(dimension)
+        if tipo == "ivf-flat":
+            index = faiss.IndexIVFFlat(cuantizador, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(cuantizador, dimension, nlist, config["pq_m"],
+                                     config["pq_nbits"], faiss.METRIC_INNER_PRODUCT)
+        index.train(muestra_entrenamiento(embeddings))
+
+    # Se agrega por bloques: con la matriz en memory-map no se copia entera
+    for inicio in range(0, n, TAMANO_BLOQUE):
+        bloque = vectores_para(index, embeddings[inicio:inicio + TAMANO_BLOQUE])
+        index.add_with_ids(bloque, ids[inicio:inicio + TAMANO_BLOQUE])
+    aplicar_parametros(index)
+    return index, efectiva
+
+
+def admite_mmap(config):
+    # Las listas IVF abiertas con mmap son de solo lectura y FAISS no las
+    # puede clonar, lo que impediria la ingesta en caliente
+    return not config["tipo"].startswith("ivf")
+
+
+def crear_meta(nombre_modelo, dimension, config, textos, codificador="torch"):
+    # codificador: backend del modelo (torch, onnx u onnx-int8); los vectores
+    # de backends distintos no son identicos y no se mezclan en un artefacto
+    return {
+        "formato": FORMATO,
+        "modelo": nombre_modelo,
+        "codificador": codificador,
+        "dimension": dimension,
+        "indice": config,
+        "hashes": [hash_documento(t) for t in textos]
+    }
+
+
+def construir_indice(documentos, modelo, nombre_modelo, config=None, ruta=RUTA_INDICE,
+                     tamano_bloque=TAMANO_BLOQUE, al_avanzar=None, compactar=False, codificador="torch"):
+    """
+    Devuelve (embeddings, index) para los documentos dados (sin repetidos).
+    Si el artefacto en disco corresponde al mismo modelo (nombre y
+    backend `codificador`) y al mismo contenido, solo se abre con memory-map. Si no, se reutilizan las
+    filas cuyo hash sigue existiendo y se codifican las demas.
+    Si los documentos son los del artefacto seguidos de agregados del
+    registro, tambien se abre el artefacto tal cual: las filas devueltas
+    son solo las primeras len(embeddings) y el resto se lee con
+    leer_agregados. Con compactar=True los agregados se incorporan.
+    al_avanzar(hechos, total) se llama despues de cada bloque codificado.
+    """
+    with bloqueo_indice(ruta):
+        return _construir_indice(documentos, modelo, nombre_modelo, config, ruta, tamano_bloque, al_avanzar,
+                                 compactar, codificador)
+
+
+def _construir_indice(documentos, modelo, nombre_modelo, config, ruta, tamano_bloque, al_avanzar=None,
+                      compactar=False, codificador="torch"):
+    config = config or configuracion_indice()
+    hashes = [hash_documento(d) for d in documentos]
+    ids = np.array([id_documento(h) for h in hashes], dtype="int64")
+    meta = leer_meta(ruta)
+
+    # Los artefactos anteriores a "codificador" se construyeron con torch
+    mismo_modelo = (bool(meta) and meta.get("formato") == FORMATO and meta["modelo"] == nombre_modelo
+                    and meta.get("codificador", "torch") == codificador)
+    agregados = leer_agregados(meta["dimension"], ruta) if mismo_modelo else {}
+    en_artefacto = len(meta["hashes"]) if mismo_modelo else 0
+    con_agregados = (mismo_modelo and not compactar and meta["hashes"] == hashes[:en_artefacto]
+                     and all(h in agregados for h in hashes[en_artefacto:]))
+    if (mismo_modelo and meta["hashes"] == hashes or con_agregados) and meta["indice"] == config:
+        embeddings, index = cargar_indice(ruta, admite_mmap(config))
+        aplicar_parametros(index)
+        return embeddings, index
+    if mismo_modelo and meta["hashes"] == hashes:
+        # Mismo contenido, otro tipo de indice: no hace falta re-codificar
+        print(f"Reconstruyendo el indice como {config['tipo']}...")
+        embeddings = np.load(os.path.join(ruta, ARCHIVO_EMBEDDINGS), mmap_mode="r")
+    else:
+        embeddings = codificar_documentos(documentos, hashes, modelo, nombre_modelo,
+                                          meta if mismo_modelo else None, ruta, tamano_bloque, al_avanzar,
+                                          agregados, codificador)
+
+    index, _ = crear_indice(config, embeddings, ids)
+    guardar_indice(embeddings, index, crear_meta(nombre_modelo, embeddings.shape[1], config, documentos,
+                                                 codificador), ruta)
+    embeddings, index = cargar_indice(ruta, admite_mmap(config))
+    aplicar_parametros(index)
+    return embeddings, index
+
+
+def leer_progreso(ruta=RUTA_INDICE):
+    try:
+        with open(os.path.join(ruta, ARCHIVO_PROGRESO), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def guardar_progreso(progreso, ruta=RUTA_INDICE):
+    archivo = os.path.join(ruta, ARCHIVO_PROGRESO)
+    with open(archivo + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(progreso, f)
+    os.replace(archivo + ".tmp", archivo)
+
+
+class Avance:
+    # Reporta cada cierto tiempo cuantos documentos se codificaron y cuanto falta
+    def __init__(self, total, hechos=0, intervalo=5.0, al_avanzar=None):
+        self.total = total
+        self.al_avanzar = al_avanzar
+        self.hechos = hechos
+        self.inicio_hechos = hechos
+        self.intervalo = intervalo
+        self.inicio = time.monotonic()
+        self.ultimo = self.inicio
+
+    def sumar(self, cantidad):
+        self.hechos += cantidad
+        if self.al_avanzar is not None:
+            self.al_avanzar(self.hechos, self.total)
+        ahora = time.monotonic()
+        if ahora - self.ultimo < self.intervalo and self.hechos < self.total:
+            return
+        self.ultimo = ahora
+        velocidad = (self.hechos - self.inicio_hechos) / max(ahora - self.inicio, 1e-9)
+        restante = (self.total - self.hechos) / velocidad if velocidad > 0 else 0
+        print(f"Codificados {self.hechos} de {self.total} ({100.0 * self.hechos / max(self.total, 1):.1f}%), "
+              f"{velocidad:.0f} docs/s, faltan ~{restante / 60:.1f} min")
+
+
+def codificar_documentos(documentos, hashes, modelo, nombre_modelo, meta, ruta=RUTA_INDICE,
+                         tamano_bloque=TAMANO_BLOQUE, al_avanzar=None, agregados=None, codificador="torch"):
+    """
+    Matriz de embeddings escrita por bloques en embeddings.parcial.npy
+    (memory-map): se copian las filas del artefacto anterior cuyo hash no
+    cambio (o su vector de `agregados`, hash -> vector del registro) y las
+    demas se codifican de a `tamano_bloque`, normalizando en
+    el mismo arreglo. Despues de cada bloque se guarda progreso.json; si la
+    construccion se corta, la siguiente continua desde ese bloque.
+    """
+    dimension = modelo.get_sentence_embedding_dimension()
+    n = len(documentos)
+    archivo_parcial = os.path.join(ruta, ARCHIVO_PARCIAL)
+    # Identifica la construccion: mismo modelo (y backend), bloques y contenido
+    huella = hashlib.sha256("\n".join([nombre_modelo, codificador, str(tamano_bloque)] + hashes)
+                            .encode("utf-8")).hexdigest()
+
+    # Filas que se pueden copiar del artefacto anterior (mismo modelo)
+    previas = {}
+    anteriores = None
+    if meta and meta["dimension"] == dimension:
+        try:
+            anteriores = np.load(os.path.join(ruta, ARCHIVO_EMBEDDINGS), mmap_mode="r")
+            previas = {h: i for i, h in enumerate(meta["hashes"])}
+        except (OSError, ValueError):
+            previas = {}
+    agregados = agregados or {}
+    pendientes = [i for i, h in enumerate(hashes) if h not in previas and h not in agregados]
+
+    embeddings = None
+    bloques_listos = 0
+    progreso = leer_progreso(ruta)
+    if progreso and progreso.get("huella") == huella:
+        try:
+            embeddings = np.load(archivo_parcial, mmap_mode="r+")
+            bloques_listos = progreso["bloques"]
+        except (OSError, ValueError):
+            embeddings = None
+        if embeddings is not None and embeddings.shape != (n, dimension):
+            embeddings, bloques_listos = None, 0
+        if bloques_listos:
+            print(f"Retomando la construccion: {bloques_listos} bloques ya codificados")
+
+    if embeddings is None:
+        embeddings = np.lib.format.open_memmap(archivo_parcial, mode="w+", dtype="float32",
+                                               shape=(n, dimension))
+        if len(pendientes) < n:
+            _copiar_filas_previas(embeddings, anteriores, hashes, previas, tamano_bloque, agregados)
+        embeddings.flush()
+        guardar_progreso({"huella": huella, "bloques": 0}, ruta)
+    # Liberar el mapeo anterior antes de sobrescribir los archivos
+    anteriores = None
+
+    if pendientes:
+        print(f"Codificando {len(pendientes)} de {n} documentos...")
+        avance = Avance(len(pendientes), min(len(pendientes), bloques_listos * tamano_bloque),
+                        al_avanzar=al_avanzar)
+        for b, inicio in enumerate(range(0, len(pendientes), tamano_bloque)):
+            if b < bloques_listos:
+                continue
+            filas = pendientes[inicio:inicio + tamano_bloque]
+            vecs = modelo.encode([documentos[i] for i in filas], convert_to_numpy=True)
+            embeddings[filas] = normalizar(vecs.astype("float32", copy=False))
+            embeddings.flush()
+            guardar_progreso({"huella": huella, "bloques": b + 1}, ruta)
+            avance.sumar(len(filas))
+    return embeddings
+
+
+def _copiar_filas_previas(embeddings, anteriores, hashes, previas, tamano_bloque, agregados):
+    # Copia por bloques las filas ya codificadas del artefacto anterior y
+    # del registro de agregados
+    for inicio in range(0, len(hashes), tamano_bloque):
+        bloque = range(inicio, min(inicio + tamano_bloque, len(hashes)))
+        destino = [i for i in bloque if hashes[i] in previas]
+        if destino:
+            origen = [previas[hashes[i]] for i in destino]
+            embeddings[destino] = anteriores[origen]
+        destino = [i for i in bloque if hashes[i] not in previas and hashes[i] in agregados]
+        if destino:
+            embeddings[destino] = np.vstack([agregados[hashes[i]] for i in destino])
@@ -0,0 +1,70 @@
+#------------------------------------------------------
+#----Lectura del corpus y construccion fuera de linea--
+#------------------------------------------------------
+# El corpus puede ser un archivo (data/documentos.txt) o una carpeta con
+# varios exportes .txt/.tsv; se lee linea por linea, sin cargar los
+# archivos completos. La construccion del indice codifica por bloques y
+# guarda su avance (ver indice_vectorial), asi que un corpus grande se
+# puede preparar antes de levantar la API, y si se interrumpe continua
+# desde el ultimo bloque. Tambien incorpora al artefacto los documentos
+# agregados por la API que todavia estan en el registro de agregados:
+#
+#   python ingesta.py --origen data/exportes --tamano-bloque 4096
+
+import argparse
+import os
+
+from indice_vectorial import TAMANO_BLOQUE, configuracion_indice, construir_indice
+
+# Archivo o carpeta con los documentos (una linea por documento)
+RUTA_DOCUMENTOS = os.environ.get("BCP_RUTA_DOCUMENTOS", "data/documentos.txt")
+
+EXTENSIONES = (".txt", ".tsv")
+
+
+def archivos_de(origen):
+    if os.path.isfile(origen):
+        return [origen]
+    archivos = []
+    for carpeta, _, nombres in os.walk(origen):
+        archivos.extend(os.path.join(carpeta, n) for n in nombres if n.lower().endswith(EXTENSIONES))
+    return sorted(archivos)
+
+
+def leer_documentos(origen=RUTA_DOCUMENTOS):
+    # Lineas no vacias, una a la vez, de todos los archivos del origen
+    for archivo in archivos_de(origen):
+        with open(archivo, "r", encoding="utf-8") as f:
+            for linea in f:
+                linea = linea.strip()
+                if linea:
+                    yield linea
+
+
+def documentos_unicos(origen=RUTA_DOCUMENTOS):
+    # Sin lineas repetidas (cada documento tiene un id unico)
+    return list(dict.fromkeys(leer_documentos(origen)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye (o retoma) el indice del corpus")
+    parser.add_argument("--origen", default=RUTA_DOCUMENTOS, help="archivo o carpeta de documentos")
+    parser.add_argument("--tamano-bloque", type=int, default=TAMANO_BLOQUE)
+    parser.add_argument("--tipo", help="tipo de indice (por defecto BCP_INDICE_TIPO)")
+    args = parser.parse_args()
+
+    from codificadores import crear_codificador
+
+    # El mismo modelo y backend (BCP_CODIFICADOR) que usara la API
+    nombre_modelo = os.environ.get("BCP_MODELO", "all-MiniLM-L6-v2")
+    codificador = os.environ.get("BCP_CODIFICADOR", "torch").lower()
+    documentos = documentos_unicos(args.origen)
+    print(f"{len(documentos)} documentos en {args.origen}")
+    embeddings, _ = construir_indice(documentos, crear_codificador(nombre_modelo, codificador), nombre_modelo,
+                                     configuracion_indice(args.tipo), tamano_bloque=args.tamano_bloque,
+                                     compactar=True, codificador=codificador)
+    print(f"Indice listo: {embeddings.shape[0]} documentos")
+
+
+if __name__ == "__main__":
+    main()
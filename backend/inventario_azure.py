@@ -0,0 +1,427 @@
+#------------------------------------------------------
+#----Inventario de recursos de Azure en memoria--------
+#------------------------------------------------------
+# Los recursos se consultan con el SDK de Azure (ResourceManagementClient,
+# igual que en azure_test.py) y se guardan en memoria. Un hilo en segundo
+# plano refresca la lista cada cierto tiempo, asi /azure-resources/ responde
+# sin lanzar procesos ni autenticarse.
+#
+# Suscripciones y grupos (separados por comas):
+#   AZURE_SUBSCRIPTION_IDS=sub-1,sub-2  (por defecto AZURE_SUBSCRIPTION_ID)
+#   AZURE_RESOURCE_GROUPS=RSGYAPE001,sub-2/RSGMBK002,sub-1/*
+#     "grupo" se busca en todas las suscripciones, "suscripcion/grupo" solo
+#     en esa y "*" lista todos los grupos de la suscripcion
+#     (por defecto AZURE_RESOURCE_GROUP o RSGYAPE001)
+# Cada (suscripcion, grupo) se lista en paralelo (BCP_AZURE_PARALELO hilos)
+# con una sola credencial compartida (cachea el token) y un cliente por
+# suscripcion; las paginas del SDK se recorren a medida que se consumen.
+# Si un grupo falla se conservan sus recursos del refresco anterior y el
+# error queda en `errores` (solo falla el refresco si fallan todos).
+#
+# Sincronizacion por diferencias: la foto del inventario se guarda en SQLite
+# (registro_inventario.py) y cada refresco solo escribe altas, modificaciones
+# y bajas. Despues del primer listado completo de un grupo, los refrescos
+# piden solo lo modificado (filtro changedTime, con BCP_AZURE_DELTA_MARGEN
+# segundos de margen); como asi no se ven las bajas, cada
+# BCP_AZURE_COMPLETO_CADA segundos el grupo se vuelve a listar completo.
+# Los suscriptores (ranking, indice semantico) reciben solo los cambios.
+#
+# Para trabajar sin conexion: BCP_AZURE_FAKE=data/recursos_azure_ejemplo.json
+# (ver ClienteAzureFalso para simular latencia, paginas y fallas)
+
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from metricas import Contador, Histograma, tramo
+from registro_inventario import HistorialIncompleto, RegistroInventario
+
+INTERVALO_REFRESCO = float(os.environ.get("BCP_INVENTARIO_INTERVALO", "300"))
+PARALELO = int(os.environ.get("BCP_AZURE_PARALELO", "8"))
+DELTA = os.environ.get("BCP_AZURE_DELTA", "1") == "1"
+COMPLETO_CADA = float(os.environ.get("BCP_AZURE_COMPLETO_CADA", "3600"))
+MARGEN_DELTA = float(os.environ.get("BCP_AZURE_DELTA_MARGEN", "300"))
+
+# Cada refresco cuenta, sea de una peticion (refresh=true) o del hilo de fondo
+LLAMADAS_SDK = Histograma("bcp_azure_sdk_segundos", "Duracion de cada listado de recursos con el SDK de Azure")
+ERRORES_SDK = Contador("bcp_azure_errores_total", "Refrescos del inventario de Azure que fallaron")
+ERRORES_GRUPO = Contador("bcp_azure_errores_grupo_total", "Grupos de recursos que fallaron al listarse",
+                         ("destino",))
+
+
+def _lista(valor):
+    return [v.strip() for v in (valor or "").split(",") if v.strip()]
+
+
+def destinos_configurados():
+    # Pares (suscripcion, grupo); la suscripcion es None si no hay ninguna
+    # configurada (cliente falso) y el grupo "*" significa todos
+    suscripciones = _lista(os.environ.get("AZURE_SUBSCRIPTION_IDS") or os.environ.get("AZURE_SUBSCRIPTION_ID"))
+    grupos = _lista(os.environ.get("AZURE_RESOURCE_GROUPS") or os.environ.get("AZURE_RESOURCE_GROUP", "RSGYAPE001"))
+    destinos = []
+    for entrada in grupos:
+        suscripcion, _, grupo = entrada.rpartition("/")
+        for s in ([suscripcion] if suscripcion else suscripciones or [None]):
+            if (s, grupo) not in destinos:
+                destinos.append((s, grupo))
+    return destinos
+
+
+def nombre_destino(suscripcion, grupo):
+    return f"{suscripcion}/{grupo}" if suscripcion else grupo
+
+
+def _partes_id(id_recurso):
+    # "/subscriptions/<s>/resourceGroups/<g>/providers/..." -> (s, g)
+    partes = id_recurso.split("/")
+    minusculas = [p.lower() for p in partes]
+    valor = lambda clave: partes[minusculas.index(clave) + 1] if clave in minusculas[:-1] else None
+    return valor("subscriptions"), valor("resourcegroups")
+
+
+def _fecha(texto):
+    return datetime.fromisoformat(texto.replace("Z", "+00:00"))
+
+
+def _grupo_falso(recurso):
+    return recurso.get("resourceGroup") or _partes_id(recurso["id"])[1]
+
+
+class _RecursosFalsos:
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def list_by_resource_group(self, grupo, filter=None, expand=None):
+        # Generador: como el ItemPaged del SDK, cada pagina se pide al avanzar.
+        # filter solo admite "changedTime ge '<fecha>'"; un recurso sin
+        # changedTime toma la fecha de modificacion del JSON
+        if grupo.lower() in self.cliente.fallas:
+            raise RuntimeError(f"Falla simulada en el grupo {grupo}")
+        desde = None
+        if filter:
+            coincidencia = re.fullmatch(r"changedTime ge '([^']+)'", filter.strip())
+            if coincidencia is None:
+                raise ValueError(f"Filtro no soportado: {filter}")
+            desde = _fecha(coincidencia.group(1))
+        i = 0
+        for r in self.cliente.de_la_suscripcion():
+            if (_grupo_falso(r) or grupo).lower() != grupo.lower():
+                continue
+            if desde is not None and (_fecha(r["changedTime"]) if r.get("changedTime")
+                                      else self.cliente.modificado) < desde:
+                continue
+            if i % self.cliente.pagina == 0 and self.cliente.latencia:
+                time.sleep(self.cliente.latencia)
+            i += 1
+            yield SimpleNamespace(
+                id=r["id"], name=r["name"], type=r["type"],
+                location=r.get("location"), tags=r.get("tags"),
+                changed_time=_fecha(r["changedTime"]) if expand and r.get("changedTime") else None
+            )
+
+
+class _GruposFalsos:
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def list(self):
+        vistos = {}
+        for r in self.cliente.de_la_suscripcion():
+            grupo = _grupo_falso(r)
+            if grupo and grupo.lower() not in vistos:
+                vistos[grupo.lower()] = SimpleNamespace(name=grupo, location=r.get("location"))
+        return iter(vistos.values())
+
+
+class ClienteAzureFalso:
+    # Imita ResourceManagementClient leyendo los recursos de un JSON (mismo
+    # formato que `az resource list`). Sin conexion se puede simular:
+    #   BCP_AZURE_FAKE_LATENCIA=0.2  segundos por pagina
+    #   BCP_AZURE_FAKE_PAGINA=100    recursos por pagina
+    #   BCP_AZURE_FAKE_FALLAS=RSG1   grupos que responden con error
+    def __init__(self, ruta, suscripcion=None):
+        self.ruta = ruta
+        self.modificado = None
+        self._todos = []
+        self.suscripcion = suscripcion
+        self.latencia = float(os.environ.get("BCP_AZURE_FAKE_LATENCIA", "0"))
+        self.pagina = max(1, int(os.environ.get("BCP_AZURE_FAKE_PAGINA", "100")))
+        self.fallas = {g.lower() for g in _lista(os.environ.get("BCP_AZURE_FAKE_FALLAS"))}
+        self.resources = _RecursosFalsos(self)
+        self.resource_groups = _GruposFalsos(self)
+
+    def de_la_suscripcion(self):
+        # El JSON se vuelve a leer si cambio (para probar la sincronizacion)
+        modificado = datetime.fromtimestamp(os.path.getmtime(self.ruta), timezone.utc)
+        if modificado != self.modificado:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                self._todos = json.load(f)
+            self.modificado = modificado
+        for r in self._todos:
+            suscripcion = _partes_id(r["id"])[0]
+            if self.suscripcion is None or suscripcion is None or suscripcion.lower() == self.suscripcion.lower():
+                yield r
+
+
+def crear_credencial():
+    if os.environ.get("BCP_AZURE_FAKE"):
+        return None
+
+    # El SDK solo se importa si se usa Azure de verdad
+    from azure.identity import ClientSecretCredential, DefaultAzureCredential
+
+    tenant_id = os.environ.get("AZURE_TENANT_ID")
+    client_id = os.environ.get("AZURE_CLIENT_ID")
+    client_secret = os.environ.get("AZURE_CLIENT_SECRET")
+    if all([tenant_id, client_id, client_secret]):
+        return ClientSecretCredential(
+            tenant_id=tenant_id,
+            client_id=client_id,
+            client_secret=client_secret
+        )
+    return DefaultAzureCredential()
+
+
+def crear_cliente(suscripcion, credencial):
+    ruta_fake = os.environ.get("BCP_AZURE_FAKE")
+    if ruta_fake:
+        return ClienteAzureFalso(ruta_fake, suscripcion)
+
+    from azure.mgmt.resource import ResourceManagementClient
+    return ResourceManagementClient(credencial, suscripcion)
+
+
+def formatear_recurso(resource, suscripcion=None, grupo=None):
+    suscripcion_id, grupo_id = _partes_id(resource.id)
+    cambio = getattr(resource, "changed_time", None)
+    return {
+        "id": resource.id,
+        "name": resource.name,
+        "type": resource.type,
+        "location": resource.location or "Global",
+        "tags": resource.tags or {},
+        "resourceGroup": grupo_id or grupo,
+        "subscriptionId": suscripcion_id or suscripcion,
+        "changedTime": cambio.isoformat() if cambio else None
+    }
+
+
+class InventarioAzure:
+    def __init__(self, crear_cliente=crear_cliente, destinos=None, intervalo=INTERVALO_REFRESCO,
+                 crear_credencial=crear_credencial, paralelo=PARALELO, registro=None):
+        self.crear_cliente = crear_cliente
+        self.crear_credencial = crear_credencial
+        self.destinos = destinos if destinos is not None else destinos_configurados()
+        self.intervalo = intervalo
+        self.paralelo = max(1, paralelo)
+        self.registro = registro if registro is not None else RegistroInventario()
+        self.credencial = None
+        self.clientes = {}         # suscripcion -> cliente (comparten la credencial)
+        self.lock = threading.Lock()
+        self.recursos = None       # ultima lista obtenida
+        self.por_id = {}           # id en minusculas -> recurso (mismo orden que recursos)
+        self.secuencia = 0         # ultimo cambio del registro aplicado en memoria
+        self.actualizado = None    # time.time() de esa lista
+        self.ultimo_error = None
+        self.errores = {}          # "suscripcion/grupo" -> error del ultimo refresco
+        self.grupos = {}           # "suscripcion/grupo" -> recursos y segundos del ultimo listado
+        self.marcas = {}           # (suscripcion, grupo) -> (changedTime del proximo delta, ultimo listado completo)
+        self.ultimo_delta = {"alta": 0, "modificacion": 0, "baja": 0}
+        # Funciones a llamar con la nueva lista en cada refresco que cambie
+        # algo: funcion(recursos, cambios), cambios=None si es una carga completa
+        self.suscriptores = []
+
+    def iniciar(self):
+        # Primera carga y refrescos periodicos en segundo plano
+        hilo = threading.Thread(target=self._bucle, name="inventario-azure", daemon=True)
+        hilo.start()
+
+    def _bucle(self):
+        # La foto guardada se sirve mientras se consulta a Azure
+        try:
+            self.cargar_guardado()
+        except Exception as e:
+            print(f"Error al leer el inventario guardado: {str(e)}")
+        while True:
+            try:
+                self.refrescar()
+            except Exception as e:
+                print(f"Error al refrescar el inventario de Azure: {str(e)}")
+            if self.intervalo <= 0:
+                return
+            time.sleep(self.intervalo)
+
+    def cargar_guardado(self):
+        with self.lock:
+            if self.recursos is None:
+                self._sincronizar()
+
+    def _cliente(self, suscripcion):
+        if self.credencial is None:
+            self.credencial = self.crear_credencial()
+        if suscripcion not in self.clientes:
+            self.clientes[suscripcion] = self.crear_cliente(suscripcion, self.credencial)
+        return self.clientes[suscripcion]
+
+    def _listar(self, suscripcion, grupo, cliente, marca):
+        # Con marca solo se piden los recursos modificados desde entonces; si
+        # el filtro no esta disponible se lista el grupo completo
+        inicio = time.time()
+        if marca is not None:
+            try:
+                recursos = [formatear_recurso(r, suscripcion, grupo) for r in cliente.resources.list_by_resource_group(
+                    grupo, filter=f"changedTime ge '{marca}'", expand="changedTime")]
+                return recursos, False, inicio
+            except Exception as e:
+                print(f"Listado delta no disponible en {nombre_destino(suscripcion, grupo)}: {str(e)}")
+        recursos = [formatear_recurso(r, suscripcion, grupo)
+                    for r in cliente.resources.list_by_resource_group(grupo, expand="changedTime")]
+        return recursos, True, inicio
+
+    def _marca(self, destino):
+        # Delta solo si este proceso ya hizo un listado completo reciente
+        marca = self.marcas.get(destino)
+        if not DELTA or marca is None or time.time() - marca[1] >= COMPLETO_CADA:
+            return None
+        return marca[0]
+
+    def _expandir(self, pool, clientes):
+        # Reemplaza "*" por los grupos de la suscripcion (una llamada por suscripcion)
+        destinos, errores = [], {}
+        comodines = {s: pool.submit(lambda c: [g.name for g in c.resource_groups.list()], clientes[s])
+                     for s, g in self.destinos if g == "*"}
+        for suscripcion, grupo in self.destinos:
+            if grupo != "*":
+                destinos.append((suscripcion, grupo))
+                continue
+            try:
+                destinos.extend((suscripcion, g) for g in comodines[suscripcion].result())
+            except Exception as e:
+                errores[nombre_destino(suscripcion, "*")] = str(e)
+        return list(dict.fromkeys(destinos)), errores
+
+    def _listar_todos(self):
+        # Devuelve (recursos por destino, destinos listados completos, destinos
+        # vigentes o None si no se pudieron expandir, errores y
+        # recursos/segundos de cada grupo listado)
+        clientes = {s: self._cliente(s) for s, _ in self.destinos}
+        with ThreadPoolExecutor(self.paralelo, thread_name_prefix="azure-grupo") as pool:
+            destinos, errores = self._expandir(pool, clientes)
+            # Si algun "*" fallo no se sabe que grupos siguen vigentes
+            vigentes = None if errores else destinos
+            futuros = [(d, pool.submit(self._listar, *d, clientes[d[0]], self._marca(d))) for d in destinos]
+            listados, completos, grupos = {}, set(), {}
+            for destino, futuro in futuros:
+                nombre = nombre_destino(*destino)
+                try:
+                    recursos, completo, inicio = futuro.result()
+                except Exception as e:
+                    # Los recursos guardados del grupo se mantienen
+                    errores[nombre] = str(e)
+                    ERRORES_GRUPO.incrementar(nombre)
+                    continue
+                listados[destino] = recursos
+                grupos[nombre] = {"recursos": len(recursos), "delta": not completo,
+                                  "segundos": round(time.time() - inicio, 3)}
+                # El proximo delta pide lo modificado desde un poco antes de este listado
+                marca = datetime.fromtimestamp(inicio - MARGEN_DELTA, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+                if completo:
+                    completos.add(destino)
+                    self.marcas[destino] = (marca, inicio)
+                elif destino in self.marcas:
+                    self.marcas[destino] = (marca, self.marcas[destino][1])
+        if errores and not grupos:
+            raise RuntimeError("; ".join(f"{d}: {e}" for d, e in errores.items()))
+        return listados, completos, vigentes, errores, grupos
+
+    def refrescar(self):
+        # Un solo refresco a la vez; si hay error se conserva la lista anterior
+        with self.lock:
+            try:
+                with tramo("azure_sdk", LLAMADAS_SDK):
+                    listados, completos, vigentes, errores, grupos = self._listar_todos()
+                with tramo("delta_inventario"):
+                    self.ultimo_delta = self.registro.aplicar(listados, completos, vigentes)
+            except Exception as e:
+                self.ultimo_error = str(e)
+                ERRORES_SDK.incrementar()
+                raise
+            self.errores = errores
+            self.grupos = grupos
+            self.ultimo_error = None
+            self._sincronizar()
+            self.actualizado = time.time()
+            print(f"Inventario de Azure actualizado: {len(self.recursos)} recursos en {len(grupos)} grupos"
+                  + (f" ({len(errores)} con error)" if errores else "")
+                  + ", cambios: " + ", ".join(f"{n} {op}" for op, n in self.ultimo_delta.items()))
+
+    def _sincronizar(self):
+        # Aplica en memoria los cambios del registro (de este proceso o de
+        # otro worker) y avisa a los suscriptores si hubo alguno
+        cambios = None
+        if self.recursos is not None:
+            try:
+                cambios, ultima = self.registro.cambios_desde(self.secuencia)
+            except HistorialIncompleto:
+                cambios = None
+        if cambios is None:
+            self.por_id, self.secuencia, actualizado = self.registro.cargar()
+            self.actualizado = self.actualizado or actualizado
+        else:
+            if not cambios:
+                return
+            for _, operacion, clave, recurso, _ in cambios:
+                if operacion == "baja":
+                    self.por_id.pop(clave, None)
+                else:
+                    self.por_id[clave] = recurso
+            self.secuencia = ultima
+        self.recursos = list(self.por_id.values())
+        self._notificar(cambios)
+
+    def _notificar(self, cambios):
+        for funcion in self.suscriptores:
+            try:
+                funcion(self.recursos, cambios)
+            except Exception as e:
+                print(f"Error al actualizar un indice del inventario: {str(e)}")
+
+    def renotificar(self):
+        # Vuelve a pasar la lista actual a los suscriptores (p. ej. cuando el
+        # modelo termina de cargar despues del primer refresco)
+        with self.lock:
+            if self.recursos is not None:
+                self._notificar(None)
+
+    def obtener(self, refrescar=False):
+        # Devuelve la lista en memoria (la carga si todavia no existe)
+        if refrescar or self.recursos is None:
+            self.refrescar()
+        return self.recursos
+
+    def cambios(self, desde=None, limite=1000, desde_momento=None):
+        # Cambios del registro para /azure-resources/changes
+        return self.registro.cambios_desde(desde, limite, desde_momento)
+
+    def edad_segundos(self):
+        if self.actualizado is None:
+            return None
+        return round(time.time() - self.actualizado, 1)
+
+    def estado(self):
+        return {
+            "destinos": [nombre_destino(s, g) for s, g in self.destinos],
+            "recursos": len(self.recursos) if self.recursos is not None else 0,
+            "actualizado": datetime.fromtimestamp(self.actualizado, timezone.utc).isoformat() if self.actualizado else None,
+            "edad_segundos": self.edad_segundos(),
+            "ultimo_error": self.ultimo_error,
+            "errores": self.errores,
+            "grupos": self.grupos,
+            "secuencia": self.secuencia,
+            "ultimo_delta": self.ultimo_delta
+        }
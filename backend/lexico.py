@@ -0,0 +1,219 @@
+#------------------------------------------------------
+#----Busqueda lexica (BM25) y fusion con la semantica--
+#------------------------------------------------------
+# Los embeddings de MiniLM distinguen mal codigos como FWL-YAP-002 o
+# SRV-MBK-003. Este indice invertido BM25 se construye sobre las mismas
+# lineas de documentos.txt, con un tokenizador que conserva los codigos con
+# guion (y tambien sus partes), y sus resultados se combinan con los de FAISS
+# por reciprocal-rank fusion (RRF) o por suma ponderada de puntajes.
+
+import re
+import unicodedata
+
+import numpy as np
+
+# Palabras con letras/digitos, unidas opcionalmente por guiones (FWL-YAP-002)
+PATRON_TOKEN = re.compile(r"[0-9a-z]+(?:-[0-9a-z]+)*")
+# Consulta que es solo un codigo de activo: si algun documento lo tiene se
+# responde sin el transformer
+PATRON_CODIGO = re.compile(r"^\s*[0-9a-z]+(?:-[0-9a-z]+)+\s*$")
+
+
+def sin_acentos(texto):
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    tokens = []
+    for token in PATRON_TOKEN.findall(sin_acentos(texto.lower())):
+        tokens.append(token)
+        if "-" in token:
+            tokens.extend(token.split("-"))
+    return tokens
+
+
+def codigo_de(consulta):
+    # El codigo completo (un solo token, como lo guarda tokenizar) si la
+    # consulta es solo un codigo de activo; si no, None
+    consulta = sin_acentos(consulta.lower()).strip()
+    return consulta if PATRON_CODIGO.match(consulta) else None
+
+
+# Tokens con filas en el delta (documentos agregados despues de construir)
+# antes de incorporarlos a los postings base
+MAX_TOKENS_DELTA = 4096
+
+
+def _frecuencias(filas, textos):
+    # token -> (filas, tf) y la cantidad de tokens de cada fila
+    por_token = {}
+    longitudes = []
+    for fila, texto in zip(filas, textos):
+        tokens = tokenizar(texto)
+        longitudes.append(len(tokens))
+        for token in tokens:
+            por_fila = por_token.setdefault(token, {})
+            por_fila[fila] = por_fila.get(fila, 0) + 1
+    postings = {
+        token: (np.fromiter(por_fila.keys(), dtype="int32", count=len(por_fila)),
+                np.fromiter(por_fila.values(), dtype="float32", count=len(por_fila)))
+        for token, por_fila in por_token.items()
+    }
+    return postings, longitudes
+
+
+def _unir(postings, nuevos):
+    # Copia de `postings` con las filas de `nuevos` al final de cada token
+    unidos = dict(postings)
+    for token, (filas, tf) in nuevos.items():
+        previas = unidos.get(token)
+        unidos[token] = (filas, tf) if previas is None else (np.concatenate([previas[0], filas]),
+                                                             np.concatenate([previas[1], tf]))
+    return unidos
+
+
+class IndiceBM25:
+    """
+    Postings (filas, tf) por token. El idf se calcula al buscar sobre las
+    filas vigentes y la normalizacion por longitud se recalcula con cada
+    cambio (una operacion vectorial), asi actualizado() solo tokeniza los
+    documentos nuevos y marca los eliminados, sin recorrer los textos.
+    """
+    def __init__(self, ids, textos, columnas=None, k1=1.5, b=0.75):
+        # ids: ids de documento (mismo orden que textos; texto None = fila eliminada)
+        # columnas: ColumnasDocumentos de esas mismas filas (para filtrar)
+        self.ids = np.asarray(ids, dtype="int64")
+        self.columnas = columnas
+        self.k1 = k1
+        self.b = b
+        self.sin_texto = np.array([t is None for t in textos], dtype=bool)
+        filas = np.flatnonzero(~self.sin_texto)
+        self.postings, longitudes = _frecuencias(filas.tolist(), [textos[f] for f in filas])
+        self.longitudes = np.zeros(len(textos), dtype="float32")
+        self.longitudes[filas] = longitudes
+        self.delta = {}  # postings de las filas agregadas despues (se consultan junto a los base)
+        self._marcar(self.sin_texto)
+
+    def _marcar(self, eliminadas):
+        self.eliminadas = eliminadas
+        self.vigentes = len(eliminadas) - int(np.count_nonzero(eliminadas))
+        suma = float(self.longitudes[~eliminadas].sum(dtype="float64"))
+        promedio = suma / self.vigentes if self.vigentes else 1.0
+        # Normalizacion por longitud de cada documento, con el promedio de los vigentes
+        self.norma = self.k1 * (1 - self.b + self.b * self.longitudes / max(promedio, 1e-9))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def actualizado(self, ids, documentos, columnas=None, eliminadas=()):
+        """
+        Copia para un almacen que solo agrego filas al final (`ids`: los de
+        este indice seguidos de los nuevos) y marco o desmarco eliminados
+        (`eliminadas`: todas las filas marcadas). Solo se tokenizan las
+        filas nuevas y las que vuelven sin haberse tokenizado; los postings
+        se comparten. None si las filas anteriores cambiaron (compactacion):
+        hay que reconstruir.
+        """
+        n = len(self.ids)
+        ids = np.asarray(ids, dtype="int64")
+        if len(ids) < n or not np.array_equal(ids[:n], self.ids):
+            return None
+        marcadas = np.zeros(len(ids), dtype=bool)
+        marcadas[np.asarray(list(eliminadas), dtype="int64")] = True
+        sin_texto = np.concatenate([self.sin_texto, np.ones(len(ids) - n, dtype=bool)])
+        filas = [f for f in np.flatnonzero(sin_texto & ~marcadas).tolist() if int(ids[f]) in documentos]
+
+        nuevo = object.__new__(IndiceBM25)
+        nuevo.__dict__.update(self.__dict__)
+        nuevo.ids = ids
+        nuevo.columnas = columnas
+        nuevo.longitudes = np.concatenate([self.longitudes, np.zeros(len(ids) - n, dtype="float32")])
+        if filas:
+            postings, longitudes = _frecuencias(filas, [documentos[int(ids[f])] for f in filas])
+            nuevo.longitudes[filas] = longitudes
+            sin_texto[filas] = False
+            nuevo.delta = _unir(self.delta, postings)
+            if len(nuevo.delta) > MAX_TOKENS_DELTA:
+                nuevo.postings, nuevo.delta = _unir(self.postings, nuevo.delta), {}
+        nuevo.sin_texto = sin_texto
+        nuevo._marcar(marcadas | sin_texto)
+        return nuevo
+
+    def _posting(self, token):
+        base, delta = self.postings.get(token), self.delta.get(token)
+        if base is None or delta is None:
+            return base or delta
+        return np.concatenate([base[0], delta[0]]), np.concatenate([base[1], delta[1]])
+
+    def buscar(self, consulta, k, filtros=None):
+        # Devuelve [(id, puntaje)] de mayor a menor (solo documentos con puntaje > 0)
+        return self._puntuar(dict.fromkeys(tokenizar(consulta)), k, filtros)
+
+    def buscar_codigo(self, codigo, k, filtros=None):
+        # Solo los documentos con el codigo completo (codigo_de), sin sus
+        # partes (srv, yap), que aparecen en casi todas las filas
+        return self._puntuar([codigo], k, filtros)
+
+    def _puntuar(self, terminos, k, filtros):
+        terminos = [t for t in terminos if t in self.postings or t in self.delta]
+        if not terminos or not self.vigentes:
+            return []
+        permitidas = None
+        if filtros and self.columnas is not None:
+            filas_filtro = self.columnas.filas_filtradas(filtros)
+            if filas_filtro is not None:
+                permitidas = np.zeros(len(self.ids), dtype=bool)
+                permitidas[filas_filtro] = True
+        hay_eliminadas = self.vigentes < len(self.ids)
+        aportes = []
+        for token in terminos:
+            filas, tf = self._posting(token)
+            if hay_eliminadas:
+                vigentes = ~self.eliminadas[filas]
+                filas, tf = filas[vigentes], tf[vigentes]
+                if not len(filas):
+                    continue
+            idf = np.float32(np.log(1 + (self.vigentes - len(filas) + 0.5) / (len(filas) + 0.5)))
+            aporte = idf * tf * (self.k1 + 1) / (tf + self.norma[filas])
+            if permitidas is not None:
+                # Solo las filas que cumplen los filtros entran al ranking
+                dentro = permitidas[filas]
+                filas, aporte = filas[dentro], aporte[dentro]
+            aportes.append((filas, aporte))
+
+        if sum(len(f) for f, _ in aportes) * 8 < len(self.ids):
+            # Pocos documentos tocados (p. ej. un codigo): acumular en un dict
+            puntajes = {}
+            for filas, aporte in aportes:
+                for fila, valor in zip(filas.tolist(), aporte.tolist()):
+                    puntajes[fila] = puntajes.get(fila, 0.0) + valor
+            mejores = sorted(puntajes.items(), key=lambda x: x[1], reverse=True)[:k]
+            return [(int(self.ids[fila]), puntaje) for fila, puntaje in mejores]
+
+        # Terminos frecuentes: acumular sobre todo el corpus con numpy
+        puntajes = np.zeros(len(self.ids), dtype="float32")
+        for filas, aporte in aportes:
+            puntajes[filas] += aporte
+        candidatos = np.flatnonzero(puntajes)
+        if len(candidatos) > k:
+            candidatos = candidatos[np.argpartition(-puntajes[candidatos], k - 1)[:k]]
+        candidatos = candidatos[np.argsort(-puntajes[candidatos], kind="stable")]
+        return [(int(self.ids[fila]), float(puntajes[fila])) for fila in candidatos]
+
+
+def fusion_rrf(listas, k, constante=60):
+    # Reciprocal-rank fusion: sum(1 / (constante + posicion)) por documento
+    puntajes = {}
+    for lista in listas:
+        for posicion, (idx, _) in enumerate(lista):
+            puntajes[idx] = puntajes.get(idx, 0.0) + 1.0 / (constante + posicion + 1)
+    return sorted(puntajes.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+def fusion_ponderada(semantica, lexica, k, alpha=0.5):
+    # alpha * similitud coseno + (1 - alpha) * BM25 normalizado al maximo
+    maximo = max((p for _, p in lexica), default=0.0) or 1.0
+    puntajes = {idx: alpha * sim for idx, sim in semantica}
+    for idx, puntaje in lexica:
+        puntajes[idx] = puntajes.get(idx, 0.0) + (1 - alpha) * puntaje / maximo
+    return sorted(puntajes.items(), key=lambda x: x[1], reverse=True)[:k]
@@ -0,0 +1,259 @@
+#------------------------------------------------------
+#----Metricas Prometheus y tiempos por etapa-----------
+#------------------------------------------------------
+# Histogramas y contadores en memoria, expuestos en /metrics con el formato
+# de texto de Prometheus (sin dependencias extra). Las etapas de cada
+# peticion (modelo, FAISS, BM25, serializacion, SDK de Azure...) se miden
+# con `tramo()`; el tiempo se suma al histograma bcp_etapa_segundos y a la
+# peticion en curso, que puede devolverlo en el encabezado Server-Timing:
+#
+#   curl -H "X-Server-Timing: 1" "localhost:8000/buscar/?query=firewall"
+#
+# Las metricas son por proceso: en modo prefork (servidor.py) o con
+# uvicorn --workers cada worker cuenta lo suyo y cada scrape de /metrics lo
+# responde uno de ellos. Por eso todas las series llevan la etiqueta `pid`:
+# las de workers distintos no se mezclan en una serie (lo que Prometheus
+# tomaria como reinicios del contador). El total del servicio se obtiene
+# sumando sin pid, con una ventana de varios intervalos de scrape para que
+# cada worker tenga al menos dos muestras:
+#
+#   sum without (pid) (rate(bcp_http_segundos_count[5m]))
+#   histogram_quantile(0.99, sum without (pid) (rate(bcp_http_segundos_bucket[5m])))
+#
+# Los gauges (documentos, tamano de las caches...) son los del worker que
+# respondio; se agregan con max/avg without (pid) segun el caso.
+
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+CUBETAS_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CUBETAS_TAMANO = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+# Server-Timing en todas las respuestas (si no, solo cuando se pide con X-Server-Timing: 1)
+SERVER_TIMING = os.environ.get("BCP_SERVER_TIMING", "0") == "1"
+
+REGISTRO = []
+
+INFINITO = 'le="+Inf"'
+
+
+def _etiquetas(nombres, valores, extra=""):
+    # Toda serie lleva el pid del proceso (se lee al exponer: despues del fork)
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    pares.append(f'pid="{os.getpid()}"')
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _numero(valor):
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(float(valor))
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, etiquetas=(), cubetas=CUBETAS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.cubetas = tuple(cubetas)
+        self.series = {}  # valores de etiquetas -> [conteo por cubeta, suma, total]
+        self.lock = threading.Lock()
+        REGISTRO.append(self)
+
+    def observar(self, valor, *etiquetas):
+        posicion = bisect_left(self.cubetas, valor)
+        with self.lock:
+            serie = self.series.get(etiquetas)
+            if serie is None:
+                serie = self.series[etiquetas] = [[0] * len(self.cubetas), 0.0, 0]
+            if posicion < len(self.cubetas):
+                serie[0][posicion] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def lineas(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} histogram"
+        with self.lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in self.series.items()]
+        for valores, conteos, suma, total in series:
+            acumulado = 0
+            for limite, conteo in zip(self.cubetas, conteos):
+                acumulado += conteo
+                le = _etiquetas(self.etiquetas, valores, f'le="{_numero(limite)}"')
+                yield f"{self.nombre}_bucket{le} {acumulado}"
+            yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, valores, INFINITO)} {total}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(suma)}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {total}"
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.series = {}
+        self.lock = threading.Lock()
+        REGISTRO.append(self)
+
+    def incrementar(self, *etiquetas, cantidad=1):
+        with self.lock:
+            self.series[etiquetas] = self.series.get(etiquetas, 0) + cantidad
+
+    def lineas(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} counter"
+        with self.lock:
+            series = list(self.series.items())
+        for valores, valor in series:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(valor)}"
+
+
+class Calculada:
+    # Valor leido al exponer: funcion() devuelve un numero, o una lista de
+    # (valores de etiquetas, numero); None = sin datos todavia
+    def __init__(self, nombre, ayuda, funcion, etiquetas=(), tipo="gauge"):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.etiquetas = tuple(etiquetas)
+        self.tipo = tipo
+        REGISTRO.append(self)
+
+    def lineas(self):
+        valor = self.funcion()
+        if valor is None:
+            return
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} {self.tipo}"
+        series = [((), valor)] if isinstance(valor, (int, float)) else valor
+        for valores, numero in series:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(numero)}"
+
+
+def exponer():
+    # Texto para /metrics (cada metrica con su HELP/TYPE)
+    lineas = []
+    for metrica in REGISTRO:
+        lineas.extend(metrica.lineas())
+    return "\n".join(lineas) + "\n"
+
+
+PETICIONES = Histograma("bcp_http_segundos", "Duracion de las peticiones HTTP",
+                        ("ruta", "metodo", "estado"))
+ETAPAS = Histograma("bcp_etapa_segundos", "Duracion de cada etapa dentro de las peticiones", ("etapa",))
+TAMANO_LOTES = Histograma("bcp_lote_consultas", "Consultas por pasada del modelo y de FAISS", ("origen",),
+                          CUBETAS_TAMANO)
+Calculada("bcp_proceso_info", "Proceso (worker) que expone estas metricas", lambda: 1)
+
+
+class Tiempos:
+    # Suma de tiempos por etapa de una peticion (para Server-Timing)
+    def __init__(self):
+        self.etapas = {}
+        self.lock = threading.Lock()
+
+    def sumar(self, etapa, segundos):
+        with self.lock:
+            self.etapas[etapa] = self.etapas.get(etapa, 0.0) + segundos
+
+    def encabezado(self, total):
+        with self.lock:
+            etapas = list(self.etapas.items())
+        partes = [f"{etapa};dur={segundos * 1000:.2f}" for etapa, segundos in etapas]
+        partes.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(partes)
+
+
+# Peticiones a las que se atribuye el trabajo del hilo actual (un micro-lote
+# atiende varias a la vez)
+_activos = ContextVar("tiempos_activos", default=())
+
+
+def tiempos_activos():
+    return _activos.get()
+
+
+@contextmanager
+def compartir(tiempos):
+    # Atribuye lo que se mida dentro del bloque a estas peticiones
+    token = _activos.set(tuple(tiempos))
+    try:
+        yield
+    finally:
+        _activos.reset(token)
+
+
+@contextmanager
+def tramo(etapa, histograma=None):
+    # Solo se registra dentro de peticiones: la construccion del indice al
+    # arrancar no se mezcla con la latencia de las consultas. `histograma`
+    # (sin etiquetas) se observa siempre, haya peticion o no
+    activos = _activos.get()
+    if not activos and histograma is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        if histograma is not None:
+            histograma.observar(duracion)
+        if activos:
+            ETAPAS.observar(duracion, etapa)
+            for tiempos in activos:
+                tiempos.sumar(etapa, duracion)
+
+
+def _pide_server_timing(encabezados):
+    for nombre, valor in encabezados:
+        if nombre == b"x-server-timing":
+            return valor.strip() in (b"1", b"true")
+    return False
+
+
+class MiddlewareMetricas:
+    # Middleware ASGI: mide cada peticion y agrega Server-Timing si se pidio
+    def __init__(self, app, server_timing=SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        tiempos = Tiempos()
+        token = _activos.set((tiempos,))
+        inicio = time.perf_counter()
+        pedir = self.server_timing or _pide_server_timing(scope["headers"])
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                if pedir:
+                    valor = tiempos.encabezado(time.perf_counter() - inicio)
+                    mensaje = dict(mensaje, headers=[*mensaje.get("headers", []),
+                                                     (b"server-timing", valor.encode("latin-1"))])
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _activos.reset(token)
+            # Plantilla de la ruta (/documentos/{doc_id}), no la URL, para no crear una serie por id
+            ruta = getattr(scope.get("route"), "path", "sin_ruta")
+            PETICIONES.observar(time.perf_counter() - inicio, ruta, scope["method"], str(estado))
@@ -0,0 +1,89 @@
+#------------------------------------------------------
+#----Micro-lotes de consultas concurrentes-------------
+#------------------------------------------------------
+# Las llamadas a /buscar/ que llegan dentro de una ventana corta (p. ej.
+# 5 ms) se agrupan y se resuelven con una sola pasada del modelo y una sola
+# busqueda en FAISS. Cada hilo de la peticion espera su propio resultado.
+# Los tiempos del lote (modelo, FAISS) se atribuyen a todas sus peticiones.
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metricas import ETAPAS, TAMANO_LOTES, compartir, tiempos_activos
+
+
+class MicroLotes:
+    def __init__(self, procesar, ventana_ms=5.0, maximo=64):
+        # procesar(consultas, k, **opciones) -> una lista de resultados por consulta
+        self.procesar = procesar
+        self.ventana = ventana_ms / 1000.0
+        self.maximo = maximo
+        self.cola = queue.Queue()
+        self.lock = threading.Lock()
+        self.pid = None  # proceso en el que corre el hilo
+
+    def _asegurar_hilo(self):
+        # El hilo se crea con la primera consulta de cada proceso: en modo
+        # prefork los hilos del proceso padre no existen en los workers
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.cola = queue.Queue()
+                hilo = threading.Thread(target=self._bucle, args=(self.cola,), name="microlotes", daemon=True)
+                hilo.start()
+                self.pid = os.getpid()
+
+    def enviar(self, consulta, k, **opciones):
+        # Con ventana 0 no se agrupa: se procesa directamente en este hilo
+        if self.ventana <= 0:
+            return self.procesar([consulta], k, **opciones)[0]
+        self._asegurar_hilo()
+        futuro = Future()
+        self.cola.put((consulta, k, tuple(sorted(opciones.items())), futuro, tiempos_activos(), time.perf_counter()))
+        return futuro.result()
+
+    def _bucle(self, cola):
+        while True:
+            lote = [cola.get()]
+            limite = time.monotonic() + self.ventana
+            while len(lote) < self.maximo:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+
+            # Solo se agrupan consultas con las mismas opciones de busqueda
+            grupos = {}
+            for item in lote:
+                grupos.setdefault(item[2], []).append(item)
+            for opciones, grupo in grupos.items():
+                self._resolver(grupo, dict(opciones))
+
+    def _resolver(self, grupo, opciones):
+        # Se busca con el k mayor del grupo y se recorta para cada consulta
+        k = max(item[1] for item in grupo)
+        # Tiempo que cada consulta espero a que se armara el lote
+        ahora = time.perf_counter()
+        tiempos = []
+        for item in grupo:
+            ETAPAS.observar(ahora - item[5], "espera_microlote")
+            for t in item[4]:
+                t.sumar("espera_microlote", ahora - item[5])
+            tiempos.extend(item[4])
+        TAMANO_LOTES.observar(len(grupo), "microlote")
+        try:
+            with compartir(tiempos):
+                resultados = self.procesar([item[0] for item in grupo], k, **opciones)
+        except Exception as e:
+            for item in grupo:
+                item[3].set_exception(e)
+            return
+        for (_, k_consulta, _, futuro, _, _), resultado in zip(grupo, resultados):
+            futuro.set_result(resultado[:k_consulta])
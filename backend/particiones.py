@@ -0,0 +1,135 @@
+#------------------------------------------------------
+#----Particion del corpus en shards--------------------
+#------------------------------------------------------
+# Reparte los documentos en N archivos, uno por shard, y escribe un
+# manifiesto con lo que contiene cada uno. Cada shard se sirve con BCP_app
+# (su propio proceso, modelo e indice) apuntando a su archivo:
+#   BCP_RUTA_DOCUMENTOS=<carpeta>/shard-<i>.txt BCP_RUTA_INDICE=<carpeta>/indice-<i>
+# y coordinador.py reparte /buscar/ entre ellos.
+#
+# Claves de particion:
+#   proyecto -- todos los documentos de un proyecto (YAPE, MBBK...) en el
+#               mismo shard, repartiendo los proyectos para equilibrar la
+#               cantidad de documentos; una busqueda con proyecto=... solo
+#               consulta los shards de esos proyectos
+#   hash     -- por id del documento (hash del texto), reparto uniforme
+#
+#   python particiones.py --shards 3 --clave proyecto
+
+import argparse
+import json
+import os
+
+from campos import separar_campos
+
+# Sin importar ingesta / indice_vectorial (y FAISS) aqui: el coordinador
+# solo lee el manifiesto
+RUTA_DOCUMENTOS = os.environ.get("BCP_RUTA_DOCUMENTOS", "data/documentos.txt")
+RUTA_PARTICIONES = os.environ.get("BCP_RUTA_PARTICIONES", "data/particiones")
+
+ARCHIVO_MANIFIESTO = "manifiesto.json"
+
+CLAVES = ("proyecto", "hash")
+
+
+def carpeta_particiones(shards, clave, ruta=RUTA_PARTICIONES):
+    return os.path.join(ruta, f"{clave}-{shards}")
+
+
+def asignar(documentos, shards, clave):
+    # Devuelve (documentos de cada shard, proyectos de cada shard o None)
+    if clave not in CLAVES:
+        raise ValueError(f"Clave de particion desconocida: {clave} (opciones: {', '.join(CLAVES)})")
+    if clave == "hash":
+        from indice_vectorial import hash_documento, id_documento
+        partes = [[] for _ in range(shards)]
+        for documento in documentos:
+            partes[id_documento(hash_documento(documento)) % shards].append(documento)
+        return partes, None
+
+    por_proyecto = {}
+    for documento in documentos:
+        por_proyecto.setdefault(separar_campos(documento)["proyecto"], []).append(documento)
+    if len(por_proyecto) < shards:
+        raise ValueError(f"Hay {len(por_proyecto)} proyectos para {shards} shards; use menos shards o clave=hash")
+    # El proyecto mas grande primero, al shard con menos documentos
+    partes = [[] for _ in range(shards)]
+    proyectos = [[] for _ in range(shards)]
+    for proyecto, docs in sorted(por_proyecto.items(), key=lambda p: (-len(p[1]), p[0])):
+        destino = min(range(shards), key=lambda i: len(partes[i]))
+        partes[destino].extend(docs)
+        proyectos[destino].append(proyecto)
+    return partes, proyectos
+
+
+def dividir(shards, clave, origen=RUTA_DOCUMENTOS, ruta=RUTA_PARTICIONES):
+    """
+    Escribe los archivos de cada shard y el manifiesto en
+    <ruta>/<clave>-<shards>/ y devuelve el manifiesto. Un archivo solo se
+    reescribe si cambio su contenido (el indice de cada shard ya reutiliza
+    los vectores de las lineas que no cambiaron).
+    """
+    from indice_vectorial import RUTA_INDICE, hash_documento, leer_eliminados
+    from ingesta import documentos_unicos
+
+    carpeta = carpeta_particiones(shards, clave, ruta)
+    os.makedirs(carpeta, exist_ok=True)
+    lineas = documentos_unicos(origen)
+    if origen == RUTA_DOCUMENTOS:
+        # Los eliminados por la API siguen en documentos.txt hasta compactar
+        eliminados = leer_eliminados(RUTA_INDICE)
+        lineas = [d for d in lineas if hash_documento(d) not in eliminados]
+    partes, proyectos = asignar(lineas, shards, clave)
+    manifiesto = {"clave": clave, "origen": origen, "shards": []}
+    for i, documentos in enumerate(partes):
+        archivo = os.path.join(carpeta, f"shard-{i}.txt")
+        contenido = "".join(d + "\n" for d in documentos)
+        try:
+            with open(archivo, "r", encoding="utf-8") as f:
+                igual = f.read() == contenido
+        except OSError:
+            igual = False
+        if not igual:
+            with open(archivo + ".tmp", "w", encoding="utf-8") as f:
+                f.write(contenido)
+            os.replace(archivo + ".tmp", archivo)
+        manifiesto["shards"].append({
+            "documentos": archivo,
+            "indice": os.path.join(carpeta, f"indice-{i}"),
+            "cantidad": len(documentos),
+            "proyectos": proyectos[i] if proyectos is not None else None
+        })
+    with open(os.path.join(carpeta, ARCHIVO_MANIFIESTO), "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    return manifiesto
+
+
+def leer_manifiesto(carpeta):
+    with open(os.path.join(carpeta, ARCHIVO_MANIFIESTO), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def shards_de_proyectos(manifiesto, proyectos):
+    # Indices de los shards que tienen alguno de los proyectos ("YAPE,MBBK"),
+    # o None si el corpus no esta particionado por proyecto
+    if manifiesto.get("clave") != "proyecto":
+        return None
+    buscados = {p.strip().upper() for p in proyectos.split(",") if p.strip()}
+    return [i for i, shard in enumerate(manifiesto["shards"]) if buscados & set(shard["proyectos"])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reparte el corpus en archivos por shard")
+    parser.add_argument("--shards", type=int, required=True)
+    parser.add_argument("--clave", choices=CLAVES, default="proyecto")
+    parser.add_argument("--origen", default=RUTA_DOCUMENTOS, help="archivo o carpeta de documentos")
+    parser.add_argument("--ruta", default=RUTA_PARTICIONES)
+    args = parser.parse_args()
+    manifiesto = dividir(args.shards, args.clave, args.origen, args.ruta)
+    for i, shard in enumerate(manifiesto["shards"]):
+        proyectos = f" ({', '.join(shard['proyectos'])})" if shard["proyectos"] else ""
+        print(f"shard {i}: {shard['cantidad']} documentos{proyectos} -> {shard['documentos']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#------------------------------------------------------
+#----Ranking difuso de recursos de Azure---------------
+#------------------------------------------------------
+# Misma escala de puntuacion que calcular_similitud del frontend:
+#   1.0 nombre exacto + tipo seleccionado  | 0.9 nombre exacto
+#   0.8 el nombre empieza con el termino   | 0.7 palabra completa en el nombre
+#   0.6 contenido en el nombre             | 0.5 contenido en el tipo
+#   0.4 contenido en la ubicacion          | 0.3 * proporcion de caracteres en comun
+#
+# En lugar de recorrer cada recurso en Python, al construir el motor se
+# precalculan las columnas en minusculas, la presencia de cada caracter por
+# recurso, un indice de bigramas/trigramas y de palabras de los nombres, y
+# los nombres ordenados (para prefijos). Una busqueda:
+#   - calcula la proporcion de caracteres en comun con operaciones numpy
+#   - evalua tipo y ubicacion una sola vez por valor distinto
+#   - obtiene prefijos con busqueda binaria y palabras completas del indice
+#   - solo verifica en Python los nombres candidatos del indice de n-gramas
+#
+# Con `embeddings` (un vector por recurso, ver indice_recursos.py) y el
+# vector de la consulta, el puntaje se mezcla con la similitud coseno:
+#   max(puntaje, (1 - alpha) * puntaje + alpha * coseno)
+# Una coincidencia lexica conserva su nivel y los recursos parecidos en
+# significado ("firewall del frontend") suben aunque el nombre no coincida.
+#
+# aplicar() devuelve un motor nuevo con los cambios del inventario sin
+# reconstruirlo: las bajas (y la version anterior de cada modificacion)
+# quedan marcadas como borradas y las altas se agregan al final, tocando
+# solo las claves de los indices que cambian. El motor original no se
+# modifica (las busquedas en curso lo siguen usando). Con muchas filas
+# borradas (fragmentacion) conviene reconstruirlo.
+
+import copy
+import re
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+VACIO = np.empty(0, dtype=np.int32)
+
+
+def redondear_como_frontend(scores):
+    # float(f"{s:.2f}") del frontend: redondeo decimal del valor exacto, que
+    # en los bordes .xx5 no coincide con np.round (0.075 -> 0.07, no 0.08).
+    # Se formatea una vez por valor distinto (los puntajes se repiten mucho)
+    valores, posiciones = np.unique(scores, return_inverse=True)
+    return np.array([float(f"{v:.2f}") for v in valores.tolist()])[posiciones.reshape(-1)]
+
+
+def _ngramas(texto, n):
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+
+def _indice_invertido(claves_por_fila):
+    # clave -> arreglo ordenado de filas que la contienen
+    filas_por_clave = {}
+    for fila, claves in enumerate(claves_por_fila):
+        for clave in claves:
+            filas_por_clave.setdefault(clave, []).append(fila)
+    return {clave: np.array(filas, dtype=np.int32) for clave, filas in filas_por_clave.items()}
+
+
+def _codificar(valores):
+    # Valores distintos y el codigo de cada fila (para evaluar una vez por valor)
+    distintos, codigos = np.unique(np.array(valores, dtype=object), return_inverse=True)
+    return list(distintos), codigos.astype(np.int32)
+
+
+def _agregar_invertido(indice, claves_por_fila, base):
+    # Copia del indice con las filas base, base + 1, ... agregadas; solo se
+    # reemplazan los arreglos de las claves que aparecen
+    nuevas = {}
+    for fila, claves in enumerate(claves_por_fila, base):
+        for clave in claves:
+            nuevas.setdefault(clave, []).append(fila)
+    indice = dict(indice)
+    for clave, filas in nuevas.items():
+        filas = np.array(filas, dtype=np.int32)
+        previas = indice.get(clave)
+        indice[clave] = filas if previas is None else np.concatenate((previas, filas))
+    return indice
+
+
+def _agregar_codigos(distintos, codigos, valores):
+    # Como _codificar, agregando valores nuevos (los distintos nuevos van al final)
+    distintos = list(distintos)
+    posicion = {v: i for i, v in enumerate(distintos)}
+    nuevos = []
+    for valor in valores:
+        if valor not in posicion:
+            posicion[valor] = len(distintos)
+            distintos.append(valor)
+        nuevos.append(posicion[valor])
+    return distintos, np.concatenate((codigos, np.array(nuevos, dtype=np.int32)))
+
+
+class MotorRanking:
+    def __init__(self, recursos, embeddings=None):
+        # recursos: lista de dicts con id, name, type, location (inmutable)
+        # embeddings: matriz normalizada alineada con recursos, o None
+        self.recursos = recursos
+        self.embeddings = embeddings
+        self.nombres = [r["name"].lower() for r in recursos]
+        self.tipos, self.codigos_tipo = _codificar([r["type"].lower() for r in recursos])
+        self.ubicaciones, self.codigos_ubicacion = _codificar(
+            [r.get("location", "").lower() for r in recursos])
+
+        # caracter -> filas que lo contienen / n-grama -> filas que lo contienen
+        self.caracteres = _indice_invertido(set(n) for n in self.nombres)
+        self.bigramas = _indice_invertido(_ngramas(n, 2) for n in self.nombres)
+        self.trigramas = _indice_invertido(_ngramas(n, 3) for n in self.nombres)
+        self.palabras = _indice_invertido(set(re.findall(r'\w+', n)) for n in self.nombres)
+
+        # Nombres ordenados: los que empiezan con un prefijo son un rango contiguo
+        self.orden = np.array(sorted(range(len(self.nombres)), key=self.nombres.__getitem__), dtype=np.int32)
+        self.nombres_ordenados = [self.nombres[i] for i in self.orden.tolist()]
+
+        # Nombre exacto -> filas (para la coincidencia exacta sin recorrer)
+        self.exactos = {}
+        for fila, nombre in enumerate(self.nombres):
+            self.exactos.setdefault(nombre, []).append(fila)
+
+        # id en minusculas -> fila vigente, y filas borradas por aplicar()
+        self.fila_de = {r["id"].lower(): fila for fila, r in enumerate(recursos)}
+        self.borradas = np.zeros(len(recursos), dtype=bool)
+        self.vivos = len(recursos)
+
+    def __len__(self):
+        return self.vivos
+
+    @property
+    def fragmentacion(self):
+        # Proporcion de filas borradas
+        return 1.0 - self.vivos / len(self.recursos) if len(self.recursos) else 0.0
+
+    def aplicar(self, quitar, agregar, embeddings=None):
+        """
+        Motor nuevo sin los recursos de `quitar` (ids) y con los de `agregar`
+        al final; un recurso modificado va en ambos. `embeddings`: vectores
+        de `agregar`, en orden (obligatorios si el motor es semantico).
+        """
+        nuevo = copy.copy(self)
+        nuevo.fila_de = dict(self.fila_de)
+        borradas = self.borradas.copy()
+        for clave in quitar:
+            fila = nuevo.fila_de.pop(clave.lower(), None)
+            if fila is not None:
+                borradas[fila] = True
+
+        base = len(self.recursos)
+        nombres = [r["name"].lower() for r in agregar]
+        nuevo.recursos = self.recursos + list(agregar)
+        nuevo.nombres = self.nombres + nombres
+        nuevo.tipos, nuevo.codigos_tipo = _agregar_codigos(
+            self.tipos, self.codigos_tipo, [r["type"].lower() for r in agregar])
+        nuevo.ubicaciones, nuevo.codigos_ubicacion = _agregar_codigos(
+            self.ubicaciones, self.codigos_ubicacion, [r.get("location", "").lower() for r in agregar])
+        nuevo.caracteres = _agregar_invertido(self.caracteres, (set(n) for n in nombres), base)
+        nuevo.bigramas = _agregar_invertido(self.bigramas, (_ngramas(n, 2) for n in nombres), base)
+        nuevo.trigramas = _agregar_invertido(self.trigramas, (_ngramas(n, 3) for n in nombres), base)
+        nuevo.palabras = _agregar_invertido(
+            self.palabras, (set(re.findall(r'\w+', n)) for n in nombres), base)
+
+        orden = self.orden.tolist()
+        nuevo.nombres_ordenados = list(self.nombres_ordenados)
+        nuevo.exactos = dict(self.exactos)
+        for fila, (nombre, recurso) in enumerate(zip(nombres, agregar), base):
+            # Despues de los iguales, como en el orden estable de __init__
+            posicion = bisect_right(nuevo.nombres_ordenados, nombre)
+            nuevo.nombres_ordenados.insert(posicion, nombre)
+            orden.insert(posicion, fila)
+            nuevo.exactos[nombre] = nuevo.exactos.get(nombre, []) + [fila]
+            anterior = nuevo.fila_de.get(recurso["id"].lower())
+            if anterior is not None:
+                borradas[anterior] = True
+            nuevo.fila_de[recurso["id"].lower()] = fila
+        nuevo.orden = np.array(orden, dtype=np.int32)
+
+        nuevo.borradas = np.concatenate((borradas, np.zeros(len(agregar), dtype=bool)))
+        nuevo.vivos = len(nuevo.recursos) - int(nuevo.borradas.sum())
+        if self.embeddings is not None and len(agregar):
+            nuevo.embeddings = np.vstack((self.embeddings, embeddings)).astype(np.float32, copy=False)
+            nuevo.embeddings.setflags(write=False)
+        return nuevo
+
+    def _contienen(self, busqueda):
+        # Filas cuyo nombre contiene la busqueda. Hasta 3 caracteres la lista
+        # del indice es exacta; con mas, se verifican los candidatos
+        if len(busqueda) == 1:
+            return self.caracteres.get(busqueda, VACIO)
+        indice, n = (self.bigramas, 2) if len(busqueda) == 2 else (self.trigramas, 3)
+        listas = [indice.get(g) for g in _ngramas(busqueda, n)]
+        if any(l is None for l in listas):
+            return VACIO
+        listas.sort(key=len)
+        candidatos = listas[0]
+        for lista in listas[1:]:
+            candidatos = np.intersect1d(candidatos, lista, assume_unique=True)
+        if len(busqueda) <= 3:
+            return candidatos
+        nombres = self.nombres
+        return np.array([f for f in candidatos.tolist() if busqueda in nombres[f]], dtype=np.int32)
+
+    def _palabra_completa(self, busqueda, contienen):
+        # Filas donde la busqueda aparece como palabra completa (\b...\b)
+        if re.fullmatch(r'\w+', busqueda):
+            # Solo caracteres de palabra: equivale a ser una palabra del nombre
+            return self.palabras.get(busqueda, VACIO)
+        palabra = re.compile(r'\b' + re.escape(busqueda) + r'\b')
+        nombres = self.nombres
+        return np.array([f for f in contienen.tolist() if palabra.search(nombres[f])], dtype=np.int32)
+
+    def _empiezan_con(self, busqueda):
+        inicio = bisect_left(self.nombres_ordenados, busqueda)
+        fin = bisect_left(self.nombres_ordenados, busqueda + "\U0010ffff", inicio)
+        return self.orden[inicio:fin]
+
+    def puntuar(self, busqueda, tipo_filtro=None):
+        # Arreglo con la similitud de cada recurso (mismo orden que self.recursos)
+        n = len(self.recursos)
+        scores = np.zeros(n, dtype=np.float64)
+        if not busqueda or not n:
+            return scores
+        busqueda = busqueda.lower()
+
+        # 7. Proporcion de caracteres de la busqueda presentes en el nombre
+        en_comun = np.zeros(n, dtype=np.float64)
+        for c in set(busqueda):
+            filas = self.caracteres.get(c)
+            if filas is not None:
+                en_comun[filas] += busqueda.count(c)
+        np.maximum(scores, en_comun / len(busqueda) * 0.3, out=scores)
+
+        # 5 y 6. Tipo y ubicacion: se evalua cada valor distinto una sola vez
+        for valores, codigos, puntaje in ((self.ubicaciones, self.codigos_ubicacion, 0.4),
+                                          (self.tipos, self.codigos_tipo, 0.5)):
+            coinciden = np.array([busqueda in v for v in valores], dtype=bool)
+            if coinciden.any():
+                np.maximum(scores, np.where(coinciden[codigos], puntaje, 0.0), out=scores)
+
+        # 4, 3 y 2. Subcadena, palabra completa y prefijo en el nombre
+        contienen = self._contienen(busqueda)
+        for filas, puntaje in ((contienen, 0.6),
+                               (self._palabra_completa(busqueda, contienen), 0.7),
+                               (self._empiezan_con(busqueda), 0.8)):
+            if len(filas):
+                scores[filas] = np.maximum(scores[filas], puntaje)
+
+        # 1. Coincidencia exacta del nombre
+        exactos = self.exactos.get(busqueda)
+        if exactos:
+            scores[exactos] = 1.0 if tipo_filtro else 0.9
+
+        # Filtro de tipo: los demas recursos quedan en 0
+        if tipo_filtro:
+            scores[~self._del_tipo(tipo_filtro)] = 0.0
+        if self.vivos < n:
+            scores[self.borradas] = 0.0
+        return scores
+
+    def _del_tipo(self, tipo_filtro):
+        tipo_filtro = tipo_filtro.lower()
+        codigo = self.tipos.index(tipo_filtro) if tipo_filtro in self.tipos else -1
+        return self.codigos_tipo == codigo
+
+    @property
+    def semantico(self):
+        return self.embeddings is not None
+
+    def mezclar(self, scores, vector, alpha=0.5, tipo_filtro=None):
+        # Devuelve (puntaje mezclado, coseno) de cada recurso
+        cosenos = np.clip(self.embeddings @ vector, 0.0, 1.0).astype(np.float64)
+        mezcla = np.maximum(scores, (1.0 - alpha) * scores + alpha * cosenos)
+        if tipo_filtro:
+            mezcla[~self._del_tipo(tipo_filtro)] = 0.0
+        return mezcla, cosenos
+
+    def buscar(self, busqueda, tipo_filtro=None, umbral=0.0, limite=50, vector=None, alpha=0.5):
+        """
+        Devuelve (total, resultados): cuantos recursos superan el umbral y
+        los `limite` mejores, de mayor a menor similitud (a igual similitud
+        se respeta el orden del inventario). El umbral se compara con la
+        similitud redondeada a 2 decimales, como la muestra el frontend.
+        Con `vector` (y embeddings) cada resultado trae tambien su
+        similitud_semantica.
+        """
+        scores = self.puntuar(busqueda, tipo_filtro)
+        cosenos = None
+        if vector is not None and self.semantico and len(self.recursos):
+            scores, cosenos = self.mezclar(scores, vector, alpha, tipo_filtro)
+        # Solo se redondean los que pueden llegar al umbral (a lo sumo suben 0.005)
+        filas = np.flatnonzero(scores >= umbral - 0.01)
+        filas = filas[redondear_como_frontend(scores[filas]) >= umbral]
+        if self.vivos < len(self.recursos):
+            filas = filas[~self.borradas[filas]]
+        total = len(filas)
+        if limite is not None and total > limite:
+            # Seleccion parcial de los mejores antes de ordenar
+            corte = np.argpartition(-scores[filas], limite - 1)[:limite]
+            umbral_corte = scores[filas[corte]].min()
+            filas = filas[scores[filas] >= umbral_corte]
+        orden = np.lexsort((filas, -scores[filas]))
+        filas = filas[orden][:limite]
+        resultados = []
+        for fila in filas.tolist():
+            recurso = dict(self.recursos[fila])
+            recurso["similitud"] = round(float(scores[fila]), 4)
+            if cosenos is not None:
+                recurso["similitud_semantica"] = round(float(cosenos[fila]), 4)
+            resultados.append(recurso)
+        return total, resultados
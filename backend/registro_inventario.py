@@ -0,0 +1,209 @@
+#------------------------------------------------------
+#----Inventario de Azure persistido (SQLite)-----------
+#------------------------------------------------------
+# Ultima foto de los recursos, por id, con el hash de su contenido y su
+# changedTime, y un registro de cambios numerado (alta, modificacion, baja).
+# Cada refresco del inventario compara lo listado con la foto y solo
+# escribe las diferencias; los workers (y /azure-resources/changes) leen el
+# registro desde la ultima secuencia que conocen. Al arrancar, la foto
+# guardada se sirve antes de consultar a Azure.
+#
+#   BCP_INVENTARIO_DB=data/inventario.sqlite
+#   BCP_INVENTARIO_CAMBIOS=50000  (cambios que se conservan en el registro)
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+RUTA_REGISTRO = os.environ.get("BCP_INVENTARIO_DB", "data/inventario.sqlite")
+MAX_CAMBIOS = int(os.environ.get("BCP_INVENTARIO_CAMBIOS", "50000"))
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS recursos (
+    id TEXT PRIMARY KEY,
+    suscripcion TEXT,
+    grupo TEXT,
+    datos TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    cambio TEXT
+);
+CREATE INDEX IF NOT EXISTS recursos_grupo ON recursos (grupo, suscripcion);
+CREATE TABLE IF NOT EXISTS cambios (
+    secuencia INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    operacion TEXT NOT NULL,
+    datos TEXT,
+    momento REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cambios_momento ON cambios (momento);
+CREATE TABLE IF NOT EXISTS estado (clave TEXT PRIMARY KEY, valor TEXT);
+"""
+
+
+class HistorialIncompleto(Exception):
+    # Los cambios pedidos ya se descartaron del registro
+    pass
+
+
+def hash_recurso(recurso):
+    return hashlib.sha256(json.dumps(recurso, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _minusculas(valor):
+    return valor.lower() if valor else valor
+
+
+def resumir_cambios(cambios):
+    # (ids tocados, version final de los que siguen existiendo) de una lista
+    # de cambios: si un recurso cambio varias veces solo cuenta la ultima
+    finales = {}
+    for _, operacion, clave, recurso, _ in cambios:
+        finales[clave] = None if operacion == "baja" else recurso
+    return list(finales), [r for r in finales.values() if r is not None]
+
+
+class _Destinos:
+    # Conjunto de (suscripcion, grupo); sin suscripcion abarca el grupo en
+    # todas las suscripciones
+    def __init__(self, destinos):
+        destinos = [(_minusculas(s), _minusculas(g)) for s, g in destinos]
+        self.pares = {d for d in destinos if d[0] is not None}
+        self.grupos = {g for s, g in destinos if s is None}
+
+    def incluye(self, suscripcion, grupo):
+        return grupo in self.grupos or (suscripcion, grupo) in self.pares
+
+
+class RegistroInventario:
+    def __init__(self, ruta=RUTA_REGISTRO, max_cambios=MAX_CAMBIOS):
+        self.ruta = ruta
+        self.max_cambios = max_cambios
+        self._creado = False
+
+    def _conectar(self):
+        # Una conexion por operacion: la usan el hilo del inventario y las
+        # peticiones a /azure-resources/changes (y otros workers, con WAL)
+        if not self._creado:
+            os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        if not self._creado:
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.executescript(ESQUEMA)
+            self._creado = True
+        return conexion
+
+    def cargar(self):
+        # Foto completa: (id en minusculas -> recurso, ultima secuencia, actualizado)
+        with closing(self._conectar()) as conexion:
+            conexion.execute("BEGIN")
+            recursos = {id_: json.loads(datos)
+                        for id_, datos in conexion.execute("SELECT id, datos FROM recursos ORDER BY rowid")}
+            secuencia = self._ultima(conexion)
+            fila = conexion.execute("SELECT valor FROM estado WHERE clave = 'actualizado'").fetchone()
+            conexion.execute("COMMIT")
+        return recursos, secuencia, float(fila[0]) if fila else None
+
+    def _ultima(self, conexion):
+        return conexion.execute("SELECT COALESCE(MAX(secuencia), 0) FROM cambios").fetchone()[0]
+
+    def aplicar(self, listados, completos=(), vigentes=None):
+        """
+        Escribe las diferencias entre lo listado y la foto guardada.
+        listados: {(suscripcion, grupo): [recursos]}; en los destinos de
+        `completos` se dan de baja los recursos que ya no aparecen (un
+        listado delta solo trae altas y modificaciones). Con `vigentes`
+        (todos los destinos configurados) se dan de baja los recursos de
+        grupos que ya no se consultan. Devuelve {operacion: cantidad}.
+        """
+        ahora = time.time()
+        conteo = {"alta": 0, "modificacion": 0, "baja": 0}
+        with closing(self._conectar()) as conexion:
+            # Un solo escritor a la vez (varios workers pueden refrescar)
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                filas = {id_: (suscripcion, grupo, h) for id_, suscripcion, grupo, h in
+                         conexion.execute("SELECT id, suscripcion, grupo, hash FROM recursos")}
+                cambios, vistos = [], set()
+                for recursos in listados.values():
+                    for recurso in recursos:
+                        clave = recurso["id"].lower()
+                        if clave in vistos:
+                            continue
+                        vistos.add(clave)
+                        h = hash_recurso(recurso)
+                        previa = filas.get(clave)
+                        if previa is not None and previa[2] == h:
+                            continue
+                        cambios.append((clave, "alta" if previa is None else "modificacion", recurso, h))
+                # Bajas: lo que ya no aparece en un listado completo de su
+                # destino o pertenece a un grupo que ya no se consulta
+                completos = _Destinos(completos)
+                vigentes = _Destinos(vigentes) if vigentes is not None else None
+                cambios.extend((clave, "baja", None, None) for clave, (s, g, _) in filas.items()
+                               if clave not in vistos and (completos.incluye(s, g)
+                                                           or (vigentes is not None and not vigentes.incluye(s, g))))
+
+                for clave, operacion, recurso, h in cambios:
+                    if operacion == "baja":
+                        conexion.execute("DELETE FROM recursos WHERE id = ?", (clave,))
+                        datos = None
+                    else:
+                        datos = json.dumps(recurso)
+                        conexion.execute(
+                            "INSERT INTO recursos (id, suscripcion, grupo, datos, hash, cambio) "
+                            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                            "suscripcion = excluded.suscripcion, grupo = excluded.grupo, "
+                            "datos = excluded.datos, hash = excluded.hash, cambio = excluded.cambio",
+                            (clave, _minusculas(recurso.get("subscriptionId")), _minusculas(recurso.get("resourceGroup")),
+                             datos, h, recurso.get("changedTime")))
+                    conexion.execute("INSERT INTO cambios (id, operacion, datos, momento) VALUES (?, ?, ?, ?)",
+                                     (clave, operacion, datos, ahora))
+                    conteo[operacion] += 1
+
+                conexion.execute("INSERT OR REPLACE INTO estado (clave, valor) VALUES ('actualizado', ?)",
+                                 (str(ahora),))
+                # Solo se conservan los ultimos max_cambios cambios
+                conexion.execute("DELETE FROM cambios WHERE secuencia <= ?",
+                                 (self._ultima(conexion) - self.max_cambios,))
+                conexion.execute("COMMIT")
+            except BaseException:
+                conexion.execute("ROLLBACK")
+                raise
+        return conteo
+
+    def cambios_desde(self, secuencia=None, limite=None, desde_momento=None):
+        """
+        Cambios posteriores a `secuencia` (o desde el instante `desde_momento`),
+        en orden: [(secuencia, operacion, id, recurso o None, momento)] y la
+        ultima secuencia del registro. HistorialIncompleto si alguno de los
+        cambios pedidos ya se descarto.
+        """
+        with closing(self._conectar()) as conexion:
+            conexion.execute("BEGIN")
+            ultima = self._ultima(conexion)
+            primera = conexion.execute("SELECT MIN(secuencia) FROM cambios").fetchone()[0] or ultima + 1
+            if desde_momento is not None:
+                # Si ya se descartaron cambios y el primero que queda es
+                # posterior a ese instante, pudo perderse alguno
+                inicio = conexion.execute("SELECT momento FROM cambios WHERE secuencia = ?", (primera,)).fetchone()
+                if primera > 1 and inicio is not None and inicio[0] > desde_momento:
+                    conexion.execute("COMMIT")
+                    raise HistorialIncompleto(primera)
+                fila = conexion.execute("SELECT MIN(secuencia) FROM cambios WHERE momento >= ?",
+                                        (desde_momento,)).fetchone()
+                secuencia = (fila[0] or ultima + 1) - 1
+            elif secuencia < primera - 1:
+                conexion.execute("COMMIT")
+                raise HistorialIncompleto(primera)
+            consulta = "SELECT secuencia, operacion, id, datos, momento FROM cambios WHERE secuencia > ? ORDER BY secuencia"
+            parametros = (secuencia,)
+            if limite is not None:
+                consulta += " LIMIT ?"
+                parametros += (limite,)
+            cambios = [(s, operacion, id_, json.loads(datos) if datos else None, momento)
+                       for s, operacion, id_, datos, momento in conexion.execute(consulta, parametros)]
+            conexion.execute("COMMIT")
+        return cambios, ultima
@@ -0,0 +1,93 @@
+#------------------------------------------------------
+#----Servidor prefork (varios workers, una sola carga)--
+#------------------------------------------------------
+# Con `uvicorn --workers N` cada worker importa BCP_app por su cuenta: carga
+# su propia copia del modelo y abre el indice. Aqui el proceso padre carga
+# BCP_app una sola vez (cargar_servicio: modelo en memoria, indice y
+# embeddings abiertos con memory-map) y luego hace fork de los workers, que
+# comparten esas paginas copy-on-write y el mismo socket de escucha; su
+# lifespan ve la carga ya hecha y /readyz responde 200 desde el inicio.
+#
+#   python servidor.py --workers 4 --port 8000
+#
+# El artefacto del indice se prepara antes en un proceso aparte: asi el
+# padre no ejecuta el modelo ni FAISS (sus hilos OpenMP no sobreviven al
+# fork) y solo abre archivos ya construidos.
+#
+# Los documentos agregados o eliminados por la API quedan en el worker que
+# atendio la peticion (y en disco); los demas los ven al reiniciar.
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+
+
+def preparar_indice():
+    # Construye o actualiza data/indice en un proceso hijo
+    subprocess.run([sys.executable, "-c", "import BCP_app; BCP_app.cargar_servicio()"], check=True)
+
+
+def abrir_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def servir(app, sock, log_level):
+    import uvicorn
+
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API de busqueda con workers prefork")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("BCP_WORKERS", "2")))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("El modo prefork requiere fork (Linux/macOS); use uvicorn BCP_app:app")
+
+    preparar_indice()
+    import BCP_app
+    BCP_app.cargar_servicio()  # modelo + indice con memory-map, sin hilos de fondo todavia
+
+    sock = abrir_socket(args.host, args.port)
+    hijos = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                servir(BCP_app.app, sock, args.log_level)
+            finally:
+                os._exit(0)
+        hijos.append(pid)
+    print(f"Sirviendo en http://{args.host}:{args.port} con {len(hijos)} workers: {hijos}")
+
+    def detener(signum, frame):
+        for pid in hijos:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, detener)
+    signal.signal(signal.SIGINT, detener)
+    for pid in hijos:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
+
+if __name__ == "__main__":
+    main()
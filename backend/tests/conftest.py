@@ -0,0 +1,18 @@
+# Los modulos del backend se importan por nombre (como al ejecutar desde backend/)
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# La API de los tests trabaja en una carpeta temporal (nunca en data/), sin
+# Azure y cargando todo en el lifespan (antes de la primera peticion)
+CARPETA_API = tempfile.mkdtemp(prefix="bcp-tests-")
+os.environ.update({
+    "BCP_RUTA_DOCUMENTOS": os.path.join(CARPETA_API, "documentos.txt"),
+    "BCP_RUTA_INDICE": os.path.join(CARPETA_API, "indice"),
+    "BCP_INVENTARIO": "0",
+    "BCP_CARGA_EN_SEGUNDO_PLANO": "0",
+    "BCP_MICROLOTE_MS": "0",
+    "BCP_MODELO_PROCESOS": "0",
+})
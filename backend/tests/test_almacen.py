@@ -0,0 +1,169 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+import almacen
+from almacen import AlmacenDocumentos
+from indice_vectorial import ARCHIVO_AGREGADOS, ARCHIVO_EMBEDDINGS, construir_indice, leer_meta, normalizar
+
+DIMENSION = 16
+CONSULTAS = normalizar(np.random.default_rng(1).standard_normal((8, DIMENSION)).astype("float32"))
+
+
+class Modelo:
+    # Vector fijo por texto (sin cargar un modelo real)
+    def get_sentence_embedding_dimension(self):
+        return DIMENSION
+
+    def encode(self, textos, convert_to_numpy=True):
+        return np.vstack([np.random.default_rng(int(hashlib.sha256(t.encode("utf-8")).hexdigest()[:8], 16)).standard_normal(DIMENSION)
+                          for t in textos]).astype("float32")
+
+
+def codificar(textos):
+    return normalizar(Modelo().encode(textos))
+
+
+def documentos(inicio, fin):
+    return [f"{'YAPE' if i % 3 else 'MBBK'}\tSRV-{i:04d}\tServidor numero {i}" for i in range(inicio, fin)]
+
+
+def abrir(carpeta, docs):
+    ruta_documentos = str(carpeta / "documentos.txt")
+    if not os.path.exists(ruta_documentos):
+        carpeta.mkdir()
+        with open(ruta_documentos, "w", encoding="utf-8") as f:
+            f.write("".join(d + "\n" for d in docs))
+    with open(ruta_documentos, encoding="utf-8") as f:
+        docs = f.read().splitlines()
+    config = {"tipo": "flat"}
+    embeddings, index = construir_indice(docs, Modelo(), "prueba", config, str(carpeta / "indice"))
+    return AlmacenDocumentos(docs, embeddings, index, codificar, "prueba", config, ruta_documentos,
+                             str(carpeta / "indice"))
+
+
+def resultados(almacen_docs, **opciones):
+    return [[(i, round(s, 5)) for i, _, s in fila] for fila in almacen_docs.buscar(CONSULTAS, 5, **opciones)]
+
+
+OPCIONES = [{}, {"rerank": 3}, {"min_similitud": 0.2}, {"filtros": {"proyecto": "MBBK"}}]
+
+
+def test_agregar_sin_reescribir_el_artefacto(tmp_path, monkeypatch):
+    almacen_docs = abrir(tmp_path / "a", documentos(0, 300))
+    matriz = tmp_path / "a" / "indice" / ARCHIVO_EMBEDDINGS
+    antes = os.path.getmtime(matriz)
+    almacen_docs.agregar(documentos(300, 340))
+    assert almacen_docs.instantanea.agregados == 40
+    assert os.path.getmtime(matriz) == antes
+    assert os.path.exists(tmp_path / "a" / "indice" / ARCHIVO_AGREGADOS)
+
+    # Mismos resultados que un indice construido con todos los documentos
+    referencia = abrir(tmp_path / "b", documentos(0, 340))
+    for opciones in OPCIONES:
+        assert resultados(almacen_docs, **opciones) == resultados(referencia, **opciones)
+    monkeypatch.setattr(almacen, "MAX_FILAS_FILTRO_EXACTO", 0)
+    assert resultados(almacen_docs, filtros={"proyecto": "MBBK"}) == resultados(referencia, filtros={"proyecto": "MBBK"})
+
+    # Al reiniciar se abre el artefacto y los agregados salen del registro
+    reiniciado = abrir(tmp_path / "a", None)
+    assert reiniciado.instantanea.agregados == 40
+    assert os.path.getmtime(matriz) == antes
+    assert resultados(reiniciado) == resultados(referencia)
+
+
+@pytest.mark.parametrize("eliminar", [False, True])
+def test_compactar(tmp_path, monkeypatch, eliminar):
+    monkeypatch.setattr(almacen, "MAX_AGREGADOS", 30)
+    monkeypatch.setattr(almacen, "MAX_ELIMINADOS", 2)
+    almacen_docs = abrir(tmp_path / "a", documentos(0, 300))
+    almacen_docs.agregar(documentos(300, 320))
+    if eliminar:
+        # Con mas de MAX_ELIMINADOS marcados se compacta: los agregados pasan
+        # al indice principal y las filas eliminadas salen del artefacto
+        almacen_docs.eliminar([fila[0][0] for fila in almacen_docs.buscar(CONSULTAS[:3], 1)])
+        assert almacen_docs.compactaciones == 1
+        assert not almacen_docs.instantanea.eliminados
+        assert len(almacen_docs.instantanea.ids) == len(almacen_docs) == 317
+    else:
+        almacen_docs.agregar(documentos(320, 340))
+        assert almacen_docs.compactaciones == 1
+    assert almacen_docs.instantanea.agregados == 0
+    assert not os.path.exists(tmp_path / "a" / "indice" / ARCHIVO_AGREGADOS)
+    reiniciado = abrir(tmp_path / "a", None)
+    assert len(reiniciado) == len(almacen_docs)
+    assert resultados(reiniciado) == resultados(almacen_docs)
+
+
+def test_otro_codificador_recodifica(tmp_path):
+    docs = documentos(0, 50)
+    modelo = Modelo()
+    (tmp_path / "indice").mkdir()
+    construir_indice(docs, modelo, "prueba", {"tipo": "flat"}, str(tmp_path / "indice"))
+
+    class Contador(Modelo):
+        codificados = 0
+
+        def encode(self, textos, convert_to_numpy=True):
+            Contador.codificados += len(textos)
+            return super().encode(textos)
+
+    construir_indice(docs, Contador(), "prueba", {"tipo": "flat"}, str(tmp_path / "indice"))
+    assert Contador.codificados == 0
+    construir_indice(docs, Contador(), "prueba", {"tipo": "flat"}, str(tmp_path / "indice"), codificador="onnx-int8")
+    assert Contador.codificados == len(docs)
+    assert leer_meta(str(tmp_path / "indice"))["codificador"] == "onnx-int8"
+
+
+def test_flat_usa_la_matriz_del_indice(tmp_path):
+    # Con flat la matriz exacta son los vectores del indice mapeado (una sola
+    # copia): embeddings.npy no se abre
+    almacen_docs = abrir(tmp_path / "a", documentos(0, 100))
+    principal = almacen_docs.instantanea.embeddings.principal
+    assert not isinstance(principal, np.memmap) and not principal.flags.writeable
+    assert np.array_equal(principal, np.load(tmp_path / "a" / "indice" / ARCHIVO_EMBEDDINGS))
+    # El indice mapeado se clona antes de modificarlo
+    almacen_docs.eliminar([int(almacen_docs.instantanea.ids[0])])
+    almacen_docs._compactar()
+    assert len(abrir(tmp_path / "a", None)) == 99
+
+
+def test_eliminar_sin_reescribir_el_artefacto(tmp_path):
+    almacen_docs = abrir(tmp_path / "a", documentos(0, 300))
+    almacen_docs.agregar(documentos(300, 320))
+    archivos = [tmp_path / "a" / "documentos.txt", tmp_path / "a" / "indice" / ARCHIVO_EMBEDDINGS]
+    antes = [os.path.getmtime(a) for a in archivos]
+    # Los mas cercanos a las consultas, del artefacto y del segmento de agregados
+    borrados = sorted({i for fila in resultados(almacen_docs) for i, _ in fila[:2]} |
+                      {int(i) for i in almacen_docs.instantanea.ids[305:308]})
+    assert almacen_docs.eliminar(borrados) == len(borrados)
+    assert almacen_docs.eliminar(borrados) == 0
+    assert [os.path.getmtime(a) for a in archivos] == antes
+    assert len(almacen_docs) == 320 - len(borrados)
+
+    # Mismos resultados que un indice construido sin esos documentos
+    todos = documentos(0, 320)
+    referencia = abrir(tmp_path / "b", [d for d, i in zip(todos, almacen_docs.instantanea.ids.tolist())
+                                        if i not in borrados])
+    for opciones in OPCIONES:
+        assert resultados(almacen_docs, **opciones) == resultados(referencia, **opciones)
+    assert almacen_docs.instantanea.columnas.valores() == referencia.instantanea.columnas.valores()
+
+    # Al reiniciar las eliminaciones salen del registro
+    reiniciado = abrir(tmp_path / "a", None)
+    assert set(reiniciado.instantanea.eliminados) == set(borrados)
+    assert resultados(reiniciado) == resultados(referencia)
+
+    # Volver a agregar un eliminado solo lo desmarca, tambien tras reiniciar
+    texto = todos[int(np.flatnonzero(reiniciado.instantanea.ids == borrados[0])[0])]
+    assert reiniciado.agregar([texto]) == [borrados[0]]
+    assert reiniciado.instantanea.agregados == 20 and len(reiniciado.instantanea.ids) == 320
+    assert borrados[0] not in abrir(tmp_path / "a", None).instantanea.eliminados
+
+    # Compactar quita las filas eliminadas del artefacto y de documentos.txt
+    reiniciado._compactar()
+    with open(tmp_path / "a" / "documentos.txt", encoding="utf-8") as f:
+        assert len(f.read().splitlines()) == len(reiniciado) == 320 - len(borrados) + 1
+    assert not abrir(tmp_path / "a", None).instantanea.eliminados
@@ -0,0 +1,144 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from test_almacen import Modelo, documentos
+
+
+@pytest.fixture(scope="module")
+def cliente():
+    import BCP_app
+    with open(BCP_app.RUTA_DOCUMENTOS, "w", encoding="utf-8") as f:
+        f.write("".join(d + "\n" for d in documentos(0, 200)))
+    BCP_app.crear_codificador = lambda *argumentos: Modelo()
+    with TestClient(BCP_app.app) as cliente:
+        yield cliente
+
+
+@pytest.mark.parametrize("cuerpo", [{"k": 0}, {"k": 100000}, {"nprobe": 0}, {"ef_search": 0}, {"rerank": -1},
+                                    {"min_similitud": 1.5}])
+def test_lote_fuera_de_rango(cliente, cuerpo):
+    respuesta = cliente.post("/buscar/batch", json=dict(cuerpo, consultas=["servidor"]))
+    assert respuesta.status_code == 422
+
+
+def test_lote(cliente):
+    respuesta = cliente.post("/buscar/batch", json={"consultas": ["servidor 1", "servidor 2"], "k": 4,
+                                                    "proyecto": "MBBK"})
+    assert respuesta.status_code == 200
+    resultados = respuesta.json()["resultados"]
+    assert [r["consulta"] for r in resultados] == ["servidor 1", "servidor 2"]
+    for r in resultados:
+        assert len(r["resultados"]) == 4
+        assert all(d["documento"].startswith("MBBK\t") for d in r["resultados"])
+
+
+def test_cache_de_embeddings_respeta_mayusculas(cliente):
+    # El modelo de prueba distingue mayusculas: solo se unifican los espacios
+    import BCP_app
+    BCP_app.cache_embeddings.limpiar()
+    for consulta in ["Servidor numero 7", "  Servidor   numero 7", "servidor numero 7"]:
+        assert cliente.get("/buscar/", params={"query": consulta}).status_code == 200
+    assert sorted(BCP_app.cache_embeddings.datos) == ["Servidor numero 7", "servidor numero 7"]
+
+
+def test_metricas_por_proceso(cliente):
+    # Cada serie lleva el pid del worker (en prefork cada uno expone las suyas)
+    import os
+    cliente.get("/buscar/", params={"query": "servidor"})
+    series = [l for l in cliente.get("/metrics").text.splitlines() if l and not l.startswith("#")]
+    assert series
+    assert all(f'pid="{os.getpid()}"' in l for l in series)
+
+
+@pytest.mark.parametrize("modo", ["lexical", "hybrid"])
+def test_codigo_exacto(cliente, modo):
+    # Solo el documento con el codigo completo, sin pasar por el modelo: la
+    # similitud coseno no se conoce y el puntaje es el de BM25
+    import BCP_app
+    BCP_app.cache_resultados.limpiar()
+    resultados = cliente.get("/buscar/", params={"query": "srv-0042", "k": 5, "mode": modo}).json()["resultados"]
+    assert [r["documento"].split("\t")[1] for r in resultados] == ["SRV-0042"]
+    assert resultados[0]["similitud"] is None and resultados[0]["puntaje"] > 0
+
+
+def test_codigo_inexistente_usa_la_fusion(cliente):
+    # Un codigo que no esta en el corpus no corta la busqueda: se fusiona con
+    # la semantica (con su similitud coseno) como cualquier consulta
+    import BCP_app
+    BCP_app.cache_resultados.limpiar()
+    resultados = cliente.get("/buscar/", params={"query": "srv-9999", "k": 5, "mode": "hybrid"}).json()["resultados"]
+    assert len(resultados) == 5
+    assert any(r["similitud"] is not None for r in resultados)
+    assert all(r["puntaje"] <= 2 / 61 for r in resultados)
+
+
+def test_semantica_puntaje_es_la_similitud(cliente):
+    resultados = cliente.get("/buscar/", params={"query": "servidor", "k": 3, "mode": "semantic"}).json()["resultados"]
+    assert all(r["puntaje"] == r["similitud"] for r in resultados)
+
+
+def test_lote_demasiadas_consultas_o_campos_desconocidos(cliente):
+    import BCP_app
+    consultas = ["servidor"] * (BCP_app.MAX_CONSULTAS_LOTE + 1)
+    assert cliente.post("/buscar/batch", json={"consultas": consultas}).status_code == 400
+    respuesta = cliente.post("/buscar/batch", json={"consultas": ["servidor"], "campos": "id,color"})
+    assert respuesta.status_code == 400 and "color" in respuesta.json()["detail"]
+    assert cliente.post("/buscar/batch", json={"consultas": []}).json() == {"resultados": []}
+
+
+def test_paginas_con_cursor(cliente):
+    # Las paginas seguidas dan lo mismo que una sola busqueda mas profunda
+    completa = cliente.get("/buscar/", params={"query": "servidor", "k": 6}).json()["resultados"]
+    primera = cliente.get("/buscar/", params={"query": "servidor", "k": 3}).json()
+    segunda = cliente.get("/buscar/", params={"cursor": primera["siguiente"]}).json()
+    assert segunda["desde"] == 3
+    assert [r["id"] for r in primera["resultados"] + segunda["resultados"]] == [r["id"] for r in completa]
+
+
+@pytest.mark.parametrize("parametros", [{"cursor": "no-es-un-cursor"}, {"cursor": "e30"}, {},
+                                        {"query": "servidor", "k": 1001}, {"query": "x", "mode": "lexical",
+                                                                           "min_similitud": 0.5}])
+def test_busqueda_invalida(cliente, parametros):
+    # Cursor ilegible o sin sus claves ("e30" es {}), sin query, mas de
+    # MAX_PROFUNDIDAD resultados, o min_similitud en modo lexical
+    assert cliente.get("/buscar/", params=parametros).status_code == 400
+
+
+def test_cursor_y_cache_de_otra_version(cliente):
+    # Al cambiar el indice: el cursor de la version anterior responde 409 y
+    # los resultados en cache se descartan (el documento nuevo aparece)
+    import BCP_app
+    params = {"query": "Servidor numero 7", "k": 2, "mode": "lexical"}
+    primera = cliente.get("/buscar/", params=params).json()
+    assert cliente.get("/buscar/", params=params).json() == primera
+    assert len(BCP_app.cache_resultados.datos) > 0
+    version = cliente.get("/stats/cache").json()["version_indice"]
+
+    nuevo = cliente.post("/documentos", json={"documento": "YAPE\tSRV-0500\tServidor numero 7 7 7"}).json()["id"]
+    try:
+        assert cliente.get("/stats/cache").json()["version_indice"] == version + 1
+        assert not BCP_app.cache_resultados.datos
+        assert cliente.get("/buscar/", params={"cursor": primera["siguiente"]}).status_code == 409
+        assert cliente.get("/buscar/", params=params).json()["resultados"][0]["id"] == nuevo
+    finally:
+        assert cliente.delete(f"/documentos/{nuevo}").status_code == 200
+    assert nuevo not in [r["id"] for r in cliente.get("/buscar/", params=params).json()["resultados"]]
+    assert cliente.delete(f"/documentos/{nuevo}").status_code == 404
+
+
+@pytest.mark.parametrize("fusion", ["rrf", "ponderada"])
+def test_hibrido_combina_bm25_y_semantica(cliente, fusion):
+    # "123" solo aparece en un documento: BM25 lo trae primero y la fusion
+    # lo sube al principio junto a los mejores de la semantica
+    import BCP_app
+    exacto = [i for i, _ in BCP_app.indice_lexico.buscar("123", 10)]
+    semantica = cliente.get("/buscar/", params={"query": "123", "k": 10, "mode": "semantic"}).json()["resultados"]
+    resultados = cliente.get("/buscar/", params={"query": "123", "k": 10, "mode": "hybrid",
+                                                 "fusion": fusion}).json()["resultados"]
+    assert len(exacto) == 1 and len(resultados) == 10
+    assert exacto[0] in [r["id"] for r in resultados[:2]]
+    assert {r["id"] for r in resultados} <= set(exacto) | {r["id"] for r in semantica}
+    assert [r["puntaje"] for r in resultados] == sorted((r["puntaje"] for r in resultados), reverse=True)
+    # La similitud es la coseno de la busqueda semantica (None si no vino de FAISS)
+    cosenos = {r["id"]: r["similitud"] for r in semantica}
+    assert all(r["similitud"] == cosenos.get(r["id"]) for r in resultados)
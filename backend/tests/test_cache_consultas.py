@@ -0,0 +1,38 @@
+import cache_consultas
+from cache_consultas import CacheLRU, normalizar_consulta
+
+
+def test_expira_despues_del_ttl(monkeypatch):
+    ahora = [100.0]
+    monkeypatch.setattr(cache_consultas.time, "monotonic", lambda: ahora[0])
+    cache = CacheLRU(maximo=4, ttl_segundos=10)
+    cache.guardar("a", 1)
+    ahora[0] += 10
+    assert cache.obtener("a") == 1
+    ahora[0] += 0.5
+    assert cache.obtener("a") is None
+    assert cache.estadisticas()["expirados"] == 1 and "a" not in cache.datos
+
+    # ttl 0: sin expiracion
+    cache = CacheLRU(maximo=4, ttl_segundos=0)
+    cache.guardar("a", 1)
+    ahora[0] += 1e6
+    assert cache.obtener("a") == 1
+
+
+def test_desaloja_el_menos_usado():
+    cache = CacheLRU(maximo=2, ttl_segundos=0)
+    cache.guardar("a", 1)
+    cache.guardar("b", 2)
+    assert cache.obtener("a") == 1
+    cache.guardar("c", 3)
+    assert list(cache.datos) == ["a", "c"]
+    assert cache.estadisticas()["desalojos"] == 1
+    cache = CacheLRU(maximo=0)
+    cache.guardar("a", 1)
+    assert cache.obtener("a") is None
+
+
+def test_normalizar_consulta():
+    assert normalizar_consulta("  SRV   yap\t7 ") == "SRV yap 7"
+    assert normalizar_consulta("  SRV   yap ", minusculas=True) == "srv yap"
@@ -0,0 +1,60 @@
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import coordinador
+from particiones import ARCHIVO_MANIFIESTO
+
+URLS = ["http://shard-0", "http://shard-1", "http://shard-2"]
+
+
+def escribir_manifiesto(carpeta, clave):
+    proyectos = [["YAPE"], ["MBBK"], ["CANALES"]] if clave == "proyecto" else [None] * len(URLS)
+    manifiesto = {"clave": clave, "origen": "documentos.txt",
+                  "shards": [{"documentos": f"shard-{i}.txt", "indice": f"indice-{i}", "cantidad": 1,
+                              "proyectos": proyectos[i]} for i in range(len(URLS))]}
+    (carpeta / ARCHIVO_MANIFIESTO).write_text(json.dumps(manifiesto), encoding="utf-8")
+
+
+@pytest.fixture
+def consultados(monkeypatch):
+    # Shards simulados: cada uno devuelve un resultado y anota que fue consultado
+    hosts = []
+
+    def responder(peticion):
+        host = peticion.url.host
+        hosts.append(host)
+        resultado = {"id": URLS.index(f"http://{host}"), "similitud": 0.5, "puntaje": 0.5,
+                     "documento": host}
+        if peticion.method == "POST":
+            consultas = json.loads(peticion.content)["consultas"]
+            return httpx.Response(200, json={"resultados": [{"consulta": c, "resultados": [resultado]}
+                                                            for c in consultas]})
+        return httpx.Response(200, json={"modo": "semantic", "resultados": [resultado]})
+
+    cliente_real = httpx.AsyncClient
+    monkeypatch.setattr(coordinador.httpx, "AsyncClient",
+                        lambda **kw: cliente_real(transport=httpx.MockTransport(responder), **kw))
+    yield hosts
+    coordinador.configurar([])
+
+
+@pytest.mark.parametrize("clave, esperados", [("hash", {"shard-0", "shard-1", "shard-2"}),
+                                              ("proyecto", {"shard-1"})])
+def test_proyecto_segun_la_clave_del_manifiesto(tmp_path, consultados, clave, esperados):
+    # Con clave=hash cualquier shard puede tener el proyecto: se consultan todos
+    escribir_manifiesto(tmp_path, clave)
+    coordinador.configurar(URLS, str(tmp_path))
+    with TestClient(coordinador.app) as cliente:
+        respuesta = cliente.get("/buscar/", params={"query": "pago", "k": 5, "proyecto": "MBBK"})
+        assert respuesta.status_code == 200
+        assert respuesta.json()["shards"]["consultados"] == len(esperados)
+        assert set(consultados) == esperados
+
+        consultados.clear()
+        respuesta = cliente.post("/buscar/batch", json={"consultas": ["pago"], "k": 5, "proyecto": "MBBK"})
+        assert respuesta.status_code == 200
+        assert len(respuesta.json()["resultados"][0]["resultados"]) == len(esperados)
+        assert set(consultados) == esperados
@@ -0,0 +1,40 @@
+import numpy as np
+
+from indice_recursos import IndiceRecursos, texto_recurso
+from test_almacen import codificar
+
+
+def recurso(i, ubicacion="eastus2"):
+    return {"id": f"/subscriptions/0/providers/Microsoft.Network/azureFirewalls/fwl-yap-{i:03d}",
+            "name": f"fwl-yap-{i:03d}", "type": "Microsoft.Network/azureFirewalls", "location": ubicacion}
+
+
+class Codificador:
+    def __init__(self):
+        self.textos = []
+
+    def __call__(self, textos):
+        self.textos.extend(textos)
+        return codificar(textos)
+
+
+def test_vectores_de_se_guardan(tmp_path):
+    ruta = str(tmp_path / "indice_recursos")
+    codificador = Codificador()
+    inventario = [recurso(i) for i in range(10)]
+    IndiceRecursos(codificador, "prueba", ruta).vectores(inventario)
+
+    # Cambio incremental: uno modificado y uno nuevo
+    cambio = [recurso(3, "centralus"), recurso(10)]
+    indice = IndiceRecursos(codificador, "prueba", ruta)
+    matriz = indice.vectores_de(cambio)
+    assert codificador.textos[10:] == [texto_recurso(r) for r in cambio]
+    assert np.allclose(matriz, codificar([texto_recurso(r) for r in cambio]))
+
+    # Despues de reiniciar no se vuelven a codificar
+    inventario = inventario[:3] + [cambio[0]] + inventario[4:] + [cambio[1]]
+    reiniciado = IndiceRecursos(codificador, "prueba", ruta)
+    assert reiniciado.estadisticas()["recursos"] == 11
+    completa = reiniciado.vectores(inventario)
+    assert len(codificador.textos) == 12
+    assert np.allclose(completa, codificar([texto_recurso(r) for r in inventario]))
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import lexico
+from campos import ColumnasDocumentos
+from lexico import IndiceBM25
+
+CONSULTAS = ["servidor", "firewall yape", "srv-0007", "base de datos mbbk", "0150", "numero 21"]
+
+
+def documentos(inicio, fin):
+    activos = ["Servidor", "Firewall", "Base de datos"]
+    return [f"{'YAPE' if i % 3 else 'MBBK'}\tSRV-{i:04d}\t{activos[i % 3]} numero {i}" for i in range(inicio, fin)]
+
+
+def puntajes(indice, **filtros):
+    # {id: puntaje redondeado} de todos los documentos con puntaje (el orden
+    # entre empates no importa)
+    return [{i: round(p, 4) for i, p in indice.buscar(c, 1000, filtros or None)} for c in CONSULTAS]
+
+
+@pytest.mark.parametrize("max_delta", [4096, 3])
+def test_actualizado_igual_a_reconstruir(monkeypatch, max_delta):
+    monkeypatch.setattr(lexico, "MAX_TOKENS_DELTA", max_delta)
+    textos = documentos(0, 200)
+    ids = np.arange(len(textos))
+    indice = IndiceBM25(ids[:150], textos[:150], ColumnasDocumentos.desde_textos(textos[:150]))
+
+    # Agregar al final y eliminar (tambien filas recien agregadas), sin reconstruir
+    eliminadas = [3, 40, 149, 160]
+    vigentes = [i for i in range(200) if i not in eliminadas]
+    columnas = ColumnasDocumentos.desde_textos(textos).sin_filas(eliminadas)
+    documentos_vigentes = {i: textos[i] for i in vigentes}
+    for fin in (170, 200):
+        indice = indice.actualizado(ids[:fin], documentos_vigentes, columnas,
+                                    [f for f in eliminadas if f < fin])
+    # Mismos puntajes que un indice construido solo con los vigentes
+    textos_vigentes = [textos[i] for i in vigentes]
+    esperado = IndiceBM25(vigentes, textos_vigentes, ColumnasDocumentos.desde_textos(textos_vigentes))
+    assert puntajes(indice) == puntajes(esperado)
+    assert puntajes(indice, proyecto="MBBK") == puntajes(esperado, proyecto="MBBK")
+
+    # Un documento eliminado que vuelve se puede buscar otra vez
+    documentos_vigentes[40] = textos[40]
+    indice = indice.actualizado(ids, documentos_vigentes, columnas.con_filas([40]), [3, 149, 160])
+    assert 40 in dict(indice.buscar("srv-0040", 5))
+    assert indice.actualizado(ids[::-1], documentos_vigentes) is None
+
+
+def test_eliminado_al_construir_vuelve():
+    # Sin texto al construir (eliminado sin compactar): se tokeniza al volver
+    textos = documentos(0, 20)
+    indice = IndiceBM25(range(20), [None if i == 5 else t for i, t in enumerate(textos)])
+    assert 5 not in dict(indice.buscar("srv-0005", 5))
+    indice = indice.actualizado(np.arange(20), dict(enumerate(textos)))
+    assert next(iter(dict(indice.buscar("srv-0005", 5)))) == 5
+
+
+def test_tokenizar_conserva_codigos():
+    assert lexico.tokenizar("Firewall FWL-YAP-002 de Acción") == ["firewall", "fwl-yap-002", "fwl", "yap", "002",
+                                                                  "de", "accion"]
+    assert lexico.codigo_de(" FWL-YAP-002 ") == "fwl-yap-002"
+    assert lexico.codigo_de("firewall yape") is None
+
+
+def test_fusion_rrf():
+    # Cada lista aporta 1 / (60 + posicion); un documento en ambas suma los dos
+    fusion = dict(lexico.fusion_rrf([[(1, 0.9), (2, 0.8)], [(2, 7.0), (3, 1.0)]], 3))
+    assert list(fusion) == [2, 1, 3]
+    assert fusion[2] == pytest.approx(1 / 62 + 1 / 61)
+    assert fusion[1] == pytest.approx(1 / 61)
+
+
+def test_fusion_ponderada():
+    # alpha * coseno + (1 - alpha) * BM25 / maximo BM25
+    fusion = dict(lexico.fusion_ponderada([(1, 0.9), (2, 0.5)], [(2, 8.0), (3, 4.0)], 3, alpha=0.5))
+    assert fusion == pytest.approx({2: 0.75, 1: 0.45, 3: 0.25})
+    assert list(fusion) == [2, 1, 3]
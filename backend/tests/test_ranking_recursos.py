@@ -0,0 +1,15 @@
+from benchmarks.ranking_azure import CONSULTAS, inventario_sintetico, verificar_paridad
+from ranking_recursos import MotorRanking
+
+
+def test_paridad_con_el_ranking_del_frontend():
+    recursos = inventario_sintetico(3000)
+    assert verificar_paridad(MotorRanking(recursos), recursos, CONSULTAS) == []
+
+
+def test_umbral_con_el_redondeo_del_frontend():
+    # 1 de 4 caracteres en comun: 0.075, que el frontend muestra como "0.07"
+    motor = MotorRanking([{"id": "1", "name": "x-a", "type": "t", "location": "l"}])
+    assert motor.puntuar("abcd").tolist() == [0.075]
+    assert motor.buscar("abcd", None, 0.08) == (0, [])
+    assert motor.buscar("abcd", None, 0.07)[0] == 1
@@ -0,0 +1,55 @@
+import pytest
+
+import registro_inventario
+from registro_inventario import HistorialIncompleto, RegistroInventario, resumir_cambios
+
+DESTINO = ("sub-0", "rsg001")
+
+
+def recurso(nombre, **extra):
+    return dict({"id": f"/subscriptions/sub-0/resourceGroups/RSG001/providers/x/{nombre}", "name": nombre,
+                 "subscriptionId": "sub-0", "resourceGroup": "RSG001"}, **extra)
+
+
+def test_cambios_desde_una_secuencia(tmp_path):
+    registro = RegistroInventario(str(tmp_path / "inventario.sqlite"))
+    assert registro.aplicar({DESTINO: [recurso("a"), recurso("b")]}, [DESTINO]) == \
+        {"alta": 2, "modificacion": 0, "baja": 0}
+    cambios, ultima = registro.cambios_desde(0)
+    assert ultima == 2 and [c[1] for c in cambios] == ["alta", "alta"]
+
+    # Sin cambios no se escribe nada; un listado delta no da de baja
+    assert registro.aplicar({DESTINO: [recurso("a"), recurso("b")]}, [DESTINO])["alta"] == 0
+    assert registro.aplicar({DESTINO: [recurso("a", tags={"x": "1"})]}) == {"alta": 0, "modificacion": 1, "baja": 0}
+    assert registro.aplicar({DESTINO: [recurso("a", tags={"x": "1"})]}, [DESTINO])["baja"] == 1
+
+    cambios, ultima = registro.cambios_desde(2)
+    assert ultima == 4 and [(c[0], c[1]) for c in cambios] == [(3, "modificacion"), (4, "baja")]
+    assert registro.cambios_desde(2, limite=1)[0][0][0] == 3
+    assert registro.cambios_desde(4) == ([], 4)
+    tocados, vigentes = resumir_cambios(registro.cambios_desde(0)[0])
+    assert len(tocados) == 2 and [r["name"] for r in vigentes] == ["a"]
+
+    # La foto guardada es la ultima version de cada recurso
+    recursos, secuencia, actualizado = registro.cargar()
+    assert secuencia == 4 and actualizado is not None
+    assert [r["tags"] for r in recursos.values()] == [{"x": "1"}]
+
+
+def test_historial_incompleto(tmp_path, monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(registro_inventario.time, "time", lambda: ahora[0])
+    registro = RegistroInventario(str(tmp_path / "inventario.sqlite"), max_cambios=2)
+    for i in range(4):
+        ahora[0] += 10
+        registro.aplicar({DESTINO: [recurso(f"r{i}")]})
+    # Solo quedan los cambios 3 y 4: desde 1 ya no se puede seguir
+    with pytest.raises(HistorialIncompleto):
+        registro.cambios_desde(1)
+    assert [c[0] for c in registro.cambios_desde(2)[0]] == [3, 4]
+
+    # Por instante: antes del primer cambio que queda pudo perderse alguno
+    with pytest.raises(HistorialIncompleto):
+        registro.cambios_desde(desde_momento=1025)
+    assert [c[0] for c in registro.cambios_desde(desde_momento=1030)[0]] == [3, 4]
+    assert [c[0] for c in registro.cambios_desde(desde_momento=1035)[0]] == [4]
@@ -0,0 +1,70 @@
+#------------------------------------------------------
+#----Respuestas por partes (NDJSON / SSE)--------------
+#------------------------------------------------------
+# Para listas grandes (inventario de Azure y sus busquedas) la respuesta se
+# envia a medida que se serializa, en lugar de armar un solo JSON:
+#   formato=ndjson -> application/x-ndjson, una linea JSON por evento
+#                     ({"evento": tipo, ...datos})
+#   formato=sse    -> text/event-stream, "event: tipo" + "data: {json}"
+# Eventos: primero "meta" (totales, errores, secuencia...), luego un
+# "recurso" por fila y al final "fin" con la cantidad enviada, o "error"
+# si la lista se corto a mitad de camino.
+#
+# Las filas se serializan por lotes de BCP_STREAM_LOTE en el threadpool de
+# Starlette; el primer lote es chico para que la primera fila llegue rapido
+# sin importar el tamaño de la lista.
+
+import json
+import os
+
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LOTE = int(os.environ.get("BCP_STREAM_LOTE", "500"))
+PRIMER_LOTE = 20
+
+TIPOS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def _evento(formato, tipo, datos):
+    texto = json.dumps(datos if formato == "sse" else {"evento": tipo, **datos}, ensure_ascii=False)
+    if formato == "sse":
+        return f"event: {tipo}\ndata: {texto}\n\n"
+    return texto + "\n"
+
+
+def _partes(formato, meta, filas):
+    yield _evento(formato, "meta", meta)
+    enviados, lote, tamano = 0, [], PRIMER_LOTE
+    try:
+        for fila in filas:
+            lote.append(_evento(formato, "recurso", fila))
+            if len(lote) >= tamano:
+                enviados += len(lote)
+                yield "".join(lote)
+                lote, tamano = [], LOTE
+        enviados += len(lote)
+        if lote:
+            yield "".join(lote)
+    except Exception as e:
+        # El estado HTTP ya se envio: el error va como ultimo evento
+        print(f"Error al transmitir la respuesta: {str(e)}")
+        yield _evento(formato, "error", {"error": str(e), "enviados": enviados})
+        return
+    yield _evento(formato, "fin", {"enviados": enviados})
+
+
+def responder_por_partes(formato, meta, filas):
+    # filas: iterable (puede ser un generador que filtra mientras se envia)
+    encabezados = {"Cache-Control": "no-cache"}
+    if formato == "sse":
+        # Sin buffer en proxies (nginx)
+        encabezados["X-Accel-Buffering"] = "no"
+    return StreamingResponse(_partes(formato, meta, filas), media_type=TIPOS[formato], headers=encabezados)
+
+
+def responder_error(formato, mensaje):
+    # Mismo contenido que la respuesta JSON de error ({"error": ...}), como
+    # unico evento si se pidio por partes
+    if formato == "json":
+        return JSONResponse({"error": mensaje})
+    return StreamingResponse(iter([_evento(formato, "error", {"error": mensaje})]), media_type=TIPOS[formato])
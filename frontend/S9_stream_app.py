@@ -1,7 +1,7 @@
 import streamlit as st
-import requests
 from streamlit_lottie import st_lottie
 import json
+from cliente_api import obtener_json
 
 #--------------
 #Animación
@@ -37,6 +37,9 @@ consulta = st.text_input(
 
 k = st.slider("Número de resultados", min_value=1, max_value=5, value=3)
 
+# Tiempos por etapa del backend (encabezado Server-Timing)
+mostrar_tiempos = st.sidebar.checkbox("Mostrar tiempos del servidor")
+
 if st.button("Buscar"):
     if not consulta.strip():
         st.warning("Por favor, ingresa una consulta válida.")
@@ -50,15 +53,23 @@ if st.button("Buscar"):
                 # Imprimir el contenido final de 'consulta'
                 st.write("Consulta final:", consulta)
                 
-                url = f"http://127.0.0.1:8000/buscar/?query={consulta}&k={k}"
-                response = requests.get(url)
-                data = response.json()
+                # requests codifica los parametros (espacios, "&", tildes...);
+                # la misma consulta dentro del TTL sale de la cache
+                data, tiempos = obtener_json("/buscar/", {"query": consulta, "k": k}, mostrar_tiempos)
 
                 st.subheader("📄Resultados encontrados:")
                 for i, r in enumerate(data["resultados"]):
+                    # En modo lexical/hybrid la similitud coseno puede faltar: se
+                    # muestra el puntaje del ranking (BM25 o fusion)
+                    if r.get('similitud') is not None:
+                        valor = f"_Similitud:_ **{r['similitud']:.2f}**"
+                    else:
+                        valor = f"_Puntaje:_ **{r['puntaje']:.4f}**"
                     st.markdown(f"""
                         **{i+1}.** *{r['documento']}*
-                        _Similitud:_ **{r['similitud']:.2f}**
+                        {valor}
                     """)
+                if mostrar_tiempos and tiempos:
+                    st.caption(f"Tiempos del servidor: {tiempos}")
             except Exception as e:
                 st.error(f"Ocurrió un error: {e}")
\ No newline at end of file
@@ -1,7 +1,8 @@
 import streamlit as st
 import requests
+import numpy as np
 import pandas as pd
-import re
+from cliente_api import ErrorBackend, obtener_por_partes
 
 # Interfaz de Streamlit
 st.set_page_config(
@@ -28,6 +29,21 @@ if 'resources_data' not in st.session_state:
 if 'busqueda_realizada' not in st.session_state:
     st.session_state.busqueda_realizada = False
 
+if 'tipo_aplicado' not in st.session_state:
+    st.session_state.tipo_aplicado = None
+
+if 'tabla' not in st.session_state:
+    st.session_state.tabla = None
+
+if 'total_recursos' not in st.session_state:
+    st.session_state.total_recursos = 0
+
+if 'tiempos_servidor' not in st.session_state:
+    st.session_state.tiempos_servidor = ""
+
+if 'grupos_con_error' not in st.session_state:
+    st.session_state.grupos_con_error = {}
+
 # Campo para buscar recursos específicos
 search_term = st.text_input("Buscar recurso:", placeholder="Escriba el nombre del recurso a buscar")
 
@@ -50,138 +66,105 @@ if st.session_state.recursos_mismo_nombre:
     tipo_seleccionado = st.selectbox("Seleccione el tipo:", tipos, key="selector_tipo", on_change=on_tipo_change)
     st.session_state.tipo_seleccionado = tipo_seleccionado
 
-# Función simplificada para calcular similitud basada en subcadenas
-def calcular_similitud(recurso, busqueda, tipo_filtro=None):
-    if not busqueda:
-        return 0
-    
-    # Convertir a minúsculas para comparación insensible a mayúsculas
-    busqueda = busqueda.lower()
-    nombre = recurso['Nombre'].lower()
-    tipo = recurso['Tipo'].lower()
-    ubicacion = recurso['Ubicación'].lower()
-    
-    # Si hay un filtro de tipo y no coincide, devolver 0
-    if tipo_filtro and tipo_filtro.lower() != tipo:
-        return 0
-    
-    # Calcular puntuación de similitud para diferentes casos
-    score = 0
-    
-    # 1. Coincidencia exacta en nombre (máxima prioridad)
-    if nombre == busqueda:
-        if tipo_filtro and tipo == tipo_filtro.lower():
-            return 1.0  # Coincidencia perfecta de nombre y tipo
-        return 0.9  # Solo nombre coincide exactamente
-    
-    # 2. Nombre comienza con el término de búsqueda
-    if nombre.startswith(busqueda):
-        score = max(score, 0.8)
-    
-    # 3. El término es una palabra completa en el nombre
-    if re.search(r'\b' + re.escape(busqueda) + r'\b', nombre):
-        score = max(score, 0.7)
-    
-    # 4. El término está contenido en el nombre
-    if busqueda in nombre:
-        score = max(score, 0.6)
-    
-    # 5. Coincidencias en tipo (menor prioridad que el nombre)
-    if busqueda in tipo:
-        score = max(score, 0.5)
-    
-    # 6. Coincidencias en ubicación
-    if busqueda in ubicacion:
-        score = max(score, 0.4)
-    
-    # 7. Coincidencia parcial de caracteres en nombre
-    chars_en_comun = sum(1 for c in busqueda if c in nombre)
-    if len(busqueda) > 0:
-        proporcion = chars_en_comun / len(busqueda)
-        score = max(score, proporcion * 0.3)
-    
-    return score
+# El ranking de similitud se calcula en el backend (/azure-resources/search),
+# aquí solo se piden los mejores resultados. Las respuestas quedan en la
+# cache de cliente_api: cambiar el umbral o el tipo no vuelve a consultar
+LIMITE_RESULTADOS = 200
+
+# Tiempos por etapa del backend (encabezado Server-Timing)
+mostrar_tiempos = st.sidebar.checkbox("Mostrar tiempos del servidor")
+
+def fila_recurso(resource):
+    fila = {
+        "Nombre": resource['name'],
+        "Tipo": resource['type'],
+        "Grupo": resource.get('resourceGroup', 'N/A'),
+        "Ubicación": resource.get('location', 'N/A'),
+        "Similitud": resource.get('similitud', 0.0)
+    }
+    # En modo híbrido el backend también devuelve la similitud semántica
+    if 'similitud_semantica' in resource:
+        fila["Semántica"] = f"{resource['similitud_semantica']:.2f}"
+    return fila
+
+def obtener_recursos(busqueda):
+    # Los recursos llegan por partes y la tabla se va mostrando mientras llegan
+    if busqueda:
+        ruta, params = "/azure-resources/search", {"q": busqueda, "umbral": 0.0, "limit": LIMITE_RESULTADOS}
+    else:
+        ruta, params = "/azure-resources/", {}
+    meta, recursos, st.session_state.tiempos_servidor = obtener_por_partes(ruta, params, mostrar_tiempos)
+    # Grupos que fallaron en el último refresco (se muestran sus recursos anteriores)
+    st.session_state.grupos_con_error = meta.get("errores") or {}
+    resources_data = [fila_recurso(r) for r in recursos]
+    return {"resources": resources_data, "total": meta.get("recursos_totales") or meta.get("total") or len(resources_data)}
+
+def filtrar_por_tipo(resources_data, busqueda, tipo_filtro):
+    # Mismo ranking que pedir tipo= al backend, sobre los resultados ya
+    # recibidos: solo quedan los de ese tipo y el nombre exacto sube a 1.0
+    filas = []
+    for fila in resources_data:
+        if fila["Tipo"].lower() != tipo_filtro.lower():
+            continue
+        if fila["Nombre"].lower() == busqueda.lower():
+            fila = dict(fila, Similitud=1.0)
+        filas.append(fila)
+    return filas
+
+def armar_tabla(resources_data):
+    # DataFrame ordenado por similitud (redondeada como se muestra); se arma
+    # una vez por resultado, no en cada cambio del umbral
+    df = pd.DataFrame(resources_data, columns=None if resources_data else ["Nombre", "Tipo", "Grupo", "Ubicación", "Similitud"])
+    df["Similitud"] = df["Similitud"].astype(float).round(2)
+    return df.sort_values(by="Similitud", ascending=False, kind="stable")
+
+# Con tablas más grandes no se colorean las filas (el estilo es por celda)
+MAX_FILAS_CON_ESTILO = 5000
 
 # Función para procesar datos y mostrar resultados
-def procesar_resultados(search_original, resources_data, tipo_seleccionado, umbral_similitud):
-    # Si hay un término de búsqueda, calculamos similitud
-    recursos_similitud = []
-    
-    # Calcular similitud para cada recurso con la función simplificada
-    for i, resource in enumerate(resources_data):
-        # Calcular similitud considerando el tipo seleccionado
-        similitud = calcular_similitud(resource, search_original, tipo_seleccionado)
-        
-        # Guardar índice y similitud
-        recursos_similitud.append((i, similitud))
-    
-    # Ordenar por similitud (mayor a menor)
-    recursos_similitud.sort(key=lambda x: x[1], reverse=True)
-    
-    # Añadir columna de similitud al DataFrame
-    similitudes_dict = {i: sim for i, sim in recursos_similitud}
+def procesar_resultados(search_original, df, tipo_seleccionado, umbral_similitud, total_recursos):
+    # Indicar si supera el umbral (operación sobre la columna, sin recorrer filas)
+    coincide = (df["Similitud"] >= umbral_similitud).to_numpy()
+    df = df.assign(Coincide=np.where(coincide, "✓", ""))
+    n_coincidentes = int(coincide.sum())
     
-    # Crear nuevo DataFrame con similitud
-    recursos_con_similitud = []
-    for i, resource in enumerate(resources_data):
-        sim = similitudes_dict.get(i, 0)
-        recurso_con_sim = resource.copy()
-        # Mostrar similitud como porcentaje redondeado
-        recurso_con_sim["Similitud"] = f"{sim:.2f}"
-        # Indicar si supera el umbral
-        recurso_con_sim["Coincide"] = "✓" if sim >= umbral_similitud else ""
-        recursos_con_similitud.append(recurso_con_sim)
-    
-    # Si hay resultados con alguna similitud por encima del umbral
-    recursos_coincidentes = [r for r in recursos_con_similitud if float(r["Similitud"]) >= umbral_similitud]
-    
-    if recursos_coincidentes:
+    if n_coincidentes:
         if tipo_seleccionado:
-            st.success(f"Se encontraron {len(recursos_coincidentes)} recursos de tipo '{tipo_seleccionado}' con similitud ≥{umbral_similitud}")
+            st.success(f"Se encontraron {n_coincidentes} recursos de tipo '{tipo_seleccionado}' con similitud ≥{umbral_similitud}")
         else:
-            st.success(f"Se encontraron {len(recursos_coincidentes)} recursos con similitud ≥{umbral_similitud} de un total de {len(resources_data)}")
+            st.success(f"Se encontraron {n_coincidentes} recursos con similitud ≥{umbral_similitud} de un total de {total_recursos}")
     else:
-        st.warning(f"No se encontraron recursos con similitud ≥{umbral_similitud}, mostrando todos los recursos ({len(resources_data)})")
-    
-    # Crear DataFrame final
-    df = pd.DataFrame(recursos_con_similitud)
+        st.warning(f"No se encontraron recursos con similitud ≥{umbral_similitud}, mostrando los {len(df)} más parecidos")
     
-    # Ordenar por similitud
-    if "Similitud" in df.columns:
-        df["Similitud"] = df["Similitud"].astype(float)
-        df = df.sort_values(by="Similitud", ascending=False)
-    
-    # Función para aplicar estilos según la similitud
-    def highlight_matches(row):
-        # Convertir valor de similitud a float
-        sim = float(row["Similitud"])
-        
-        # Si supera el umbral, aplicar estilo
-        if sim >= umbral_similitud:
-            return ['background-color: #2c3e50; color: white'] * len(row)
-        else:
-            return [''] * len(row)
+    # Estilo de las filas que superan el umbral, calculado para toda la tabla a la vez
+    def highlight_matches(tabla):
+        estilo = np.where(coincide, 'background-color: #2c3e50; color: white', '')
+        return pd.DataFrame(np.repeat(estilo[:, None], tabla.shape[1], axis=1),
+                            index=tabla.index, columns=tabla.columns)
     
     # Mostrar DataFrame con estilos
-    st.dataframe(df.style.apply(highlight_matches, axis=1), use_container_width=True)
+    if n_coincidentes and len(df) <= MAX_FILAS_CON_ESTILO:
+        st.dataframe(df.style.apply(highlight_matches, axis=None), use_container_width=True)
+    else:
+        st.dataframe(df, use_container_width=True)
     
     # Añadir botón para copiar solo el recurso con mayor similitud
-    if recursos_coincidentes:
+    if n_coincidentes:
         st.subheader("Recurso con mayor similitud:")
-        mejor_recurso = recursos_coincidentes[0]  # El primero es el de mayor similitud
+        mejor_recurso = df.iloc[int(np.argmax(coincide))]  # El primero es el de mayor similitud
         
         # Mostrar información más completa del recurso
         st.markdown(f"""
         **Nombre:** {mejor_recurso['Nombre']}  
         **Tipo:** {mejor_recurso['Tipo']}  
         **Ubicación:** {mejor_recurso['Ubicación']}  
-        **Similitud:** {mejor_recurso['Similitud']}
+        **Similitud:** {mejor_recurso['Similitud']:.2f}
         """)
         
         # Código para copiar
         st.code(mejor_recurso['Nombre'], language="bash")
     
-    return recursos_coincidentes
+    return n_coincidentes
 
 if buscar_btn:
     # Reiniciar algunos valores al hacer una nueva búsqueda
@@ -191,54 +174,56 @@ if buscar_btn:
     
     with st.spinner("Buscando recursos..."):
         try:
-            # Siempre obtener todos los recursos
-            url = "http://127.0.0.1:8000/azure-resources/"
-            
-            # Primero hacemos la búsqueda sin filtro para obtener todos los recursos
-            response = requests.get(url, timeout=10)
-            data_all = response.json()
+            # El backend devuelve los recursos ya ordenados por similitud
+            data_all = obtener_recursos(search_term)
             
             # Mostrar resultados
-            if "error" in data_all:
-                st.error(f"Error: {data_all['error']}")
+            if not data_all["resources"]:
+                st.warning("No se encontraron recursos")
             else:
-                if not data_all["resources"]:
-                    st.warning("No se encontraron recursos")
-                else:
-                    # Crear una tabla para mostrar todos los recursos
-                    resources_data = []
-                    for resource in data_all['resources']:
-                        resources_data.append({
-                            "Nombre": resource['name'],
-                            "Tipo": resource['type'],
-                            "Ubicación": resource.get('location', 'N/A')
-                        })
-                    
-                    st.session_state.resources_data = resources_data
-                    
-                    if search_term:
-                        # Verificar si hay recursos con nombres idénticos
-                        nombres_recursos = [r['Nombre'].lower() for r in resources_data]
-                        nombres_repetidos = {nombre for nombre in nombres_recursos if nombres_recursos.count(nombre) > 1}
-                        
-                        # Comprobar si la búsqueda coincide exactamente con algún nombre repetido
-                        if search_term.lower() in nombres_repetidos:
-                            # Encontrar todos los recursos con ese nombre
-                            recursos_mismo_nombre = [r for r in resources_data if r['Nombre'].lower() == search_term.lower()]
-                            st.session_state.recursos_mismo_nombre = recursos_mismo_nombre
-                    
-                    st.session_state.busqueda_realizada = True
+                resources_data = data_all["resources"]
+                st.session_state.resources_data = resources_data
+                st.session_state.total_recursos = data_all["total"]
+                st.session_state.tabla = armar_tabla(resources_data)
+                st.session_state.tipo_aplicado = None
+                
+                if search_term:
+                    # Verificar si hay recursos con nombres idénticos (las
+                    # coincidencias exactas son las primeras del ranking)
+                    recursos_mismo_nombre = [r for r in resources_data if r['Nombre'].lower() == search_term.lower()]
+                    if len(recursos_mismo_nombre) > 1:
+                        st.session_state.recursos_mismo_nombre = recursos_mismo_nombre
+                
+                st.session_state.busqueda_realizada = True
         
+        except ErrorBackend as e:
+            st.error(f"Error: {str(e)}")
         except requests.exceptions.ConnectionError:
             st.error("Error de conexión: No se pudo conectar con el servidor backend")
         except Exception as e:
             st.error(f"Error inesperado: {str(e)}")
 
+# Si cambió el tipo seleccionado, se vuelve a rankear lo ya recibido (sin
+# consultar al backend)
+if (st.session_state.busqueda_realizada and st.session_state.search_original
+        and st.session_state.tipo_seleccionado != st.session_state.tipo_aplicado):
+    filas = st.session_state.resources_data
+    if st.session_state.tipo_seleccionado:
+        filas = filtrar_por_tipo(filas, st.session_state.search_original, st.session_state.tipo_seleccionado)
+    st.session_state.tabla = armar_tabla(filas)
+    st.session_state.tipo_aplicado = st.session_state.tipo_seleccionado
+
 # Procesar resultados si hay una búsqueda realizada o si se ha cambiado el tipo
-if st.session_state.busqueda_realizada and st.session_state.resources_data:
+if st.session_state.busqueda_realizada and st.session_state.tabla is not None:
     procesar_resultados(
         st.session_state.search_original, 
-        st.session_state.resources_data, 
+        st.session_state.tabla, 
         st.session_state.tipo_seleccionado, 
-        umbral_similitud
-    )
\ No newline at end of file
+        umbral_similitud,
+        st.session_state.total_recursos
+    )
+    if st.session_state.grupos_con_error:
+        st.warning("No se pudieron actualizar algunos grupos (se muestran sus recursos anteriores): "
+                   + ", ".join(st.session_state.grupos_con_error))
+    if mostrar_tiempos and st.session_state.tiempos_servidor:
+        st.caption(f"Tiempos del servidor: {st.session_state.tiempos_servidor}")
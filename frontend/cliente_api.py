@@ -0,0 +1,170 @@
+#------------------------------------------------------
+#----Acceso al backend desde las apps de Streamlit-----
+#------------------------------------------------------
+# - Una sola requests.Session por proceso (st.cache_resource) con un pool
+#   de conexiones keep-alive, en lugar de abrir una conexion TCP por cada
+#   rerun de Streamlit
+# - Respuestas en cache por ruta y parametros durante BCP_FRONT_TTL
+#   segundos: repetir una consulta (o volver a una anterior) no vuelve a
+#   llamar al backend. Los errores no se cachean.
+# - Lectura por partes (NDJSON) de las listas de recursos, mostrando la
+#   tabla parcial mientras llegan. Solo se cachean las listas completas
+#   (las que terminan con el evento "fin"), y solo los datos: la tabla
+#   parcial se dibuja fuera de la cache
+#
+#   BCP_API_URL=http://127.0.0.1:8000
+#   BCP_FRONT_TTL=60
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+API_URL = os.environ.get("BCP_API_URL", "http://127.0.0.1:8000")
+TTL = int(os.environ.get("BCP_FRONT_TTL", "60"))
+
+# (conexion, lectura); en las lecturas por partes el de lectura aplica
+# entre partes, no a la respuesta completa
+TIMEOUT = (5, 30)
+
+# Listas completas guardadas (cada una puede tener miles de recursos)
+MAX_LISTAS = 32
+
+
+class ErrorBackend(Exception):
+    # El backend respondio con un error (no se guarda en la cache)
+    pass
+
+
+class ListasRecibidas:
+    # Cache LRU con TTL de las listas leidas por partes, compartida entre
+    # sesiones como st.cache_data (que no sirve aqui: al leer se dibuja)
+    def __init__(self, maximo=MAX_LISTAS, ttl=TTL):
+        self.maximo = maximo
+        self.ttl = ttl
+        self.datos = OrderedDict()
+        self.lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self.lock:
+            entrada = self.datos.get(clave)
+            if entrada is None or time.monotonic() - entrada[1] > self.ttl:
+                self.datos.pop(clave, None)
+                return None
+            self.datos.move_to_end(clave)
+            return entrada[0]
+
+    def guardar(self, clave, valor):
+        with self.lock:
+            self.datos[clave] = (valor, time.monotonic())
+            self.datos.move_to_end(clave)
+            while len(self.datos) > self.maximo:
+                self.datos.popitem(last=False)
+
+
+@st.cache_resource
+def listas_recibidas():
+    return ListasRecibidas()
+
+
+@st.cache_resource
+def sesion():
+    s = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    s.mount("http://", adaptador)
+    s.mount("https://", adaptador)
+    return s
+
+
+def tiempos_servidor(response):
+    # "azure_sdk;dur=0.03, ranking;dur=0.16, total;dur=1.93" -> "azure_sdk 0.03 ms · ..."
+    partes = []
+    for parte in response.headers.get("Server-Timing", "").split(","):
+        nombre, _, duracion = parte.strip().partition(";dur=")
+        if nombre and duracion:
+            partes.append(f"{nombre} {float(duracion):.2f} ms")
+    return " · ".join(partes)
+
+
+def _encabezados(con_tiempos):
+    return {"X-Server-Timing": "1"} if con_tiempos else {}
+
+
+@st.cache_data(ttl=TTL, show_spinner=False)
+def obtener_json(ruta, params, con_tiempos=False):
+    # Devuelve (datos, tiempos del servidor); los parametros se codifican en la URL
+    response = sesion().get(f"{API_URL}{ruta}", params=params, headers=_encabezados(con_tiempos), timeout=TIMEOUT)
+    datos = response.json()
+    if response.status_code >= 400:
+        raise ErrorBackend(datos.get("detail", f"HTTP {response.status_code}"))
+    if "error" in datos:
+        raise ErrorBackend(datos["error"])
+    return datos, tiempos_servidor(response)
+
+
+def _leer_por_partes(ruta, params, con_tiempos, al_recibir):
+    # Devuelve (meta, recursos, tiempos del servidor); al_recibir(meta,
+    # recursos) se llama con cada recurso nuevo. Una lista sin el evento
+    # "fin" (conexion cortada) es un error, no un resultado
+    meta, recursos, completa = {}, [], False
+    with sesion().get(f"{API_URL}{ruta}", params={**params, "formato": "ndjson"},
+                      headers=_encabezados(con_tiempos), timeout=TIMEOUT, stream=True) as response:
+        if response.status_code >= 400:
+            raise ErrorBackend(response.json().get("detail", f"HTTP {response.status_code}"))
+        tiempos = tiempos_servidor(response)
+        for linea in response.iter_lines():
+            if not linea:
+                continue
+            evento = json.loads(linea)
+            tipo_evento = evento.pop("evento", None)
+            if tipo_evento == "recurso":
+                recursos.append(evento)
+                al_recibir(meta, recursos)
+            elif tipo_evento == "meta":
+                meta = evento
+            elif tipo_evento == "fin":
+                completa = True
+            elif tipo_evento == "error":
+                raise ErrorBackend(evento["error"])
+    if not completa:
+        raise ErrorBackend(f"La respuesta se cortó después de {len(recursos)} recursos")
+    return meta, recursos, tiempos
+
+
+def obtener_por_partes(ruta, params, con_tiempos=False):
+    """
+    Lista de recursos pedida con formato=ndjson: devuelve (meta, recursos,
+    tiempos del servidor). Mientras llegan se muestra la tabla parcial,
+    que se redibuja cada vez que se duplica la cantidad de filas.
+    """
+    clave = (ruta, json.dumps(params, sort_keys=True), con_tiempos)
+    guardada = listas_recibidas().obtener(clave)
+    if guardada is not None:
+        return guardada
+
+    avance, tabla = st.empty(), st.empty()
+    proxima_vista = 50
+
+    def mostrar(meta, recursos):
+        nonlocal proxima_vista
+        if len(recursos) < proxima_vista:
+            return
+        proxima_vista *= 2
+        total = meta.get("total")
+        avance.caption(f"Recibidos {len(recursos)}" + (f" de {total}" if total else "") + " recursos...")
+        tabla.dataframe(pd.DataFrame(recursos, columns=["name", "type", "resourceGroup", "location"]),
+                        use_container_width=True)
+
+    try:
+        resultado = _leer_por_partes(ruta, params, con_tiempos, mostrar)
+    finally:
+        avance.empty()
+        tabla.empty()
+    listas_recibidas().guardar(clave, resultado)
+    return resultado